@@ -0,0 +1,4 @@
+"""Бенчмарки бота: нагрузка на диспетчер и запросы к базе
+
+Запуск из корня проекта, например: python -m benchmarks.dispatcher_load
+"""
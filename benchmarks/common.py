@@ -0,0 +1,115 @@
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence
+
+BACKENDS = ('sqlite', 'postgres')
+
+
+def add_backend_arguments(parser: argparse.ArgumentParser):
+    """Общие параметры: бэкенд базы и файл отчёта"""
+    parser.add_argument('--backend', choices=BACKENDS + ('both',), default='sqlite',
+                        help='база данных: sqlite, postgres или both (каждая в отдельном процессе)')
+    parser.add_argument('--postgres-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help='отдельная база PostgreSQL для бенчмарка (данные в ней будут изменены), '
+                             'по умолчанию BENCH_DATABASE_URL')
+    parser.add_argument('--json', dest='json_path', help='сохранить отчёт в JSON')
+
+
+def select_backend(backend: str, postgres_url: Optional[str], workdir: str):
+    """Настройка окружения до импорта модулей бота
+
+    Бэкенд выбирается при импорте (db_postgres или db), поэтому вызывать
+    до первого import config / handlers / main.
+    """
+    os.environ.setdefault('TELEGRAM_TOKEN', '123456:BENCHMARK')
+    os.environ['LOG_FILE'] = os.path.join(workdir, 'bot.log')
+    if backend == 'postgres':
+        if not postgres_url:
+            raise SystemExit("❌ Для PostgreSQL укажите --postgres-url или BENCH_DATABASE_URL")
+        os.environ['DATABASE_URL'] = postgres_url
+    else:
+        # Пустое значение не перезаписывается из .env и отключает PostgreSQL
+        os.environ['DATABASE_URL'] = ''
+        os.environ['DATABASE_PATH'] = os.path.join(workdir, 'litkom.db')
+
+
+def run_each_backend(module: str, backends: Sequence[str]) -> Dict[str, Any]:
+    """Запуск бенчмарка для каждого бэкенда в отдельном процессе"""
+    results = {}
+    for backend in backends:
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            # Повторные --backend и --json перекрывают переданные ранее
+            subprocess.run([sys.executable, '-m', module, *sys.argv[1:], '--backend', backend, '--json', path],
+                           check=True)
+            with open(path, encoding='utf-8') as f:
+                results.update(json.load(f))
+        finally:
+            os.remove(path)
+    return results
+
+
+def save_report(report: Dict[str, Any], path: Optional[str]):
+    """Запись отчёта в JSON"""
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по рангу для уже отсортированного списка"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values), max(1, math.ceil(q / 100 * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Распределение задержек (секунды на входе, миллисекунды в отчёте)"""
+    values = sorted(samples)
+    if not values:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+
+class CallCounter:
+    """Счётчик вызовов: всего и в пределах текущей задачи (через contextvars)"""
+
+    def __init__(self, name: str):
+        self.total = 0
+        self._current: ContextVar[Optional[List[int]]] = ContextVar(f'bench_{name}', default=None)
+
+    def wrap(self, obj: Any, attribute: str):
+        """Подменить метод экземпляра обёрткой со счётчиком"""
+        original = getattr(obj, attribute)
+
+        def counted(*args, **kwargs):
+            self.total += 1
+            current = self._current.get()
+            if current is not None:
+                current[0] += 1
+            return original(*args, **kwargs)
+
+        setattr(obj, attribute, counted)
+
+    def begin(self):
+        return self._current.set([0])
+
+    def end(self, token) -> int:
+        count = self._current.get()[0]
+        self._current.reset(token)
+        return count
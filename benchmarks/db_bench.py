@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк методов Database для SQLite и PostgreSQL
+
+Для каждого размера каталога создаётся свежая база (SQLite - временный файл,
+PostgreSQL - отдельная схема litkom_bench), затем по очереди замеряются все
+публичные методы: операций в секунду и распределение задержек. Отчёт в JSON
+можно сравнить с предыдущим (--baseline), чтобы поймать регрессию до деплоя.
+
+Примеры:
+    python -m benchmarks.db_bench --sizes 50 5000
+    python -m benchmarks.db_bench --backend both --postgres-url postgresql://... --json db.json
+    python -m benchmarks.db_bench --baseline db.json --threshold 1.3
+"""
+
+import argparse
+import asyncio
+import datetime
+import inspect
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse, urlunparse, parse_qsl
+
+from benchmarks.common import BACKENDS, save_report, summarize
+
+BENCH_SCHEMA = 'litkom_bench'
+DEFAULT_SIZES = (50, 5_000, 100_000)
+CATEGORIES = ('Базовая литература', 'Брошюры', 'Буклеты', 'Медальоны', 'Ключи', 'Прочее')
+# Методы, которые не замеряются: управление подключениями
+SKIPPED_METHODS = {'close', 'create_pool'}
+# Методы сообщают об ошибке через результат, исключений наружу не бросают
+FALSE_ON_ERROR = {'ping', 'add_user', 'add_item', 'update_stock', 'update_item', 'delete_item', 'reset_sales',
+                  'save_fsm_records', 'delete_fsm_records'}
+NONE_ON_ERROR = {'archive_monthly_sales', 'get_item_by_id', 'get_item_by_name'}
+
+
+def _failed(name: str, result: Any) -> bool:
+    if name in ('sell_item', 'sell_items'):
+        return not result[0]
+    return (name in FALSE_ON_ERROR and result is False) or (name in NONE_ON_ERROR and result is None)
+
+
+class BenchContext:
+    """Данные для аргументов: существующие позиции, пользователи, ключи FSM"""
+
+    def __init__(self, db, size: int, seed: int):
+        self.db = db
+        self.size = size
+        self.rng = random.Random(seed)
+        self.items: List[Tuple[int, str]] = []
+        self.users = [700_000_000 + i for i in range(100)]
+        self.added: List[str] = []
+        self.fsm_keys = [f'bench:{i}:{i}:0:default' for i in range(1000)]
+        self._counter = itertools.count()
+        today = datetime.date.today()
+        previous = today.replace(day=1) - datetime.timedelta(days=1)
+        self.period = (today.year, today.month, previous.year, previous.month)
+
+    def item(self) -> Tuple[int, str]:
+        return self.rng.choice(self.items)
+
+    def new_item(self) -> Tuple[str, str, float, float, int]:
+        name = f'Бенчмарк {next(self._counter):07d}'
+        self.added.append(name)
+        return name, self.rng.choice(CATEGORIES), 10.0, 5.0, 1
+
+    def upsert_batch(self, count: int) -> List[Tuple[str, str, float, float, int]]:
+        return [(name, CATEGORIES[item_id % len(CATEGORIES)], 12.0, 6.0, 2)
+                for item_id, name in self.rng.sample(self.items, min(count, len(self.items)))]
+
+    def fsm_record(self) -> Tuple[str, Optional[str], str, float]:
+        return self.rng.choice(self.fsm_keys), 'SellStates:waiting_for_quantity', '{"selected_item": "x"}', time.time() + 3600
+
+    async def added_item_id(self) -> Tuple[int]:
+        item = await self.db.get_item_by_name(self.added.pop())
+        return (item['id'],)
+
+
+def _args(build: Callable[[BenchContext], Any] = None, **kwargs):
+    """Построитель аргументов: (args, kwargs) для вызова метода"""
+    async def make(ctx: BenchContext):
+        args = build(ctx) if build else ()
+        if inspect.isawaitable(args):
+            args = await args
+        return args, {key: value(ctx) if callable(value) else value for key, value in kwargs.items()}
+    return make
+
+
+# (метод, аргументы, доля от --iterations); порядок важен: delete_item удаляет позиции из add_item
+OPERATIONS: List[Tuple[str, Callable[[BenchContext], Awaitable], float]] = [
+    ('ping', _args(), 1),
+    ('init_database', _args(), 0.05),
+    ('add_user', _args(lambda c: (c.rng.choice(c.users), 'leader', 'Ведущий')), 1),
+    ('get_user_role', _args(lambda c: (c.rng.choice(c.users),)), 1),
+    ('is_admin', _args(lambda c: (c.rng.choice(c.users),)), 1),
+    ('is_leader', _args(lambda c: (c.rng.choice(c.users),)), 1),
+    ('add_item', _args(lambda c: c.new_item()), 0.5),
+    ('bulk_upsert_items', _args(lambda c: (c.upsert_batch(100),)), 0.1),
+    ('get_fsm_record', _args(lambda c: (c.rng.choice(c.fsm_keys),)), 1),
+    ('save_fsm_records', _args(lambda c: ([c.fsm_record() for _ in range(10)],)), 1),
+    ('delete_fsm_records', _args(lambda c: (c.rng.sample(c.fsm_keys, 10),)), 1),
+    ('purge_expired_fsm', _args(lambda c: (time.time(),)), 0.2),
+    ('update_stock', _args(lambda c: (c.item()[1], 1_000_000)), 1),
+    ('sell_item', _args(lambda c: (c.item()[1], 1)), 1),
+    ('sell_items', _args(lambda c: ([(c.item()[1], 1) for _ in range(5)],)), 1),
+    ('get_stock_report', _args(), 1),
+    ('get_low_stock', _args(), 1),
+    ('get_price_list', _args(), 1),
+    ('get_all_items', _args(), 1),
+    ('get_catalog_layout_version', _args(), 1),
+    ('get_items_page', _args(lambda c: (20,), after_id=lambda c: c.item()[0]), 1),
+    ('count_items', _args(), 1),
+    ('get_item_by_id', _args(lambda c: (c.item()[0],)), 1),
+    ('get_item_by_name', _args(lambda c: (c.item()[1],)), 1),
+    ('search_items', _args(lambda c: (c.item()[1],)), 1),
+    ('update_item', _args(lambda c: (c.item()[0],), price=lambda c: float(c.rng.randint(5, 50))), 0.5),
+    ('get_demand_analytics', _args(lambda c: c.period), 0.2),
+    ('get_profit_report', _args(), 0.5),
+    ('archive_monthly_sales', _args(), 0.05),
+    ('reset_sales', _args(), 0.05),
+    ('delete_item', _args(lambda c: c.added_item_id()), 0.5),
+]
+
+
+async def execute_sql(db, query: str):
+    """Служебный запрос в обход методов Database (подготовка данных)"""
+    if hasattr(db, 'connections'):
+        async with db.connections.writer() as conn:
+            await conn.execute(query)
+    else:
+        async with db.get_connection() as conn:
+            await conn.execute(query)
+    db.catalog.invalidate()
+
+
+async def seed(db, ctx: BenchContext):
+    """Каталог нужного размера, остатки, продажи и история прошлого месяца"""
+    await db.init_database()
+    items = [(f'Книга {i:07d}', CATEGORIES[i % len(CATEGORIES)], float(5 + i % 40), float(2 + i % 20), i % 10)
+             for i in range(ctx.size)]
+    for start in range(0, len(items), 10_000):
+        await db.bulk_upsert_items(items[start:start + 10_000])
+    await execute_sql(db, 'UPDATE literature SET stock = 1000 + id % 50, sold = id % 7')
+    year, month, prev_year, prev_month = ctx.period
+    await execute_sql(db, f'''INSERT INTO monthly_sales (item_id, year, month, sold_quantity, total_revenue, total_cost)
+                              SELECT id, {prev_year}, {prev_month}, id % 5, (id % 5) * price, (id % 5) * cost
+                              FROM literature''')
+    for user_id in ctx.users:
+        await db.add_user(user_id, 'leader', 'Ведущий')
+    ctx.items = [(item['id'], item['name']) for item in await db.get_all_items()]
+
+
+async def measure(db, ctx: BenchContext, name: str, make_args, iterations: int, concurrency: int,
+                  max_seconds: float) -> Optional[Dict[str, Any]]:
+    method = getattr(db, name, None)
+    if method is None:
+        return None
+    if name == 'delete_item':
+        iterations = min(iterations, len(ctx.added))
+    iterations = max(1, iterations)
+    # Аргументы готовятся заранее, чтобы их подготовка не попадала в замер
+    calls = [await make_args(ctx) for _ in range(iterations)]
+    calls.reverse()
+    samples: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + max_seconds
+
+    async def worker():
+        nonlocal errors
+        while calls and time.perf_counter() < deadline:
+            args, kwargs = calls.pop()
+            started = time.perf_counter()
+            result = await method(*args, **kwargs)
+            samples.append(time.perf_counter() - started)
+            if _failed(name, result):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {'ops_per_sec': round(len(samples) / elapsed, 1) if elapsed else 0.0, 'failed': errors, **summarize(samples)}
+
+
+async def bench_size(db, size: int, args) -> Dict[str, Any]:
+    ctx = BenchContext(db, size, args.seed)
+    started = time.perf_counter()
+    await seed(db, ctx)
+    print(f"   📚 {size} позиций загружено за {time.perf_counter() - started:.1f} с")
+    results = {}
+    try:
+        for name, make_args, share in OPERATIONS:
+            result = await measure(db, ctx, name, make_args, int(args.iterations * share),
+                                   args.concurrency, args.max_seconds)
+            if result is not None:
+                results[name] = result
+                print(f"   {name:<22} {result['ops_per_sec']:>10} оп/с  p50 {result['p50_ms']:>9} мс  "
+                      f"p99 {result['p99_ms']:>9} мс" + (f"  ошибок: {result['failed']}" if result['failed'] else ''))
+    finally:
+        await db.close()
+    return results
+
+
+def uncovered_methods(db) -> List[str]:
+    """Публичные методы, которых нет в OPERATIONS"""
+    covered = {name for name, _, _ in OPERATIONS} | SKIPPED_METHODS
+    return sorted(name for name, _ in inspect.getmembers(db, inspect.iscoroutinefunction)
+                  if not name.startswith('_') and name not in covered)
+
+
+def bench_url(postgres_url: str) -> str:
+    """Адрес с search_path на отдельную схему (asyncpg передаёт его как настройку сервера)"""
+    parts = urlparse(postgres_url)
+    query = dict(parse_qsl(parts.query))
+    query['search_path'] = BENCH_SCHEMA
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+
+async def reset_schema(postgres_url: str):
+    import asyncpg
+    conn = await asyncpg.connect(postgres_url)
+    try:
+        await conn.execute(f'DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE')
+        await conn.execute(f'CREATE SCHEMA {BENCH_SCHEMA}')
+    finally:
+        await conn.close()
+
+
+async def run(args) -> Dict[str, Any]:
+    os.environ.setdefault('TELEGRAM_TOKEN', '123456:BENCHMARK')
+    backends = list(BACKENDS) if args.backend == 'both' else [args.backend]
+    if 'postgres' in backends and not args.postgres_url:
+        if args.backend == 'postgres':
+            raise SystemExit("❌ Для PostgreSQL укажите --postgres-url или BENCH_DATABASE_URL")
+        print("⚠️ BENCH_DATABASE_URL не задан, PostgreSQL пропущен")
+        backends.remove('postgres')
+
+    report: Dict[str, Any] = {
+        'meta': {'iterations': args.iterations, 'concurrency': args.concurrency, 'max_seconds': args.max_seconds,
+                 'python': sys.version.split()[0], 'created': datetime.datetime.now().isoformat(timespec='seconds')},
+        'results': {},
+        'not_covered': {},
+    }
+    for backend in backends:
+        report['results'][backend] = {}
+        for size in args.sizes:
+            print(f"\n📊 {backend}, каталог {size} позиций")
+            with tempfile.TemporaryDirectory() as workdir:
+                if backend == 'postgres':
+                    await reset_schema(args.postgres_url)
+                    os.environ['DATABASE_URL'] = bench_url(args.postgres_url)
+                    from db_postgres import Database
+                    db = Database()
+                else:
+                    from db import Database
+                    db = Database(os.path.join(workdir, 'bench.db'))
+                report['not_covered'][backend] = uncovered_methods(db)
+                report['results'][backend][str(size)] = await bench_size(db, size, args)
+        if backend == 'postgres':
+            await reset_schema(args.postgres_url)
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta_ms: float) -> List[str]:
+    """Методы, у которых p50 вырос больше чем в threshold раз и больше чем на min_delta_ms"""
+    regressions = []
+    for backend, sizes in report['results'].items():
+        for size, methods in sizes.items():
+            for name, current in methods.items():
+                previous = baseline.get('results', {}).get(backend, {}).get(size, {}).get(name)
+                if not previous or previous['p50_ms'] <= 0:
+                    continue
+                ratio = current['p50_ms'] / previous['p50_ms']
+                if ratio > threshold and current['p50_ms'] - previous['p50_ms'] > min_delta_ms:
+                    regressions.append(f"{backend}/{size}/{name}: p50 {previous['p50_ms']} -> {current['p50_ms']} мс "
+                                       f"(×{ratio:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк методов Database")
+    parser.add_argument('--backend', choices=BACKENDS + ('both',), default='sqlite')
+    parser.add_argument('--postgres-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help=f'PostgreSQL для бенчмарка (используется схема {BENCH_SCHEMA}), по умолчанию BENCH_DATABASE_URL')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='размеры каталога')
+    parser.add_argument('--iterations', type=int, default=200, help='вызовов каждого метода')
+    parser.add_argument('--concurrency', type=int, default=1, help='одновременных вызовов')
+    parser.add_argument('--max-seconds', type=float, default=10, help='ограничение времени на метод')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='сохранить отчёт в JSON')
+    parser.add_argument('--baseline', help='отчёт для сравнения')
+    parser.add_argument('--threshold', type=float, default=1.5, help='допустимый рост p50 относительно baseline')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='меньший рост p50 не считается регрессией (шум на быстрых методах)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+    for backend, methods in report['not_covered'].items():
+        if methods:
+            print(f"⚠️ {backend}: методы без замера: {', '.join(methods)}")
+    save_report(report, args.json_path)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold, args.min_delta_ms)
+        if regressions:
+            print("\n❌ Регрессии:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✅ Регрессий относительно baseline нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест диспетчера синтетическими апдейтами
+
+Собирается тот же Dispatcher, что и в main.py (middleware, хранилище FSM,
+роутеры admin/leader/common), апдейты подаются через dp.feed_update.
+В Telegram ничего не уходит: сессия бота записывает запросы и отвечает
+заглушками. Ограничитель исходящих запросов не подключается - меряется
+сам бот, а не лимиты Telegram.
+
+Примеры:
+    python -m benchmarks.dispatcher_load
+    python -m benchmarks.dispatcher_load --scenario sell --leaders 50 --rounds 10
+    python -m benchmarks.dispatcher_load --backend both --postgres-url postgresql://... --json report.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import inspect
+import itertools
+import logging
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageReplyMarkup, EditMessageText, SendMessage
+from aiogram.types import CallbackQuery, Chat, InlineKeyboardMarkup, Message, Update, User
+
+from benchmarks.common import (
+    CallCounter, add_backend_arguments, run_each_backend, save_report, select_backend, summarize
+)
+
+BOT_ID = 123456
+# Диапазоны ID синтетических пользователей
+LEADER_BASE_ID = 900_000_000
+GUEST_BASE_ID = 950_000_000
+
+
+class RecordingSession(BaseSession):
+    """Сессия бота без сети: считает запросы и запоминает последнюю клавиатуру в чате"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter = Counter()
+        self.keyboards: Dict[int, Optional[InlineKeyboardMarkup]] = {}
+        self.last_message_id: Dict[int, int] = {}
+        self.last_text: Dict[int, str] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        if isinstance(method, (SendMessage, EditMessageText)):
+            chat_id = method.chat_id
+            markup = method.reply_markup
+            self.keyboards[chat_id] = markup if isinstance(markup, InlineKeyboardMarkup) else None
+            self.last_text[chat_id] = method.text
+            if isinstance(method, SendMessage):
+                message_id = next(self._message_ids)
+                self.last_message_id[chat_id] = message_id
+            else:
+                message_id = method.message_id
+            return Message(message_id=message_id, date=datetime.datetime.now(),
+                           chat=Chat(id=chat_id, type='private'), text=method.text)
+        if isinstance(method, EditMessageReplyMarkup):
+            # Листание страниц меняет только клавиатуру
+            self.keyboards[method.chat_id] = method.reply_markup
+            return Message(message_id=method.message_id, date=datetime.datetime.now(),
+                           chat=Chat(id=method.chat_id, type='private'), text=self.last_text.get(method.chat_id))
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    def buttons(self, chat_id: int, prefix: str) -> List[str]:
+        """callback_data кнопок последней клавиатуры в чате"""
+        markup = self.keyboards.get(chat_id)
+        if markup is None:
+            return []
+        return [button.callback_data for row in markup.inline_keyboard for button in row
+                if button.callback_data and button.callback_data.startswith(prefix)]
+
+
+class LoadClient:
+    """Подача апдейтов в диспетчер с замером задержки и числа обращений к базе"""
+
+    def __init__(self, dp, bot, session: RecordingSession, db_methods: CallCounter,
+                 db_connections: CallCounter, api_calls: CallCounter):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.db_methods = db_methods
+        self.db_connections = db_connections
+        self.api_calls = api_calls
+        self._update_ids = itertools.count(1)
+        self.reset()
+
+    def reset(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.per_update = {'db_methods': 0, 'db_connections': 0, 'api_calls': 0}
+        self.updates = 0
+
+    async def _feed(self, step: str, update: Update):
+        tokens = (self.db_methods.begin(), self.db_connections.begin(), self.api_calls.begin())
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.samples[step].append(time.perf_counter() - started)
+        self.updates += 1
+        for field, counter, token in zip(('db_methods', 'db_connections', 'api_calls'),
+                                         (self.db_methods, self.db_connections, self.api_calls), tokens):
+            self.per_update[field] += counter.end(token)
+
+    async def message(self, user_id: int, text: str, step: Optional[str] = None):
+        update_id = next(self._update_ids)
+        user = User(id=user_id, is_bot=False, first_name='Bench')
+        message = Message(message_id=update_id, date=datetime.datetime.now(),
+                          chat=Chat(id=user_id, type='private'), from_user=user, text=text)
+        await self._feed(step or text, Update(update_id=update_id, message=message))
+
+    async def callback(self, user_id: int, data: str, step: str):
+        update_id = next(self._update_ids)
+        user = User(id=user_id, is_bot=False, first_name='Bench')
+        # Кнопка нажата под последним сообщением бота в этом чате
+        message = Message(message_id=self.session.last_message_id.get(user_id, 1), date=datetime.datetime.now(),
+                          chat=Chat(id=user_id, type='private'),
+                          from_user=User(id=BOT_ID, is_bot=True, first_name='Bot'), text='...')
+        query = CallbackQuery(id=str(update_id), from_user=user, chat_instance=str(user_id), message=message, data=data)
+        await self._feed(step, Update(update_id=update_id, callback_query=query))
+
+
+async def sell_flow(client: LoadClient, user_id: int, rng: random.Random):
+    """/sell -> категория -> позиция -> количество 1"""
+    await client.message(user_id, '/sell')
+    categories = [data for data in client.session.buttons(user_id, 'category_') if data != 'category_all']
+    if categories:
+        await client.callback(user_id, rng.choice(categories), 'category')
+    items = client.session.buttons(user_id, 'sell_')
+    if not items:
+        # Пустая категория - как и пользователь, открываем "Все товары"
+        await client.callback(user_id, 'category_all', 'category')
+        items = client.session.buttons(user_id, 'sell_')
+    if not items:
+        raise RuntimeError(f"Нет позиций для продажи в клавиатуре: {client.session.last_text.get(user_id)!r}")
+    await client.callback(user_id, rng.choice(items), 'item')
+    await client.callback(user_id, 'qty_1', 'qty')
+
+
+async def price_flow(client: LoadClient, user_id: int, rng: random.Random):
+    """/price и листание вперёд"""
+    await client.message(user_id, '/price')
+    for _ in range(2):
+        pages = client.session.buttons(user_id, 'price_next_')
+        if not pages:
+            break
+        await client.callback(user_id, pages[0], 'price_next')
+
+
+async def start_flow(client: LoadClient, user_id: int, rng: random.Random):
+    """/start и /help незарегистрированного пользователя"""
+    await client.message(user_id + GUEST_BASE_ID - LEADER_BASE_ID, '/start')
+    await client.message(user_id + GUEST_BASE_ID - LEADER_BASE_ID, '/help')
+
+
+SCENARIOS = {
+    'sell': sell_flow,
+    'price': price_flow,
+    'start': start_flow,
+}
+
+
+async def prepare_database(db, leaders: int, stock: int):
+    """Каталог, остатки с запасом на все продажи и ведущие"""
+    await db.init_database()
+    if await db.count_items() == 0:
+        from load_literature import LITERATURE_DATA
+        await db.bulk_upsert_items(LITERATURE_DATA)
+    for item in await db.get_all_items():
+        await db.update_stock(item['name'], stock)
+    for i in range(leaders):
+        await db.add_user(LEADER_BASE_ID + i, 'leader', f'Ведущий {i}')
+
+
+async def run_scenario(client: LoadClient, flow, leaders: int, rounds: int, seed: int) -> Dict[str, Any]:
+    from metrics import SALES
+
+    async def leader(index: int):
+        rng = random.Random(seed + index)
+        for _ in range(rounds):
+            await flow(client, LEADER_BASE_ID + index, rng)
+
+    client.reset()
+    client.session.calls.clear()
+    sales_before = SALES.value()
+    started = time.perf_counter()
+    await asyncio.gather(*(leader(i) for i in range(leaders)))
+    elapsed = time.perf_counter() - started
+    sales = SALES.value() - sales_before
+
+    all_samples = [sample for samples in client.samples.values() for sample in samples]
+    updates = client.updates or 1
+    return {
+        'leaders': leaders,
+        'rounds': rounds,
+        'updates': client.updates,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(client.updates / elapsed, 1),
+        'sales': sales,
+        'sales_per_sec': round(sales / elapsed, 1),
+        'latency': summarize(all_samples),
+        'steps': {step: summarize(samples) for step, samples in client.samples.items()},
+        'db_methods_per_update': round(client.per_update['db_methods'] / updates, 2),
+        'db_connections_per_update': round(client.per_update['db_connections'] / updates, 2),
+        'api_calls_per_update': round(client.per_update['api_calls'] / updates, 2),
+        'api_calls': dict(client.session.calls),
+    }
+
+
+async def run_backend(args) -> Dict[str, Any]:
+    # Модули бота импортируются после select_backend
+    from aiogram import Bot
+    import main
+
+    logging.getLogger().setLevel(args.log_level)
+    db = main.db
+    await prepare_database(db, args.leaders, args.stock)
+
+    db_methods = CallCounter('db_methods')
+    db_connections = CallCounter('db_connections')
+    api_calls = CallCounter('api_calls')
+    for name, _ in inspect.getmembers(db, inspect.iscoroutinefunction):
+        if not name.startswith('_'):
+            db_methods.wrap(db, name)
+    if hasattr(db, 'connections'):
+        db_connections.wrap(db.connections, 'reader')
+        db_connections.wrap(db.connections, 'writer')
+    else:
+        db_connections.wrap(db, 'get_connection')
+
+    session = RecordingSession()
+    api_calls.wrap(session, 'make_request')
+    bot = Bot(f'{BOT_ID}:BENCHMARK', session=session)
+    dp = main.create_dispatcher()
+    client = LoadClient(dp, bot, session, db_methods, db_connections, api_calls)
+
+    results = {}
+    try:
+        for name in args.scenario:
+            results[name] = await run_scenario(client, SCENARIOS[name], args.leaders, args.rounds, args.seed)
+    finally:
+        await dp.storage.close()
+        await db.close()
+    return results
+
+
+def print_report(report: Dict[str, Any]):
+    for backend, scenarios in report.items():
+        for name, result in scenarios.items():
+            latency = result['latency']
+            print(f"\n📊 {backend} / {name}: {result['leaders']} пользователей × {result['rounds']} кругов, "
+                  f"{result['updates']} апдейтов за {result['seconds']} с")
+            print(f"   {result['updates_per_sec']} апдейтов/с, {result['sales_per_sec']} продаж/с")
+            print(f"   задержка: p50 {latency['p50_ms']} мс, p95 {latency['p95_ms']} мс, p99 {latency['p99_ms']} мс")
+            print(f"   на апдейт: {result['db_methods_per_update']} вызовов Database, "
+                  f"{result['db_connections_per_update']} подключений к базе, "
+                  f"{result['api_calls_per_update']} запросов к Bot API")
+            for step, stats in result['steps'].items():
+                print(f"   {step:<12} p50 {stats['p50_ms']:>8} мс  p95 {stats['p95_ms']:>8} мс  p99 {stats['p99_ms']:>8} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест диспетчера синтетическими апдейтами")
+    add_backend_arguments(parser)
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=['sell', 'price', 'start'])
+    parser.add_argument('--leaders', type=int, default=50, help='одновременных пользователей')
+    parser.add_argument('--rounds', type=int, default=5, help='повторов сценария на пользователя')
+    parser.add_argument('--stock', type=int, default=1_000_000, help='остаток каждой позиции перед тестом')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    if args.backend == 'both':
+        backends = ['sqlite'] + (['postgres'] if args.postgres_url else [])
+        if not args.postgres_url:
+            print("⚠️ BENCH_DATABASE_URL не задан, PostgreSQL пропущен")
+        # Каждый процесс сам печатает свою часть отчёта
+        report = run_each_backend('benchmarks.dispatcher_load', backends)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            select_backend(args.backend, args.postgres_url, workdir)
+            report = {args.backend: asyncio.run(run_backend(args))}
+        print_report(report)
+    save_report(report, args.json_path)
+
+
+if __name__ == '__main__':
+    main()
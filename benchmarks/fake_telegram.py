@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Локальный заменитель Telegram Bot API для сквозных бенчмарков
+
+Сервер отвечает на getUpdates, sendMessage, editMessageText, answerCallbackQuery,
+getChatMember, sendDocument и служебные методы (getMe, setWebhook, deleteWebhook),
+умеет добавлять задержку и отвечать 429 с retry_after. Апдейты кладутся через
+/_fake/updates и отдаются боту через getUpdates или доставляются на его webhook.
+
+Запуск сервера и бота:
+    python -m benchmarks.fake_telegram --port 8081 --latency 0.05 --error-rate 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081 TELEGRAM_TOKEN=123456:FAKE python main.py
+
+С нагрузкой (каждый пользователь делает /set_admin, затем продажи через /sell):
+    python -m benchmarks.fake_telegram --port 8081 --users 20 --rounds 5 --json e2e.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.common import save_report, summarize
+
+FAKE_BOT_ID = 123456
+# ID пользователей нагрузки
+USER_BASE_ID = 800_000_000
+
+
+class FakeTelegramServer:
+    """Заменитель api.telegram.org на aiohttp
+
+    latency/jitter - задержка каждого ответа, сек; error_rate - доля запросов
+    (кроме getUpdates), на которые приходит 429 с retry_after секунд.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 retry_after: int = 1, chat_member_status: str = 'creator', seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.chat_member_status = chat_member_status
+        self.random = random.Random(seed)
+        self.forced_errors = 0
+        self.updates: Deque[Dict[str, Any]] = deque()
+        self.webhook_url = ''
+        self.webhook_secret = ''
+        self.calls: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self.outbox: Dict[int, Deque[Dict[str, Any]]] = defaultdict(lambda: deque(maxlen=50))
+        self.bot_connected = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Condition()
+        self._reply_waiters: Dict[int, List[asyncio.Future]] = defaultdict(list)
+        self._client: Optional[aiohttp.ClientSession] = None
+        self._methods = {
+            'getme': self.get_me,
+            'getupdates': self.get_updates,
+            'setwebhook': self.set_webhook,
+            'deletewebhook': self.delete_webhook,
+            'getwebhookinfo': self.get_webhook_info,
+            'sendmessage': self.send_message,
+            'editmessagetext': self.edit_message_text,
+            'answercallbackquery': self.answer_callback_query,
+            'getchatmember': self.get_chat_member,
+            'senddocument': self.send_document,
+        }
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle_method)
+        app.router.add_post('/_fake/updates', self.handle_push_updates)
+        app.router.add_post('/_fake/rate_limit', self.handle_rate_limit)
+        app.router.add_get('/_fake/stats', self.handle_stats)
+        app.on_cleanup.append(self._close_client)
+        return app
+
+    async def _close_client(self, app):
+        if self._client is not None:
+            await self._client.close()
+
+    # ===== Bot API =====
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        name = request.match_info['method']
+        method = self._methods.get(name.lower())
+        self.calls[name] += 1
+        if method is None:
+            return self._error(404, 'Not Found: method not found')
+
+        params: Dict[str, Any] = dict(request.query)
+        if request.body_exists:
+            if request.content_type == 'application/json':
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if name.lower() != 'getupdates' and self._should_rate_limit():
+            self.rate_limited[name] += 1
+            return self._error(429, f'Too Many Requests: retry after {self.retry_after}',
+                               parameters={'retry_after': self.retry_after})
+        self.bot_connected.set()
+        return web.json_response({'ok': True, 'result': await method(params)})
+
+    def _should_rate_limit(self) -> bool:
+        if self.forced_errors > 0:
+            self.forced_errors -= 1
+            return True
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    @staticmethod
+    def _error(code: int, description: str, parameters: Optional[Dict[str, Any]] = None) -> web.Response:
+        body = {'ok': False, 'error_code': code, 'description': description}
+        if parameters:
+            body['parameters'] = parameters
+        return web.json_response(body, status=code)
+
+    @staticmethod
+    def _json_param(params: Dict[str, Any], name: str) -> Any:
+        value = params.get(name)
+        if isinstance(value, str) and value[:1] in '{[':
+            return json.loads(value)
+        return value
+
+    def _bot_user(self) -> Dict[str, Any]:
+        return {'id': FAKE_BOT_ID, 'is_bot': True, 'first_name': 'Litkom Fake', 'username': 'litkom_fake_bot'}
+
+    def _message(self, chat_id: int, message_id: int, **fields) -> Dict[str, Any]:
+        chat_type = 'private' if chat_id > 0 else 'supergroup'
+        return {'message_id': message_id, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': chat_type},
+                'from': self._bot_user(), **{key: value for key, value in fields.items() if value is not None}}
+
+    def _deliver(self, chat_id: int, event: Dict[str, Any]):
+        """Сообщение бота в чат: в журнал и ожидающим ответа"""
+        self.outbox[chat_id].append(event)
+        for waiter in self._reply_waiters.pop(chat_id, []):
+            if not waiter.done():
+                waiter.set_result(event)
+
+    async def get_me(self, params):
+        return {**self._bot_user(), 'can_join_groups': True, 'can_read_all_group_messages': False,
+                'supports_inline_queries': False}
+
+    async def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        while self.updates and self.updates[0]['update_id'] < offset:
+            self.updates.popleft()
+        if not self.updates and timeout:
+            async with self._new_updates:
+                try:
+                    await asyncio.wait_for(self._new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        return list(itertools.islice(self.updates, limit))
+
+    async def set_webhook(self, params):
+        self.webhook_url = params.get('url', '')
+        self.webhook_secret = params.get('secret_token', '')
+        return True
+
+    async def delete_webhook(self, params):
+        self.webhook_url = ''
+        self.webhook_secret = ''
+        return True
+
+    async def get_webhook_info(self, params):
+        return {'url': self.webhook_url, 'has_custom_certificate': False, 'pending_update_count': len(self.updates)}
+
+    async def send_message(self, params):
+        chat_id = int(params['chat_id'])
+        message = self._message(chat_id, next(self._message_ids), text=params.get('text'),
+                                reply_markup=self._json_param(params, 'reply_markup'))
+        self._deliver(chat_id, {'method': 'sendMessage', **message})
+        return message
+
+    async def edit_message_text(self, params):
+        if params.get('inline_message_id'):
+            return True
+        chat_id = int(params['chat_id'])
+        message = self._message(chat_id, int(params['message_id']), text=params.get('text'),
+                                reply_markup=self._json_param(params, 'reply_markup'),
+                                edit_date=int(time.time()))
+        self._deliver(chat_id, {'method': 'editMessageText', **message})
+        return message
+
+    async def answer_callback_query(self, params):
+        return True
+
+    async def get_chat_member(self, params):
+        user = {'id': int(params['user_id']), 'is_bot': False, 'first_name': 'User'}
+        if self.chat_member_status == 'creator':
+            return {'status': 'creator', 'user': user, 'is_anonymous': False}
+        return {'status': 'member', 'user': user}
+
+    async def send_document(self, params):
+        chat_id = int(params['chat_id'])
+        document = params.get('document')
+        if isinstance(document, web.FileField):
+            size = len(document.file.read())
+            file_name = document.filename
+        else:
+            # Повторная отправка по file_id или URL
+            size, file_name = 0, None
+        message_id = next(self._message_ids)
+        message = self._message(chat_id, message_id, caption=params.get('caption'), document={
+            'file_id': f'fake-document-{message_id}', 'file_unique_id': f'fake-{message_id}',
+            'file_name': file_name, 'file_size': size,
+        })
+        self._deliver(chat_id, {'method': 'sendDocument', **message})
+        return message
+
+    # ===== Управление =====
+
+    async def push_update(self, update: Dict[str, Any]) -> int:
+        """Новый апдейт от "пользователя": в очередь getUpdates или на webhook"""
+        update = dict(update)
+        update.setdefault('update_id', next(self._update_ids))
+        if self.webhook_url:
+            await self._post_webhook(update)
+        else:
+            self.updates.append(update)
+            async with self._new_updates:
+                self._new_updates.notify_all()
+        return update['update_id']
+
+    async def _post_webhook(self, update: Dict[str, Any]):
+        if self._client is None:
+            self._client = aiohttp.ClientSession()
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.webhook_secret} if self.webhook_secret else {}
+        async with self._client.post(self.webhook_url, json=update, headers=headers) as response:
+            if response.status != 200:
+                self.calls['webhook_errors'] += 1
+
+    def wait_reply(self, chat_id: int) -> asyncio.Future:
+        """Future со следующим сообщением бота в чате (sendMessage или editMessageText)"""
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters[chat_id].append(future)
+        return future
+
+    async def handle_push_updates(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        updates = body if isinstance(body, list) else [body]
+        ids = [await self.push_update(update) for update in updates]
+        return web.json_response({'ok': True, 'result': ids})
+
+    async def handle_rate_limit(self, request: web.Request) -> web.Response:
+        """Следующие count запросов получат 429"""
+        body = await request.json()
+        self.forced_errors += int(body.get('count', 1))
+        if 'retry_after' in body:
+            self.retry_after = int(body['retry_after'])
+        return web.json_response({'ok': True, 'result': self.forced_errors})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': dict(self.calls),
+            'rate_limited': dict(self.rate_limited),
+            'pending_updates': len(self.updates),
+            'webhook': self.webhook_url,
+            'chats': len(self.outbox),
+        }
+
+
+class FakeUser:
+    """Пользователь, который пишет боту и ждёт его ответа"""
+
+    def __init__(self, server: FakeTelegramServer, user_id: int, timeout: float):
+        self.server = server
+        self.user_id = user_id
+        self.timeout = timeout
+        self.last_reply: Optional[Dict[str, Any]] = None
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._message_ids = itertools.count(1)
+
+    def _user(self) -> Dict[str, Any]:
+        return {'id': self.user_id, 'is_bot': False, 'first_name': f'User {self.user_id}'}
+
+    async def _exchange(self, step: str, update: Dict[str, Any]) -> Dict[str, Any]:
+        reply = self.server.wait_reply(self.user_id)
+        started = time.perf_counter()
+        await self.server.push_update(update)
+        self.last_reply = await asyncio.wait_for(reply, self.timeout)
+        self.samples[step].append(time.perf_counter() - started)
+        return self.last_reply
+
+    async def send(self, text: str) -> Dict[str, Any]:
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': self.user_id, 'type': 'private'}, 'from': self._user(), 'text': text}
+        return await self._exchange(text, {'message': message})
+
+    async def press(self, data: str, step: str) -> Dict[str, Any]:
+        reply = self.last_reply or {}
+        message = {'message_id': reply.get('message_id', 1), 'date': int(time.time()),
+                   'chat': {'id': self.user_id, 'type': 'private'}, 'from': self.server._bot_user(), 'text': '...'}
+        query = {'id': f'{self.user_id}-{time.monotonic_ns()}', 'from': self._user(),
+                 'chat_instance': str(self.user_id), 'message': message, 'data': data}
+        return await self._exchange(step, {'callback_query': query})
+
+    def buttons(self, prefix: str) -> List[str]:
+        markup = (self.last_reply or {}).get('reply_markup') or {}
+        return [button['callback_data'] for row in markup.get('inline_keyboard', []) for button in row
+                if button.get('callback_data', '').startswith(prefix)]
+
+    async def sell(self, rng: random.Random):
+        """/sell -> категория -> позиция -> количество 1"""
+        await self.send('/sell')
+        categories = [data for data in self.buttons('category_') if data != 'category_all']
+        if categories:
+            await self.press(rng.choice(categories), 'category')
+        if not self.buttons('sell_'):
+            await self.press('category_all', 'category')
+        items = self.buttons('sell_')
+        if not items:
+            raise RuntimeError(f"Нет позиций для продажи: {(self.last_reply or {}).get('text')!r}")
+        await self.press(rng.choice(items), 'item')
+        await self.press('qty_1', 'qty')
+
+
+async def run_load(server: FakeTelegramServer, users: int, rounds: int, timeout: float, seed: int) -> Dict[str, Any]:
+    """Сквозная нагрузка: users пользователей параллельно, каждый rounds продаж"""
+    fake_users = [FakeUser(server, USER_BASE_ID + i, timeout) for i in range(users)]
+
+    async def scenario(user: FakeUser):
+        rng = random.Random(seed + user.user_id)
+        # Пользователь без роли может назначить себя администратором
+        await user.send('/set_admin')
+        for _ in range(rounds):
+            await user.sell(rng)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(scenario(user) for user in fake_users), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    errors = [f'{type(e).__name__}: {e}' for e in results if isinstance(e, BaseException)]
+    steps: Dict[str, List[float]] = defaultdict(list)
+    for user in fake_users:
+        for step, samples in user.samples.items():
+            steps[step].extend(samples)
+    all_samples = [sample for samples in steps.values() for sample in samples]
+    return {
+        'users': users,
+        'rounds': rounds,
+        'updates': len(all_samples),
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(len(all_samples) / elapsed, 1),
+        'latency': summarize(all_samples),
+        'steps': {step: summarize(samples) for step, samples in steps.items()},
+        'errors': errors[:10],
+        'error_count': len(errors),
+        'server': server.stats(),
+    }
+
+
+async def serve(args):
+    server = FakeTelegramServer(args.latency, args.jitter, args.error_rate, args.retry_after, seed=args.seed)
+    runner = web.AppRunner(server.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"🤖 Fake Bot API: http://{args.host}:{args.port} (TELEGRAM_API_URL для бота)")
+    try:
+        if args.users <= 0:
+            await asyncio.Event().wait()
+        print("⏳ Ожидание подключения бота...")
+        await server.bot_connected.wait()
+        # Бот успевает вызвать getUpdates или setWebhook
+        await asyncio.sleep(1)
+        report = await run_load(server, args.users, args.rounds, args.timeout, args.seed)
+        latency = report['latency']
+        print(f"\n📊 {report['users']} пользователей × {report['rounds']} продаж: "
+              f"{report['updates']} апдейтов за {report['seconds']} с, {report['updates_per_sec']} апдейтов/с")
+        print(f"   задержка до ответа бота: p50 {latency['p50_ms']} мс, p95 {latency['p95_ms']} мс, "
+              f"p99 {latency['p99_ms']} мс")
+        print(f"   ответов 429: {sum(report['server']['rate_limited'].values())}, ошибок: {report['error_count']}")
+        save_report({'e2e': report}, args.json_path)
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный заменитель Telegram Bot API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа, сек')
+    parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержке, сек')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля запросов с ответом 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429, сек')
+    parser.add_argument('--users', type=int, default=0, help='пользователей нагрузки (0 - только сервер)')
+    parser.add_argument('--rounds', type=int, default=5, help='продаж на пользователя')
+    parser.add_argument('--timeout', type=float, default=30, help='ожидание ответа бота, сек')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='сохранить отчёт в JSON')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
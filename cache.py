@@ -0,0 +1,281 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from search import SearchIndex
+
+
+class RoleCache:
+    """Ограниченный LRU-кэш ролей пользователей с TTL"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[int, Tuple[Optional[str], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tg_id: int) -> Tuple[bool, Optional[str]]:
+        """Поиск роли в кэше: (найдено, роль)"""
+        entry = self._data.get(tg_id)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        role, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[tg_id]
+            self.misses += 1
+            return False, None
+
+        self._data.move_to_end(tg_id)
+        self.hits += 1
+        return True, role
+
+    def set(self, tg_id: int, role: Optional[str]):
+        """Запись роли в кэш (None означает «пользователь неизвестен»)"""
+        self._data[tg_id] = (role, time.monotonic() + self.ttl)
+        self._data.move_to_end(tg_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def load(self, rows: Iterable[Tuple[int, str]]):
+        """Прогрев кэша парами (tg_id, role)"""
+        for tg_id, role in rows:
+            self.set(tg_id, role)
+
+    def invalidate(self, tg_id: Optional[int] = None):
+        """Сброс одной записи или всего кэша"""
+        if tg_id is None:
+            self._data.clear()
+        else:
+            self._data.pop(tg_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики для /status"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class CatalogItem(NamedTuple):
+    """Строка таблицы literature"""
+    id: int
+    name: str
+    category: Optional[str]
+    stock: int
+    min_stock: int
+    price: float
+    cost: float
+    sold: int
+
+
+# Столбцы literature в порядке полей CatalogItem
+CATALOG_COLUMNS = 'id, name, category, stock, min_stock, price, cost, sold'
+
+# Порядки сортировки снимка
+CATALOG_ORDERS: Dict[str, Callable[[CatalogItem], Any]] = {
+    'name': lambda item: item.name,
+    'category': lambda item: (item.category is None, item.category or '', item.name),
+}
+
+
+class CatalogSnapshot:
+    """Снимок таблицы literature в памяти с монотонно растущей версией
+
+    Версия меняется при каждой загрузке, правке или сбросе снимка,
+    поэтому её можно использовать как ключ кэша для производных данных.
+    Поисковый индекс названий переживает сброс снимка и при следующей
+    загрузке обновляется только по изменившимся позициям. layout_version
+    меняется только при смене состава, названий, категорий позиций или
+    наличия (остаток стал нулевым или появился) - ключ для клавиатур с позициями.
+    """
+
+    def __init__(self, max_age: float = 0.0):
+        self.max_age = max_age
+        self.version = 0
+        self.layout_version = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: Optional[Dict[int, CatalogItem]] = None
+        self._by_name: Dict[str, int] = {}
+        self._ordered: Dict[str, Tuple[List[CatalogItem], Dict[int, int]]] = {}
+        self.index = SearchIndex()
+        self._layout: Dict[int, Tuple[str, Optional[str], bool]] = {}
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        if self._items is None:
+            return False
+        return not self.max_age or time.monotonic() - self._loaded_at < self.max_age
+
+    def _ordered_items(self, order: str) -> List[CatalogItem]:
+        cached = self._ordered.get(order)
+        if cached is None:
+            items = sorted(self._items.values(), key=CATALOG_ORDERS[order])
+            cached = (items, {item.id: pos for pos, item in enumerate(items)})
+            self._ordered[order] = cached
+        return cached[0]
+
+    async def get(self, loader: Callable[[], Awaitable[Iterable[Sequence]]],
+                  order: str = 'name') -> List[CatalogItem]:
+        """Все позиции каталога; при пустом или устаревшем снимке вызывает loader"""
+        if self._is_fresh():
+            self.hits += 1
+            return self._ordered_items(order)
+
+        async with self._lock:
+            if self._is_fresh():
+                self.hits += 1
+                return self._ordered_items(order)
+
+            self.misses += 1
+            version = self.version
+            rows = [CatalogItem(*row) for row in await loader()]
+            if self.version != version:
+                # Во время загрузки прошла запись - отдаём данные, но не сохраняем их
+                return sorted(rows, key=CATALOG_ORDERS[order])
+
+            self._items = {item.id: item for item in rows}
+            self._by_name = {item.name: item.id for item in rows}
+            self._ordered = {}
+            self.index.sync((item.id, item.name) for item in rows)
+            layout = {item.id: (item.name, item.category, item.stock > 0) for item in rows}
+            if layout != self._layout:
+                self._layout = layout
+                self.layout_version += 1
+            self._loaded_at = time.monotonic()
+            self.version += 1
+            return self._ordered_items(order)
+
+    async def get_by_id(self, loader, item_id: int) -> Optional[CatalogItem]:
+        """Позиция по ID"""
+        await self.get(loader)
+        return self._items.get(item_id) if self._items is not None else None
+
+    async def get_by_name(self, loader, name: str) -> Optional[CatalogItem]:
+        """Позиция по точному названию"""
+        await self.get(loader)
+        if self._items is None:
+            return None
+        item_id = self._by_name.get(name)
+        return self._items.get(item_id) if item_id is not None else None
+
+    async def search(self, loader, query: str, limit: int = 10) -> List[CatalogItem]:
+        """Позиции по нечёткому запросу, самые подходящие первыми"""
+        rows = await self.get(loader)
+        if self._items is None:
+            # Снимок не сохранился (запись во время загрузки) - разовый индекс
+            index = SearchIndex()
+            index.sync((item.id, item.name) for item in rows)
+            by_id = {item.id: item for item in rows}
+            return [by_id[item_id] for item_id, _ in index.search(query, limit)]
+        return [self._items[item_id] for item_id, _ in self.index.search(query, limit)]
+
+    def patch(self, item_id: int, **changes):
+        """Правка полей позиции на месте"""
+        self.version += 1
+        if self._items is None:
+            return
+        item = self._items.get(item_id)
+        if item is None:
+            self.invalidate()
+            return
+        updated = item._replace(**changes)
+        self._items[item_id] = updated
+        if updated.name != item.name:
+            del self._by_name[item.name]
+            self._by_name[updated.name] = item_id
+            self.index.add(item_id, updated.name)
+        if updated.name != item.name or updated.category != item.category:
+            # Порядок сортировки мог измениться - пересортируем при следующем чтении
+            self._ordered = {}
+        else:
+            for items, positions in self._ordered.values():
+                items[positions[item_id]] = updated
+        layout = (updated.name, updated.category, updated.stock > 0)
+        if self._layout.get(item_id) != layout:
+            self._layout[item_id] = layout
+            self.layout_version += 1
+
+    def apply_sale(self, name: str, qty: int):
+        """Учёт продажи: остаток уменьшается, продажи растут (правки коммутируют)"""
+        item_id = self._by_name.get(name) if self._items is not None else None
+        if item_id is None:
+            self.invalidate()
+            return
+        item = self._items[item_id]
+        self.patch(item_id, stock=item.stock - qty, sold=item.sold + qty)
+
+    def invalidate(self):
+        """Сброс снимка; следующее чтение загрузит каталог заново"""
+        self.version += 1
+        self._items = None
+        self._by_name = {}
+        self._ordered = {}
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики для /status"""
+        total = self.hits + self.misses
+        return {
+            'version': self.version,
+            'layout_version': self.layout_version,
+            'size': len(self._items) if self._items is not None else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class KeyboardCache:
+    """Ограниченный LRU-кэш готовых inline-клавиатур
+
+    Ключ - (действие, категория, страница) в пределах одной версии раскладки
+    каталога; при смене версии кэш очищается целиком.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.version: Optional[int] = None
+        self._data: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version: int, key: Tuple) -> Optional[Any]:
+        """Клавиатура из кэша или None"""
+        if version != self.version:
+            self.version = version
+            self._data.clear()
+        keyboard = self._data.get(key)
+        if keyboard is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return keyboard
+
+    def set(self, version: int, key: Tuple, keyboard: Any):
+        """Запись клавиатуры, построенной для версии version"""
+        if version != self.version:
+            return
+        self._data[key] = keyboard
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики для /status"""
+        total = self.hits + self.misses
+        return {
+            'version': self.version,
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0
+        }
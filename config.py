@@ -4,8 +4,67 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
-DATABASE_PATH = 'data/litkom.db'
-LOG_FILE = 'bot.log'
+# Адрес Bot API (по умолчанию api.telegram.org); для локального сервера или benchmarks.fake_telegram
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '').rstrip('/')
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'data/litkom.db')
+LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+
+# Логирование: запись в файл и консоль идёт в фоновом потоке
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # text или json (строка JSON с update_id и user_id)
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))  # ротация по размеру
+LOG_ROTATE_HOURS = float(os.getenv('LOG_ROTATE_HOURS', '24'))  # ротация по времени (0 - выключена)
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+# Частые INFO-записи с этим началом пишутся через одну из LOG_SAMPLE_EVERY (1 - все)
+LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', '10'))
+LOG_SAMPLE_PREFIXES = os.getenv(
+    'LOG_SAMPLE_PREFIXES', 'Получена команда|Роль пользователя|Отправлен ответ|Update id='
+).split('|')
+
+# Пул подключений PostgreSQL
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+DB_COMMAND_TIMEOUT = float(os.getenv('DB_COMMAND_TIMEOUT', '30'))
+
+# Резервная SQLite: число подключений для чтения
+SQLITE_READERS = int(os.getenv('SQLITE_READERS', '3'))
+
+# Кэш ролей пользователей
+ROLE_CACHE_SIZE = int(os.getenv('ROLE_CACHE_SIZE', '1024'))
+ROLE_CACHE_TTL = float(os.getenv('ROLE_CACHE_TTL', '300'))
+
+# Снимок каталога в памяти: максимальный возраст перед перечитыванием, сек (0 - без ограничения)
+CATALOG_MAX_AGE = float(os.getenv('CATALOG_MAX_AGE', '300'))
+# Клавиатуры с позициями: кнопок на странице (лимит Telegram - 100) и размер кэша готовых клавиатур
+KEYBOARD_PAGE_SIZE = int(os.getenv('KEYBOARD_PAGE_SIZE', '20'))
+KEYBOARD_CACHE_SIZE = int(os.getenv('KEYBOARD_CACHE_SIZE', '256'))
+# Поиск позиций по названию: сколько вариантов предлагать
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', '8'))
+# Inline-режим (@бот запрос): число результатов и время кэша ответа в Telegram, сек
+INLINE_RESULTS_LIMIT = int(os.getenv('INLINE_RESULTS_LIMIT', '20'))
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '5'))
+
+# Хранилище FSM в базе данных
+FSM_STATE_TTL = float(os.getenv('FSM_STATE_TTL', '21600'))  # брошенные диалоги удаляются через 6 часов
+FSM_CACHE_SIZE = int(os.getenv('FSM_CACHE_SIZE', '1024'))
+FSM_FLUSH_INTERVAL = float(os.getenv('FSM_FLUSH_INTERVAL', '2'))
+
+# Фоновая проверка здоровья для /health, /ready и /status, сек
+HEALTH_SAMPLE_INTERVAL = float(os.getenv('HEALTH_SAMPLE_INTERVAL', '15'))
+
+# Режим получения апдейтов: polling или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+# Публичный адрес сервиса (Render.com сам задаёт RENDER_EXTERNAL_URL)
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', os.getenv('RENDER_EXTERNAL_URL', '')).rstrip('/')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
+# Исходящие запросы к Telegram (лимиты платформы)
+TG_GLOBAL_RATE = float(os.getenv('TG_GLOBAL_RATE', '30'))  # сообщений в секунду на бота
+TG_CHAT_RATE = float(os.getenv('TG_CHAT_RATE', '1'))  # сообщений в секунду в личный чат
+TG_CHAT_BURST = float(os.getenv('TG_CHAT_BURST', '3'))  # допустимый всплеск в одном чате
+TG_GROUP_RATE_PER_MIN = float(os.getenv('TG_GROUP_RATE_PER_MIN', '20'))  # сообщений в минуту в группу
+TG_MAX_RETRIES = int(os.getenv('TG_MAX_RETRIES', '3'))  # повторов после ответа 429
 
 # Константы для аналитики
 DELIVERY_COST = 5.0  # Стоимость доставки в злотых
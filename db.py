@@ -1,18 +1,155 @@
+import asyncio
 import aiosqlite
 import logging
+import time
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional, Tuple
-from config import DATABASE_PATH
+from config import DATABASE_PATH, SQLITE_READERS, ROLE_CACHE_SIZE, ROLE_CACHE_TTL, CATALOG_MAX_AGE, SEARCH_RESULTS_LIMIT
+from cache import RoleCache, CatalogSnapshot, CatalogItem, CATALOG_COLUMNS
 
 logger = logging.getLogger(__name__)
 
+# Настройки, применяемые к каждому подключению
+SQLITE_PRAGMAS = (
+    'PRAGMA busy_timeout = 5000;'
+    'PRAGMA synchronous = NORMAL;'
+    'PRAGMA cache_size = -16000;'  # ~16 МБ страничного кэша
+    'PRAGMA mmap_size = 268435456;'  # 256 МБ memory-mapped I/O
+    'PRAGMA temp_store = MEMORY;'
+)
+
+class ConnectionManager:
+    """Долгоживущие подключения к SQLite: один писатель и пул читателей"""
+    
+    def __init__(self, db_path: str, readers: int = SQLITE_READERS):
+        self.db_path = db_path
+        self.readers_count = max(1, readers)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+    
+    async def _connect(self, pragmas: str) -> aiosqlite.Connection:
+        """Открытие подключения с нужными PRAGMA"""
+        conn = await aiosqlite.connect(self.db_path)
+        try:
+            await conn.executescript(SQLITE_PRAGMAS + pragmas)
+        except Exception:
+            await conn.close()
+            raise
+        return conn
+    
+    async def open(self):
+        """Открытие писателя и пула читателей (повторный вызов ничего не делает)"""
+        if self._writer is not None:
+            return
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            # WAL сохраняется в файле БД и позволяет читать параллельно с записью
+            writer = await self._connect('PRAGMA journal_mode = WAL;')
+            
+            readers = []
+            try:
+                for _ in range(self.readers_count):
+                    readers.append(await self._connect('PRAGMA query_only = ON;'))
+            except Exception:
+                for reader in readers:
+                    await reader.close()
+                await writer.close()
+                raise
+            
+            self._readers = asyncio.Queue()
+            for reader in readers:
+                self._readers.put_nowait(reader)
+            self._all_readers = readers
+            self._writer = writer
+            logger.info(f"SQLite открыта в режиме WAL (читателей: {self.readers_count})")
+    
+    @asynccontextmanager
+    async def writer(self):
+        """Подключение для записи; транзакция фиксируется при выходе без ошибок"""
+        await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                # Откат и при отмене задачи: иначе половину транзакции зафиксирует следующий писатель
+                await asyncio.shield(self._writer.rollback())
+                raise
+    
+    @asynccontextmanager
+    async def reader(self):
+        """Подключение для чтения из пула"""
+        await self.open()
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+    
+    def stats(self) -> Dict[str, int]:
+        """Занятость подключений: всего, свободных читателей, занят ли писатель"""
+        if self._writer is None:
+            return {'size': 0, 'idle': 0, 'max': self.readers_count + 1, 'writer_busy': 0}
+        return {
+            'size': len(self._all_readers) + 1,
+            'idle': self._readers.qsize() + (0 if self._write_lock.locked() else 1),
+            'max': self.readers_count + 1,
+            'writer_busy': int(self._write_lock.locked())
+        }
+    
+    async def close(self):
+        """Закрытие всех подключений"""
+        if self._writer is None:
+            return
+        async with self._write_lock:
+            for reader in self._all_readers:
+                await reader.close()
+            self._all_readers.clear()
+            self._readers = None
+            await self._writer.close()
+            self._writer = None
+        logger.info("Подключения SQLite закрыты")
+
 class Database:
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
+        self.connections = ConnectionManager(db_path)
+        self.role_cache = RoleCache(ROLE_CACHE_SIZE, ROLE_CACHE_TTL)
+        self.catalog = CatalogSnapshot(CATALOG_MAX_AGE)
+    
+    async def close(self):
+        """Закрытие подключений к базе данных"""
+        await self.connections.close()
+    
+    def pool_stats(self) -> Dict[str, int]:
+        """Занятость подключений для /metrics"""
+        return self.connections.stats()
+    
+    async def ping(self) -> bool:
+        """Проверка доступности базы простым запросом"""
+        try:
+            async with self.connections.reader() as db:
+                async with db.execute('SELECT 1') as cursor:
+                    await cursor.fetchone()
+            return True
+        except Exception as e:
+            logger.error(f"База данных не отвечает: {e}")
+            return False
+    
+    async def _load_catalog(self):
+        """Загрузка всех строк literature для снимка каталога"""
+        async with self.connections.reader() as db:
+            async with db.execute(f'SELECT {CATALOG_COLUMNS} FROM literature') as cursor:
+                return await cursor.fetchall()
     
-    async def init_db(self):
+    async def init_database(self):
         """Инициализация базы данных и создание таблиц"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.writer() as db:
                 # Создание таблицы пользователей
                 await db.execute('''
                     CREATE TABLE IF NOT EXISTS users (
@@ -52,7 +189,50 @@ class Database:
                     )
                 ''')
                 
-                await db.commit()
+                # Журнал продаж: одна строка на продажу, без внешнего ключа,
+                # чтобы история переживала удаление позиции
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS sales_ledger (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        item_id INTEGER NOT NULL,
+                        qty INTEGER NOT NULL,
+                        unit_price REAL NOT NULL,
+                        unit_cost REAL NOT NULL,
+                        seller_tg_id INTEGER,
+                        chat_id INTEGER,
+                        ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                await db.execute('CREATE INDEX IF NOT EXISTS idx_sales_ledger_ts ON sales_ledger (ts)')
+                await db.execute('CREATE INDEX IF NOT EXISTS idx_sales_ledger_item_ts ON sales_ledger (item_id, ts)')
+                # Проданные inline-сообщения: по каждому продажа проводится один раз
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS inline_sales (
+                        inline_message_id TEXT PRIMARY KEY,
+                        ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                # Состояния диалогов (FSM) с временем истечения
+                await db.execute('''
+                    CREATE TABLE IF NOT EXISTS fsm_states (
+                        key TEXT PRIMARY KEY,
+                        state TEXT,
+                        data TEXT NOT NULL DEFAULT '{}',
+                        expires_at REAL NOT NULL
+                    )
+                ''')
+                await db.execute('CREATE INDEX IF NOT EXISTS idx_fsm_states_expires ON fsm_states (expires_at)')
+                # Ключ постраничного вывода (категория, название)
+                await db.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_literature_category_name ON literature (COALESCE(category, ''), name)"
+                )
+                
+                # Прогреваем кэш ролей
+                async with db.execute(
+                    'SELECT tg_id, role FROM users LIMIT ?', (ROLE_CACHE_SIZE,)
+                ) as cursor:
+                    self.role_cache.load(await cursor.fetchall())
+                
                 logger.info("База данных инициализирована успешно")
         except Exception as e:
             logger.error(f"Ошибка инициализации БД: {e}")
@@ -61,26 +241,31 @@ class Database:
     async def add_user(self, tg_id: int, role: str, name: str = None) -> bool:
         """Добавление пользователя"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.writer() as db:
                 await db.execute(
                     'INSERT OR REPLACE INTO users (tg_id, role, name) VALUES (?, ?, ?)',
                     (tg_id, role, name)
                 )
-                await db.commit()
-                return True
+            self.role_cache.set(tg_id, role)
+            return True
         except Exception as e:
             logger.error(f"Ошибка добавления пользователя: {e}")
             return False
     
     async def get_user_role(self, tg_id: int) -> Optional[str]:
-        """Получение роли пользователя"""
+        """Получение роли пользователя (через кэш ролей)"""
+        found, role = self.role_cache.get(tg_id)
+        if found:
+            return role
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.reader() as db:
                 async with db.execute(
                     'SELECT role FROM users WHERE tg_id = ?', (tg_id,)
                 ) as cursor:
                     row = await cursor.fetchone()
-                    return row[0] if row else None
+            role = row[0] if row else None
+            self.role_cache.set(tg_id, role)
+            return role
         except Exception as e:
             logger.error(f"Ошибка получения роли пользователя: {e}")
             return None
@@ -98,83 +283,243 @@ class Database:
     async def add_item(self, name: str, category: str, price: float, cost: float, min_stock: int) -> bool:
         """Добавление новой позиции литературы"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.writer() as db:
                 await db.execute(
                     'INSERT OR REPLACE INTO literature (name, category, stock, min_stock, price, cost) VALUES (?, ?, 0, ?, ?, ?)',
                     (name, category, min_stock, price, cost)
                 )
-                await db.commit()
-                logger.info(f"Добавлена позиция: {name} (цена: {price}, себестоимость: {cost})")
-                return True
+            self.catalog.invalidate()
+            logger.info(f"Добавлена позиция: {name} (цена: {price}, себестоимость: {cost})")
+            return True
         except Exception as e:
             logger.error(f"Ошибка добавления позиции: {e}")
             return False
     
+    async def bulk_upsert_items(self, items: List[Tuple[str, str, float, float, int]]) -> int:
+        """Массовая загрузка позиций (name, category, price, cost, min_stock) одной транзакцией
+
+        Существующие позиции обновляются, остатки и продажи не трогаются.
+        Возвращает число загруженных позиций (0 при ошибке).
+        """
+        if not items:
+            return 0
+        try:
+            async with self.connections.writer() as db:
+                await db.executemany(
+                    '''INSERT INTO literature (name, category, price, cost, min_stock) VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT (name) DO UPDATE SET
+                           category = excluded.category,
+                           price = excluded.price,
+                           cost = excluded.cost,
+                           min_stock = excluded.min_stock''',
+                    items
+                )
+            self.catalog.invalidate()
+            count = len({item[0] for item in items})
+            logger.info(f"Загружено позиций: {count}")
+            return count
+        except Exception as e:
+            logger.error(f"Ошибка массовой загрузки позиций: {e}")
+            return 0
+    
+    async def get_fsm_record(self, key: str) -> Optional[Tuple[Optional[str], str, float]]:
+        """Состояние FSM по ключу: (state, data в JSON, expires_at) или None"""
+        try:
+            async with self.connections.reader() as db:
+                async with db.execute(
+                    'SELECT state, data, expires_at FROM fsm_states WHERE key = ? AND expires_at > ?',
+                    (key, time.time())
+                ) as cursor:
+                    row = await cursor.fetchone()
+            return tuple(row) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка чтения состояния FSM: {e}")
+            return None
+    
+    async def save_fsm_records(self, records: List[Tuple[str, Optional[str], str, float]]) -> bool:
+        """Пакетная запись состояний FSM (key, state, data в JSON, expires_at)"""
+        try:
+            async with self.connections.writer() as db:
+                await db.executemany('''
+                    INSERT INTO fsm_states (key, state, data, expires_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        state = excluded.state,
+                        data = excluded.data,
+                        expires_at = excluded.expires_at
+                ''', records)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка записи состояний FSM: {e}")
+            return False
+    
+    async def delete_fsm_records(self, keys: List[str]) -> bool:
+        """Удаление состояний FSM"""
+        try:
+            async with self.connections.writer() as db:
+                await db.executemany('DELETE FROM fsm_states WHERE key = ?', [(key,) for key in keys])
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка удаления состояний FSM: {e}")
+            return False
+    
+    async def purge_expired_fsm(self, now: float) -> int:
+        """Удаление брошенных состояний FSM с истёкшим сроком"""
+        try:
+            async with self.connections.writer() as db:
+                cursor = await db.execute('DELETE FROM fsm_states WHERE expires_at <= ?', (now,))
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Ошибка очистки состояний FSM: {e}")
+            return 0
+    
     async def update_stock(self, name: str, count: int) -> bool:
         """Обновление остатка"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.writer() as db:
                 await db.execute(
                     'UPDATE literature SET stock = ? WHERE name = ?',
                     (count, name)
                 )
-                await db.commit()
-                logger.info(f"Остаток по {name} обновлён: {count} шт.")
-                return True
+            self.catalog.invalidate()
+            logger.info(f"Остаток по {name} обновлён: {count} шт.")
+            return True
         except Exception as e:
             logger.error(f"Ошибка обновления остатка: {e}")
             return False
     
-    async def sell_item(self, name: str, qty: int) -> Tuple[bool, str]:
-        """Продажа товара"""
+    async def sell_item(self, name: str, qty: int, seller_id: int = None, chat_id: int = None,
+                        inline_message_id: str = None) -> Tuple[bool, str, Optional[Dict]]:
+        """Продажа товара одним условным запросом с записью в журнал продаж
+
+        С inline_message_id продажа по этому inline-сообщению проводится один раз:
+        отметка пишется в той же транзакции, что и списание.
+        Возвращает (успех, сообщение, строка с новым stock, min_stock и price).
+        """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Получаем текущий остаток
+            async with self.connections.writer() as db:
+                if inline_message_id is not None:
+                    # Писатель один, поэтому проверка и отметка ниже не разрываются другой продажей
+                    async with db.execute(
+                        'SELECT 1 FROM inline_sales WHERE inline_message_id = ?', (inline_message_id,)
+                    ) as cursor:
+                        if await cursor.fetchone():
+                            return False, "Продажа по этому сообщению уже проведена", None
+                
+                # Списываем остаток только если его хватает
                 async with db.execute(
-                    'SELECT stock, price FROM literature WHERE name = ?', (name,)
+                    '''UPDATE literature SET stock = stock - ?, sold = sold + ?
+                       WHERE name = ? AND stock >= ?
+                       RETURNING id, stock, min_stock, price, cost''',
+                    (qty, qty, name, qty)
                 ) as cursor:
                     row = await cursor.fetchone()
-                    if not row:
-                        return False, "Позиция не найдена"
-                    
-                    current_stock, price = row
-                    if current_stock < qty:
-                        return False, f"Недостаточно товара. Доступно: {current_stock} шт."
-                    
-                    # Обновляем остаток и количество проданного
-                    new_stock = current_stock - qty
+                
+                if row:
+                    # Строка журнала фиксируется в той же транзакции, что и списание
                     await db.execute(
-                        'UPDATE literature SET stock = ?, sold = sold + ? WHERE name = ?',
-                        (new_stock, qty, name)
+                        '''INSERT INTO sales_ledger (item_id, qty, unit_price, unit_cost, seller_tg_id, chat_id)
+                           VALUES (?, ?, ?, ?, ?, ?)''',
+                        (row[0], qty, row[3], row[4], seller_id, chat_id)
                     )
-                    await db.commit()
-                    
-                    total_price = price * qty
-                    message = f"Продано: {name} ×{qty} — осталось {new_stock} шт., сумма {total_price:.0f} zł"
-                    logger.info(f"💸 {message}")
-                    return True, message
+                    if inline_message_id is not None:
+                        await db.execute(
+                            'INSERT INTO inline_sales (inline_message_id) VALUES (?)', (inline_message_id,)
+                        )
+                else:
+                    # Продажа не прошла - выясняем причину
+                    async with db.execute(
+                        'SELECT stock FROM literature WHERE name = ?', (name,)
+                    ) as cursor:
+                        current = await cursor.fetchone()
+                    if not current:
+                        return False, "Позиция не найдена", None
+                    return False, f"Недостаточно товара. Доступно: {current[0]} шт.", None
+            
+            sale = {'stock': row[1], 'min_stock': row[2], 'price': row[3]}
+            self.catalog.apply_sale(name, qty)
+            total_price = sale['price'] * qty
+            message = f"Продано: {name} ×{qty} — осталось {sale['stock']} шт., сумма {total_price:.0f} zł"
+            logger.info(f"💸 {message}")
+            return True, message, sale
         except Exception as e:
             logger.error(f"Ошибка продажи товара: {e}")
-            return False, f"Ошибка: {e}"
+            return False, f"Ошибка: {e}", None
     
-    async def get_stock_report(self) -> List[Dict]:
-        """Получение отчёта по остаткам"""
+    async def sell_items(self, items: List[Tuple], seller_id: int = None,
+                         chat_id: int = None) -> Tuple[bool, List[Dict]]:
+        """Продажа нескольких позиций одной транзакцией: проходят все или ни одна
+
+        Строка - (название, количество) или (название, количество, продавец);
+        без продавца в журнал пишется seller_id. Одинаковые позиции суммируются,
+        в журнале остаётся отдельная строка на каждого продавца. Возвращает
+        (True, строки с новым stock, min_stock и price) или (False, строки,
+        которым не хватило остатка, с полем error); при ошибке базы - (False, []).
+        """
+        totals: Dict[str, int] = {}
+        shares: Dict[Tuple[str, Optional[int]], int] = {}
+        for name, qty, *seller in items:
+            share = (name, seller[0] if seller else seller_id)
+            totals[name] = totals.get(name, 0) + qty
+            shares[share] = shares.get(share, 0) + qty
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.writer() as db:
+                # Писатель один, поэтому проверка и списание не разделяются чужой записью
+                placeholders = ', '.join('?' for _ in totals)
                 async with db.execute(
-                    'SELECT name, stock, min_stock, sold, price FROM literature ORDER BY name'
+                    f'SELECT name, stock FROM literature WHERE name IN ({placeholders})', list(totals)
                 ) as cursor:
-                    rows = await cursor.fetchall()
-                    return [
-                        {
-                            'name': row[0],
-                            'stock': row[1],
-                            'min_stock': row[2],
-                            'sold': row[3],
-                            'price': row[4]
-                        }
-                        for row in rows
-                    ]
+                    stock = {row[0]: row[1] for row in await cursor.fetchall()}
+                
+                shortages = []
+                for name, qty in totals.items():
+                    if name not in stock:
+                        shortages.append({'name': name, 'qty': qty, 'error': "Позиция не найдена"})
+                    elif stock[name] < qty:
+                        shortages.append({'name': name, 'qty': qty,
+                                          'error': f"Недостаточно товара. Доступно: {stock[name]} шт."})
+                if shortages:
+                    return False, shortages
+                
+                sold = []
+                for name, qty in totals.items():
+                    async with db.execute(
+                        '''UPDATE literature SET stock = stock - ?, sold = sold + ?
+                           WHERE name = ?
+                           RETURNING id, stock, min_stock, price, cost''',
+                        (qty, qty, name)
+                    ) as cursor:
+                        row = await cursor.fetchone()
+                    await db.executemany(
+                        '''INSERT INTO sales_ledger (item_id, qty, unit_price, unit_cost, seller_tg_id, chat_id)
+                           VALUES (?, ?, ?, ?, ?, ?)''',
+                        [(row[0], share_qty, row[3], row[4], share_seller, chat_id)
+                         for (share_name, share_seller), share_qty in shares.items() if share_name == name]
+                    )
+                    sold.append({'name': name, 'qty': qty, 'stock': row[1], 'min_stock': row[2], 'price': row[3]})
+            
+            for line in sold:
+                self.catalog.apply_sale(line['name'], line['qty'])
+            total_price = sum(line['price'] * line['qty'] for line in sold)
+            logger.info(f"💸 Продано позиций: {len(sold)}, штук: {sum(totals.values())}, сумма {total_price:.0f} zł")
+            return True, sold
+        except Exception as e:
+            logger.error(f"Ошибка продажи нескольких позиций: {e}")
+            return False, []
+    
+    async def get_stock_report(self) -> List[Dict]:
+        """Получение отчёта по остаткам"""
+        try:
+            items = await self.catalog.get(self._load_catalog)
+            return [
+                {
+                    'name': item.name,
+                    'stock': item.stock,
+                    'min_stock': item.min_stock,
+                    'sold': item.sold,
+                    'price': item.price
+                }
+                for item in items
+            ]
         except Exception as e:
             logger.error(f"Ошибка получения отчёта: {e}")
             return []
@@ -182,19 +527,15 @@ class Database:
     async def get_low_stock(self) -> List[Dict]:
         """Получение позиций с низким остатком"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(
-                    'SELECT name, stock, min_stock FROM literature WHERE stock <= min_stock ORDER BY name'
-                ) as cursor:
-                    rows = await cursor.fetchall()
-                    return [
-                        {
-                            'name': row[0],
-                            'stock': row[1],
-                            'min_stock': row[2]
-                        }
-                        for row in rows
-                    ]
+            items = await self.catalog.get(self._load_catalog)
+            return [
+                {
+                    'name': item.name,
+                    'stock': item.stock,
+                    'min_stock': item.min_stock
+                }
+                for item in items if item.stock <= item.min_stock
+            ]
         except Exception as e:
             logger.error(f"Ошибка получения низких остатков: {e}")
             return []
@@ -202,35 +543,98 @@ class Database:
     async def get_price_list(self) -> List[Dict]:
         """Получение прайс-листа"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(
-                    'SELECT name, price FROM literature WHERE stock > 0 ORDER BY name'
-                ) as cursor:
-                    rows = await cursor.fetchall()
-                    return [
-                        {
-                            'name': row[0],
-                            'price': row[1]
-                        }
-                        for row in rows
-                    ]
+            items = await self.catalog.get(self._load_catalog)
+            return [
+                {
+                    'name': item.name,
+                    'price': item.price
+                }
+                for item in items if item.stock > 0
+            ]
         except Exception as e:
             logger.error(f"Ошибка получения прайса: {e}")
             return []
     
-    async def get_all_items(self) -> List[str]:
+    async def get_all_items(self) -> List[Dict]:
         """Получение списка всех позиций для inline-кнопок"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(
-                    'SELECT name FROM literature WHERE stock > 0 ORDER BY name'
-                ) as cursor:
-                    rows = await cursor.fetchall()
-                    return [row[0] for row in rows]
+            items = await self.catalog.get(self._load_catalog)
+            return [
+                {
+                    'id': item.id,
+                    'name': item.name,
+                    'category': item.category,
+                    'stock': item.stock,
+                    'price': item.price
+                }
+                for item in items
+            ]
         except Exception as e:
             logger.error(f"Ошибка получения списка позиций: {e}")
             return []
     
+    async def get_catalog_layout_version(self) -> Optional[int]:
+        """Версия состава каталога (названия, категории) для кэша клавиатур"""
+        try:
+            await self.catalog.get(self._load_catalog)
+            return self.catalog.layout_version
+        except Exception as e:
+            logger.error(f"Ошибка получения версии каталога: {e}")
+            return None
+    
+    async def get_items_page(self, limit: int, after_id: int = None, before_id: int = None,
+                             in_stock_only: bool = False) -> List[Dict]:
+        """Страница позиций по ключу (категория, название)
+
+        after_id - ID последней позиции предыдущей страницы (листаем вперёд),
+        before_id - ID первой позиции следующей страницы (листаем назад).
+        """
+        key = "(COALESCE(category, ''), name)"
+        cursor_key = "(SELECT COALESCE(category, ''), name FROM literature WHERE id = ?)"
+        conditions = ['stock > 0'] if in_stock_only else []
+        args = []
+        if before_id is not None:
+            conditions.append(f'{key} < {cursor_key}')
+            args.append(before_id)
+            direction = 'DESC'
+        else:
+            if after_id is not None:
+                conditions.append(f'{key} > {cursor_key}')
+                args.append(after_id)
+            direction = 'ASC'
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        args.append(limit)
+        try:
+            async with self.connections.reader() as db:
+                async with db.execute(f'''
+                    SELECT {CATALOG_COLUMNS} FROM literature
+                    {where}
+                    ORDER BY COALESCE(category, '') {direction}, name {direction}
+                    LIMIT ?
+                ''', args) as cursor:
+                    rows = await cursor.fetchall()
+            items = [CatalogItem(*row)._asdict() for row in rows]
+            if before_id is not None:
+                items.reverse()
+            return items
+        except Exception as e:
+            logger.error(f"Ошибка получения страницы позиций: {e}")
+            return []
+    
+    async def count_items(self, in_stock_only: bool = False) -> int:
+        """Количество позиций каталога"""
+        query = 'SELECT COUNT(*) FROM literature'
+        if in_stock_only:
+            query += ' WHERE stock > 0'
+        try:
+            async with self.connections.reader() as db:
+                async with db.execute(query) as cursor:
+                    row = await cursor.fetchone()
+            return row[0]
+        except Exception as e:
+            logger.error(f"Ошибка подсчёта позиций: {e}")
+            return 0
+    
     async def reset_sales(self) -> bool:
         """Обнуление продаж с сохранением в аналитику"""
         try:
@@ -239,7 +643,7 @@ class Database:
             year = current_date.year
             month = current_date.month
             
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.writer() as db:
                 # Получаем текущие продажи для сохранения в аналитику
                 cursor = await db.execute(
                     'SELECT id, sold, price, cost FROM literature WHERE sold > 0'
@@ -260,9 +664,9 @@ class Database:
                 
                 # Обнуляем продажи
                 await db.execute('UPDATE literature SET sold = 0')
-                await db.commit()
-                logger.info(f"Продажи обнулены и сохранены в аналитику за {month}.{year}")
-                return True
+            self.catalog.invalidate()
+            logger.info(f"Продажи обнулены и сохранены в аналитику за {month}.{year}")
+            return True
         except Exception as e:
             logger.error(f"Ошибка обнуления продаж: {e}")
             return False
@@ -271,7 +675,7 @@ class Database:
                                  prev_year: int, prev_month: int) -> List[Dict]:
         """Получение аналитики спроса за два периода"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.reader() as db:
                 query = '''
                     SELECT 
                         l.name,
@@ -324,7 +728,7 @@ class Database:
     async def get_profit_report(self) -> Dict:
         """Получение отчета по прибыли"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.connections.reader() as db:
                 cursor = await db.execute(
                     '''SELECT 
                         SUM(sold * price) as total_revenue,
@@ -349,82 +753,105 @@ class Database:
     async def get_item_by_id(self, item_id: int) -> dict:
         """Получение товара по ID"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                cursor = await db.execute(
-                    'SELECT id, name, category, stock, min_stock, price, cost, sold FROM literature WHERE id = ?',
-                    (item_id,)
-                )
-                row = await cursor.fetchone()
-                if row:
-                    return {
-                        'id': row[0],
-                        'name': row[1],
-                        'category': row[2],
-                        'stock': row[3],
-                        'min_stock': row[4],
-                        'price': row[5],
-                        'cost': row[6],
-                        'sold': row[7]
-                    }
-                return None
+            item = await self.catalog.get_by_id(self._load_catalog, item_id)
+            return item._asdict() if item else None
         except Exception as e:
             logger.error(f"Ошибка получения товара по ID: {e}")
             return None
+    
+    async def get_item_by_name(self, name: str) -> Optional[Dict]:
+        """Получение товара по названию"""
+        try:
+            item = await self.catalog.get_by_name(self._load_catalog, name)
+            return item._asdict() if item else None
+        except Exception as e:
+            logger.error(f"Ошибка получения товара по названию: {e}")
+            return None
+    
+    async def search_items(self, query: str, limit: int = SEARCH_RESULTS_LIMIT) -> List[Dict]:
+        """Поиск позиций по части названия, самые подходящие первыми"""
+        try:
+            items = await self.catalog.search(self._load_catalog, query, limit)
+            return [item._asdict() for item in items]
+        except Exception as e:
+            logger.error(f"Ошибка поиска позиций: {e}")
+            return []
+    
+    async def update_item(self, item_id: int, name: str = None, category: str = None,
+                          price: float = None, cost: float = None, min_stock: int = None) -> bool:
+        """Обновление товара"""
+        changes = {'name': name, 'category': category, 'price': price, 'cost': cost, 'min_stock': min_stock}
+        changes = {field: value for field, value in changes.items() if value is not None}
+        if not changes:
+            return False
+        
+        try:
+            assignments = ', '.join(f"{field} = ?" for field in changes)
+            async with self.connections.writer() as db:
+                await db.execute(
+                    f'UPDATE literature SET {assignments} WHERE id = ?',
+                    (*changes.values(), item_id)
+                )
+            self.catalog.patch(item_id, **changes)
+            logger.info(f"Товар {item_id} обновлен")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка обновления товара: {e}")
+            return False
+    
+    async def delete_item(self, item_id: int) -> bool:
+        """Удаление товара"""
+        try:
+            async with self.connections.writer() as db:
+                await db.execute('DELETE FROM literature WHERE id = ?', (item_id,))
+            self.catalog.invalidate()
+            logger.info(f"Товар ID {item_id} удален")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка удаления товара: {e}")
+            return False
 
-    async def archive_monthly_sales(self) -> bool:
-        """Архивирование продаж за месяц (альтернатива reset_sales)"""
+    async def archive_monthly_sales(self) -> Optional[Dict]:
+        """Архивирование продаж за месяц (альтернатива reset_sales)
+
+        Возвращает число заархивированных позиций и итоги, None при ошибке.
+        """
         try:
             from datetime import datetime
             current_date = datetime.now()
             year = current_date.year
             month = current_date.month
             
-            async with aiosqlite.connect(self.db_path) as db:
-                # Получаем все товары с продажами
-                cursor = await db.execute(
-                    'SELECT id, name, sold, price, cost FROM literature WHERE sold > 0'
-                )
-                items = await cursor.fetchall()
-                
-                if not items:
-                    logger.info("Нет данных для архивирования")
-                    return True
+            # Все три запроса идут в одной транзакции писателя
+            async with self.connections.writer() as db:
+                async with db.execute(
+                    '''SELECT COUNT(*), COALESCE(SUM(sold), 0),
+                              COALESCE(SUM(sold * price), 0), COALESCE(SUM(sold * cost), 0)
+                       FROM literature WHERE sold > 0'''
+                ) as cursor:
+                    rows, sold, revenue, cost = await cursor.fetchone()
                 
-                # Архивируем каждый товар
-                for item in items:
-                    item_id, name, sold, price, cost = item
-                    revenue = sold * price
-                    total_cost = sold * cost
-                    
-                    # Проверяем, есть ли уже запись за этот месяц
-                    existing = await db.fetchone(
-                        'SELECT id FROM monthly_sales WHERE item_id = ? AND year = ? AND month = ?',
-                        (item_id, year, month)
-                    )
-                    
-                    if existing:
-                        # Обновляем существующую запись
-                        await db.execute(
-                            'UPDATE monthly_sales SET sold_quantity = ?, total_revenue = ?, total_cost = ? WHERE item_id = ? AND year = ? AND month = ?',
-                            (sold, revenue, total_cost, item_id, year, month)
-                        )
-                    else:
-                        # Создаем новую запись
-                        await db.execute(
-                            'INSERT INTO monthly_sales (item_id, year, month, sold_quantity, total_revenue, total_cost) VALUES (?, ?, ?, ?, ?, ?)',
-                            (item_id, year, month, sold, revenue, total_cost)
-                        )
+                # Переносим продажи в monthly_sales одним запросом
+                await db.execute(
+                    '''INSERT INTO monthly_sales (item_id, year, month, sold_quantity, total_revenue, total_cost)
+                       SELECT id, ?, ?, sold, sold * price, sold * cost FROM literature WHERE sold > 0
+                       ON CONFLICT (item_id, year, month) DO UPDATE SET
+                           sold_quantity = sold_quantity + excluded.sold_quantity,
+                           total_revenue = total_revenue + excluded.total_revenue,
+                           total_cost = total_cost + excluded.total_cost''',
+                    (year, month)
+                )
                 
                 # Обнуляем продажи для нового периода
-                await db.execute('UPDATE literature SET sold = 0')
-                await db.commit()
-                
-            logger.info(f"Архивированы данные за {month}.{year}")
-            return True
+                await db.execute('UPDATE literature SET sold = 0 WHERE sold > 0')
+            self.catalog.invalidate()
+            
+            logger.info(f"Архивированы данные за {month}.{year}: {rows} позиций, {sold} шт.")
+            return {'rows': rows, 'sold': sold, 'revenue': revenue, 'cost': cost}
             
         except Exception as e:
             logger.error(f"Ошибка архивирования: {e}")
-            return False
+            return None
 
 # Глобальный экземпляр базы данных
 db = Database()
@@ -1,7 +1,11 @@
+import contextlib
 import logging
 import asyncpg
 import os
-from typing import Optional, List, Dict, Any
+import time
+from typing import Optional, List, Dict, Any, Tuple
+from config import DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_ACQUIRE_TIMEOUT, DB_COMMAND_TIMEOUT, ROLE_CACHE_SIZE, ROLE_CACHE_TTL, CATALOG_MAX_AGE, SEARCH_RESULTS_LIMIT
+from cache import RoleCache, CatalogSnapshot, CATALOG_COLUMNS
 
 logger = logging.getLogger(__name__)
 
@@ -10,54 +14,141 @@ class Database:
         self.db_url = os.getenv('DATABASE_URL')
         if not self.db_url:
             raise ValueError("DATABASE_URL не найден в переменных окружения")
+        self.pool: Optional[asyncpg.Pool] = None
+        self.role_cache = RoleCache(ROLE_CACHE_SIZE, ROLE_CACHE_TTL)
+        self.catalog = CatalogSnapshot(CATALOG_MAX_AGE)
     
-    async def get_connection(self):
-        """Получение подключения к PostgreSQL"""
-        return await asyncpg.connect(self.db_url)
+    async def create_pool(self) -> asyncpg.Pool:
+        """Создание пула подключений к PostgreSQL"""
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                self.db_url,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                command_timeout=DB_COMMAND_TIMEOUT
+            )
+            logger.info(f"Пул подключений создан (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+        return self.pool
+    
+    def get_connection(self):
+        """Получение подключения из пула (использовать через async with)"""
+        if self.pool is None:
+            raise RuntimeError("Пул подключений не создан, вызовите init_database()")
+        return self.pool.acquire(timeout=DB_POOL_ACQUIRE_TIMEOUT)
+    
+    async def close(self):
+        """Закрытие пула подключений"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("Пул подключений закрыт")
+    
+    def pool_stats(self) -> Dict[str, int]:
+        """Занятость пула подключений для /metrics"""
+        if self.pool is None:
+            return {'size': 0, 'idle': 0, 'max': DB_POOL_MAX_SIZE}
+        return {'size': self.pool.get_size(), 'idle': self.pool.get_idle_size(), 'max': self.pool.get_max_size()}
+    
+    async def ping(self) -> bool:
+        """Проверка доступности базы простым запросом"""
+        try:
+            async with self.get_connection() as conn:
+                await conn.fetchval('SELECT 1')
+            return True
+        except Exception as e:
+            logger.error(f"База данных не отвечает: {e}")
+            return False
+    
+    async def _load_catalog(self):
+        """Загрузка всех строк literature для снимка каталога"""
+        async with self.get_connection() as conn:
+            return await conn.fetch(f'SELECT {CATALOG_COLUMNS} FROM literature')
     
     async def init_database(self):
         """Инициализация базы данных"""
         try:
-            conn = await self.get_connection()
-            
-            # Создаем таблицы
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    tg_id BIGINT UNIQUE NOT NULL,
-                    role TEXT NOT NULL,
-                    name TEXT
-                )
-            ''')
-            
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS literature (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT UNIQUE NOT NULL,
-                    category TEXT,
-                    stock INTEGER NOT NULL DEFAULT 0,
-                    min_stock INTEGER NOT NULL DEFAULT 0,
-                    price REAL NOT NULL DEFAULT 0.0,
-                    cost REAL NOT NULL DEFAULT 0.0,
-                    sold INTEGER NOT NULL DEFAULT 0
-                )
-            ''')
-            
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS monthly_sales (
-                    id SERIAL PRIMARY KEY,
-                    item_id INTEGER NOT NULL,
-                    year INTEGER NOT NULL,
-                    month INTEGER NOT NULL,
-                    sold_quantity INTEGER NOT NULL DEFAULT 0,
-                    total_revenue REAL NOT NULL DEFAULT 0.0,
-                    total_cost REAL NOT NULL DEFAULT 0.0,
-                    FOREIGN KEY (item_id) REFERENCES literature(id),
-                    UNIQUE(item_id, year, month)
+            await self.create_pool()
+            
+            async with self.get_connection() as conn:
+                # Создаем таблицы
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS users (
+                        id SERIAL PRIMARY KEY,
+                        tg_id BIGINT UNIQUE NOT NULL,
+                        role TEXT NOT NULL,
+                        name TEXT
+                    )
+                ''')
+                
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS literature (
+                        id SERIAL PRIMARY KEY,
+                        name TEXT UNIQUE NOT NULL,
+                        category TEXT,
+                        stock INTEGER NOT NULL DEFAULT 0,
+                        min_stock INTEGER NOT NULL DEFAULT 0,
+                        price REAL NOT NULL DEFAULT 0.0,
+                        cost REAL NOT NULL DEFAULT 0.0,
+                        sold INTEGER NOT NULL DEFAULT 0
+                    )
+                ''')
+                
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS monthly_sales (
+                        id SERIAL PRIMARY KEY,
+                        item_id INTEGER NOT NULL,
+                        year INTEGER NOT NULL,
+                        month INTEGER NOT NULL,
+                        sold_quantity INTEGER NOT NULL DEFAULT 0,
+                        total_revenue REAL NOT NULL DEFAULT 0.0,
+                        total_cost REAL NOT NULL DEFAULT 0.0,
+                        FOREIGN KEY (item_id) REFERENCES literature(id),
+                        UNIQUE(item_id, year, month)
+                    )
+                ''')
+                
+                # Журнал продаж: одна строка на продажу, без внешнего ключа,
+                # чтобы история переживала удаление позиции
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS sales_ledger (
+                        id BIGSERIAL PRIMARY KEY,
+                        item_id INTEGER NOT NULL,
+                        qty INTEGER NOT NULL,
+                        unit_price REAL NOT NULL,
+                        unit_cost REAL NOT NULL,
+                        seller_tg_id BIGINT,
+                        chat_id BIGINT,
+                        ts TIMESTAMPTZ NOT NULL DEFAULT now()
+                    )
+                ''')
+                await conn.execute('CREATE INDEX IF NOT EXISTS idx_sales_ledger_ts ON sales_ledger (ts)')
+                await conn.execute('CREATE INDEX IF NOT EXISTS idx_sales_ledger_item_ts ON sales_ledger (item_id, ts)')
+                # Проданные inline-сообщения: по каждому продажа проводится один раз
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS inline_sales (
+                        inline_message_id TEXT PRIMARY KEY,
+                        ts TIMESTAMPTZ NOT NULL DEFAULT now()
+                    )
+                ''')
+                # Состояния диалогов (FSM) с временем истечения
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS fsm_states (
+                        key TEXT PRIMARY KEY,
+                        state TEXT,
+                        data TEXT NOT NULL DEFAULT '{}',
+                        expires_at DOUBLE PRECISION NOT NULL
+                    )
+                ''')
+                await conn.execute('CREATE INDEX IF NOT EXISTS idx_fsm_states_expires ON fsm_states (expires_at)')
+                # Ключ постраничного вывода (категория, название)
+                await conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_literature_category_name ON literature ((COALESCE(category, '')), name)"
                 )
-            ''')
+                
+                # Прогреваем кэш ролей
+                users = await conn.fetch('SELECT tg_id, role FROM users LIMIT $1', ROLE_CACHE_SIZE)
+                self.role_cache.load((row['tg_id'], row['role']) for row in users)
             
-            await conn.close()
             logger.info("База данных PostgreSQL инициализирована успешно")
             return True
             
@@ -68,12 +159,12 @@ class Database:
     async def add_user(self, tg_id: int, role: str, name: str) -> bool:
         """Добавление пользователя"""
         try:
-            conn = await self.get_connection()
-            await conn.execute(
-                'INSERT INTO users (tg_id, role, name) VALUES ($1, $2, $3) ON CONFLICT (tg_id) DO UPDATE SET role = $2, name = $3',
-                tg_id, role, name
-            )
-            await conn.close()
+            async with self.get_connection() as conn:
+                await conn.execute(
+                    'INSERT INTO users (tg_id, role, name) VALUES ($1, $2, $3) ON CONFLICT (tg_id) DO UPDATE SET role = $2, name = $3',
+                    tg_id, role, name
+                )
+            self.role_cache.set(tg_id, role)
             logger.info(f"Пользователь {tg_id} добавлен с ролью {role}")
             return True
         except Exception as e:
@@ -81,11 +172,14 @@ class Database:
             return False
     
     async def get_user_role(self, tg_id: int) -> Optional[str]:
-        """Получение роли пользователя"""
+        """Получение роли пользователя (через кэш ролей)"""
+        found, role = self.role_cache.get(tg_id)
+        if found:
+            return role
         try:
-            conn = await self.get_connection()
-            role = await conn.fetchval('SELECT role FROM users WHERE tg_id = $1', tg_id)
-            await conn.close()
+            async with self.get_connection() as conn:
+                role = await conn.fetchval('SELECT role FROM users WHERE tg_id = $1', tg_id)
+            self.role_cache.set(tg_id, role)
             return role
         except Exception as e:
             logger.error(f"Ошибка получения роли пользователя: {e}")
@@ -104,29 +198,120 @@ class Database:
     async def add_item(self, name: str, category: str, price: float, cost: float, min_stock: int) -> bool:
         """Добавление новой позиции литературы"""
         try:
-            conn = await self.get_connection()
-            await conn.execute(
-                'INSERT INTO literature (name, category, stock, min_stock, price, cost) VALUES ($1, $2, 0, $3, $4, $5) ON CONFLICT (name) DO NOTHING',
-                name, category, min_stock, price, cost
-            )
-            await conn.close()
+            async with self.get_connection() as conn:
+                await conn.execute(
+                    'INSERT INTO literature (name, category, stock, min_stock, price, cost) VALUES ($1, $2, 0, $3, $4, $5) ON CONFLICT (name) DO NOTHING',
+                    name, category, min_stock, price, cost
+                )
+            self.catalog.invalidate()
             logger.info(f"Добавлена позиция: {name} (цена: {price}, себестоимость: {cost})")
             return True
         except Exception as e:
             logger.error(f"Ошибка добавления позиции: {e}")
             return False
     
+    async def bulk_upsert_items(self, items: List[Tuple[str, str, float, float, int]]) -> int:
+        """Массовая загрузка позиций (name, category, price, cost, min_stock) через COPY
+
+        Существующие позиции обновляются, остатки и продажи не трогаются.
+        Возвращает число загруженных позиций (0 при ошибке).
+        """
+        # При повторе названия побеждает последняя строка
+        records = list({item[0]: item for item in items}.values())
+        if not records:
+            return 0
+        try:
+            async with self.get_connection() as conn:
+                async with conn.transaction():
+                    await conn.execute('''
+                        CREATE TEMP TABLE literature_import (
+                            name TEXT,
+                            category TEXT,
+                            price REAL,
+                            cost REAL,
+                            min_stock INTEGER
+                        ) ON COMMIT DROP
+                    ''')
+                    await conn.copy_records_to_table(
+                        'literature_import', records=records,
+                        columns=['name', 'category', 'price', 'cost', 'min_stock']
+                    )
+                    await conn.execute('''
+                        INSERT INTO literature (name, category, price, cost, min_stock)
+                        SELECT name, category, price, cost, min_stock FROM literature_import
+                        ON CONFLICT (name) DO UPDATE SET
+                            category = EXCLUDED.category,
+                            price = EXCLUDED.price,
+                            cost = EXCLUDED.cost,
+                            min_stock = EXCLUDED.min_stock
+                    ''')
+            self.catalog.invalidate()
+            logger.info(f"Загружено позиций: {len(records)}")
+            return len(records)
+        except Exception as e:
+            logger.error(f"Ошибка массовой загрузки позиций: {e}")
+            return 0
+    
+    async def get_fsm_record(self, key: str) -> Optional[Tuple[Optional[str], str, float]]:
+        """Состояние FSM по ключу: (state, data в JSON, expires_at) или None"""
+        try:
+            async with self.get_connection() as conn:
+                row = await conn.fetchrow(
+                    'SELECT state, data, expires_at FROM fsm_states WHERE key = $1 AND expires_at > $2',
+                    key, time.time()
+                )
+            return tuple(row) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка чтения состояния FSM: {e}")
+            return None
+    
+    async def save_fsm_records(self, records: List[Tuple[str, Optional[str], str, float]]) -> bool:
+        """Пакетная запись состояний FSM (key, state, data в JSON, expires_at)"""
+        try:
+            async with self.get_connection() as conn:
+                await conn.executemany('''
+                    INSERT INTO fsm_states (key, state, data, expires_at) VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (key) DO UPDATE SET
+                        state = EXCLUDED.state,
+                        data = EXCLUDED.data,
+                        expires_at = EXCLUDED.expires_at
+                ''', records)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка записи состояний FSM: {e}")
+            return False
+    
+    async def delete_fsm_records(self, keys: List[str]) -> bool:
+        """Удаление состояний FSM"""
+        try:
+            async with self.get_connection() as conn:
+                await conn.execute('DELETE FROM fsm_states WHERE key = ANY($1::text[])', keys)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка удаления состояний FSM: {e}")
+            return False
+    
+    async def purge_expired_fsm(self, now: float) -> int:
+        """Удаление брошенных состояний FSM с истёкшим сроком"""
+        try:
+            async with self.get_connection() as conn:
+                result = await conn.execute('DELETE FROM fsm_states WHERE expires_at <= $1', now)
+            return int(result.split()[-1])
+        except Exception as e:
+            logger.error(f"Ошибка очистки состояний FSM: {e}")
+            return 0
+    
     async def update_stock(self, name: str, new_stock: int) -> bool:
         """Обновление остатка товара"""
         try:
-            conn = await self.get_connection()
-            result = await conn.execute(
-                'UPDATE literature SET stock = $1 WHERE name = $2',
-                new_stock, name
-            )
-            await conn.close()
+            async with self.get_connection() as conn:
+                result = await conn.execute(
+                    'UPDATE literature SET stock = $1 WHERE name = $2',
+                    new_stock, name
+                )
             
             if result == "UPDATE 1":
+                self.catalog.invalidate()
                 logger.info(f"Остаток {name} обновлен: {new_stock} шт.")
                 return True
             else:
@@ -136,48 +321,143 @@ class Database:
             logger.error(f"Ошибка обновления остатка: {e}")
             return False
     
-    async def sell_item(self, name: str, quantity: int) -> tuple[bool, str]:
-        """Продажа товара"""
+    async def sell_item(self, name: str, quantity: int, seller_id: int = None, chat_id: int = None,
+                        inline_message_id: str = None) -> tuple[bool, str, Optional[Dict[str, Any]]]:
+        """Продажа товара одним условным запросом с записью в журнал продаж
+
+        С inline_message_id продажа по этому inline-сообщению проводится один раз:
+        отметка пишется в той же транзакции, что и списание.
+        Возвращает (успех, сообщение, строка с новым stock, min_stock и price).
+        """
         try:
-            conn = await self.get_connection()
+            async with self.get_connection() as conn, \
+                    (conn.transaction() if inline_message_id is not None else contextlib.nullcontext()):
+                if inline_message_id is not None:
+                    # Параллельная продажа того же сообщения ждёт на ключе фиксации или отката этой
+                    marked = await conn.fetchval(
+                        'INSERT INTO inline_sales (inline_message_id) VALUES ($1) '
+                        'ON CONFLICT DO NOTHING RETURNING TRUE',
+                        inline_message_id
+                    )
+                    if not marked:
+                        return False, "Продажа по этому сообщению уже проведена", None
+                
+                # Списываем остаток только если его хватает и пишем строку журнала;
+                # если остатка не хватает - отдаём текущий остаток
+                row = await conn.fetchrow('''
+                    WITH upd AS (
+                        UPDATE literature
+                        SET stock = stock - $2, sold = sold + $2
+                        WHERE name = $1 AND stock >= $2
+                        RETURNING id, stock, min_stock, price, cost
+                    ), ledger AS (
+                        INSERT INTO sales_ledger (item_id, qty, unit_price, unit_cost, seller_tg_id, chat_id)
+                        SELECT id, $2, price, cost, $3, $4 FROM upd
+                    )
+                    SELECT TRUE AS sold, stock, min_stock, price FROM upd
+                    UNION ALL
+                    SELECT FALSE AS sold, stock, min_stock, price FROM literature
+                    WHERE name = $1 AND NOT EXISTS (SELECT 1 FROM upd)
+                ''', name, quantity, seller_id, chat_id)
+                
+                if inline_message_id is not None and (row is None or not row['sold']):
+                    # Продажа не прошла - сообщение остаётся доступным для новой попытки
+                    await conn.execute('DELETE FROM inline_sales WHERE inline_message_id = $1', inline_message_id)
             
-            # Получаем текущий остаток
-            current_stock = await conn.fetchval('SELECT stock FROM literature WHERE name = $1', name)
-            if current_stock is None:
-                await conn.close()
-                return False, "Позиция не найдена"
+            if row is None:
+                return False, "Позиция не найдена", None
             
-            if current_stock < quantity:
-                await conn.close()
-                return False, f"Недостаточно товара. Доступно: {current_stock} шт."
+            if not row['sold']:
+                return False, f"Недостаточно товара. Доступно: {row['stock']} шт.", None
             
-            # Обновляем остаток и продажи
-            new_stock = current_stock - quantity
-            await conn.execute(
-                'UPDATE literature SET stock = $1, sold = sold + $2 WHERE name = $3',
-                new_stock, quantity, name
-            )
-            
-            await conn.close()
-            logger.info(f"Продано {quantity} шт. {name}, остаток: {new_stock}")
-            return True, f"Продано: {name} ×{quantity} — осталось {new_stock} шт."
+            sale = {'stock': row['stock'], 'min_stock': row['min_stock'], 'price': row['price']}
+            self.catalog.apply_sale(name, quantity)
+            # Текст подтверждения совпадает с SQLite-версией
+            total_price = sale['price'] * quantity
+            message = f"Продано: {name} ×{quantity} — осталось {sale['stock']} шт., сумма {total_price:.0f} zł"
+            logger.info(f"💸 {message}")
+            return True, message, sale
             
         except Exception as e:
             logger.error(f"Ошибка продажи: {e}")
-            return False, f"Ошибка продажи: {e}"
+            return False, f"Ошибка продажи: {e}", None
+    
+    async def sell_items(self, items: List[Tuple], seller_id: int = None,
+                         chat_id: int = None) -> Tuple[bool, List[Dict[str, Any]]]:
+        """Продажа нескольких позиций одной транзакцией: проходят все или ни одна
+
+        Строка - (название, количество) или (название, количество, продавец);
+        без продавца в журнал пишется seller_id. Одинаковые позиции суммируются,
+        в журнале остаётся отдельная строка на каждого продавца. Возвращает
+        (True, строки с новым stock, min_stock и price) или (False, строки,
+        которым не хватило остатка, с полем error); при ошибке базы - (False, []).
+        """
+        totals: Dict[str, int] = {}
+        shares: Dict[Tuple[str, Optional[int]], int] = {}
+        for name, qty, *seller in items:
+            share = (name, seller[0] if seller else seller_id)
+            totals[name] = totals.get(name, 0) + qty
+            shares[share] = shares.get(share, 0) + qty
+        names, quantities = list(totals), list(totals.values())
+        share_names = [name for name, _ in shares]
+        share_sellers = [seller for _, seller in shares]
+        share_quantities = list(shares.values())
+        try:
+            async with self.get_connection() as conn:
+                async with conn.transaction():
+                    # Блокируем строки в порядке id, чтобы параллельные продажи не взаимоблокировались
+                    rows = await conn.fetch(
+                        'SELECT name, stock FROM literature WHERE name = ANY($1::text[]) ORDER BY id FOR UPDATE',
+                        names
+                    )
+                    stock = {row['name']: row['stock'] for row in rows}
+                    
+                    shortages = []
+                    for name, qty in totals.items():
+                        if name not in stock:
+                            shortages.append({'name': name, 'qty': qty, 'error': "Позиция не найдена"})
+                        elif stock[name] < qty:
+                            shortages.append({'name': name, 'qty': qty,
+                                              'error': f"Недостаточно товара. Доступно: {stock[name]} шт."})
+                    if shortages:
+                        return False, shortages
+                    
+                    rows = await conn.fetch('''
+                        WITH upd AS (
+                            UPDATE literature AS l
+                            SET stock = l.stock - v.qty, sold = l.sold + v.qty
+                            FROM unnest($1::text[], $2::int[]) AS v(name, qty)
+                            WHERE l.name = v.name
+                            RETURNING l.id, l.name, v.qty, l.stock, l.min_stock, l.price, l.cost
+                        ), ledger AS (
+                            INSERT INTO sales_ledger (item_id, qty, unit_price, unit_cost, seller_tg_id, chat_id)
+                            SELECT upd.id, s.qty, upd.price, upd.cost, s.seller, $6
+                            FROM upd JOIN unnest($3::text[], $4::int[], $5::bigint[]) AS s(name, qty, seller)
+                                ON s.name = upd.name
+                        )
+                        SELECT name, qty, stock, min_stock, price FROM upd
+                    ''', names, quantities, share_names, share_quantities, share_sellers, chat_id)
+            
+            by_name = {row['name']: dict(row) for row in rows}
+            sold = [by_name[name] for name in names]
+            for line in sold:
+                self.catalog.apply_sale(line['name'], line['qty'])
+            total_price = sum(line['price'] * line['qty'] for line in sold)
+            logger.info(f"Продано позиций: {len(sold)}, штук: {sum(quantities)}, сумма {total_price:.0f} zł")
+            return True, sold
+        except Exception as e:
+            logger.error(f"Ошибка продажи нескольких позиций: {e}")
+            return False, []
     
     async def get_stock_report(self) -> List[Dict[str, Any]]:
         """Получение отчета по остаткам"""
         try:
-            conn = await self.get_connection()
-            rows = await conn.fetch('''
-                SELECT name, stock, min_stock, price, sold 
-                FROM literature 
-                ORDER BY category, name
-            ''')
-            await conn.close()
-            
-            return [dict(row) for row in rows]
+            items = await self.catalog.get(self._load_catalog, order='category')
+            return [
+                {'name': item.name, 'stock': item.stock, 'min_stock': item.min_stock,
+                 'price': item.price, 'sold': item.sold}
+                for item in items
+            ]
         except Exception as e:
             logger.error(f"Ошибка получения отчета: {e}")
             return []
@@ -185,16 +465,9 @@ class Database:
     async def get_low_stock(self) -> List[Dict[str, Any]]:
         """Получение товаров с низким остатком"""
         try:
-            conn = await self.get_connection()
-            rows = await conn.fetch('''
-                SELECT name, stock, min_stock 
-                FROM literature 
-                WHERE stock <= min_stock
-                ORDER BY stock ASC
-            ''')
-            await conn.close()
-            
-            return [dict(row) for row in rows]
+            items = await self.catalog.get(self._load_catalog)
+            low = sorted((item for item in items if item.stock <= item.min_stock), key=lambda item: item.stock)
+            return [{'name': item.name, 'stock': item.stock, 'min_stock': item.min_stock} for item in low]
         except Exception as e:
             logger.error(f"Ошибка получения низких остатков: {e}")
             return []
@@ -202,9 +475,9 @@ class Database:
     async def reset_sales(self) -> bool:
         """Обнуление продаж"""
         try:
-            conn = await self.get_connection()
-            await conn.execute('UPDATE literature SET sold = 0')
-            await conn.close()
+            async with self.get_connection() as conn:
+                await conn.execute('UPDATE literature SET sold = 0')
+            self.catalog.invalidate()
             logger.info("Продажи обнулены")
             return True
         except Exception as e:
@@ -214,24 +487,75 @@ class Database:
     async def get_all_items(self) -> List[Dict[str, Any]]:
         """Получение всех товаров"""
         try:
-            conn = await self.get_connection()
-            rows = await conn.fetch('SELECT id, name, stock, price FROM literature ORDER BY name')
-            await conn.close()
-            return [dict(row) for row in rows]
+            items = await self.catalog.get(self._load_catalog)
+            return [{'id': item.id, 'name': item.name, 'category': item.category, 'stock': item.stock, 'price': item.price}
+                    for item in items]
         except Exception as e:
             logger.error(f"Ошибка получения товаров: {e}")
             return []
     
+    async def get_catalog_layout_version(self) -> Optional[int]:
+        """Версия состава каталога (названия, категории) для кэша клавиатур"""
+        try:
+            await self.catalog.get(self._load_catalog)
+            return self.catalog.layout_version
+        except Exception as e:
+            logger.error(f"Ошибка получения версии каталога: {e}")
+            return None
+    
+    async def get_items_page(self, limit: int, after_id: int = None, before_id: int = None,
+                             in_stock_only: bool = False) -> List[Dict[str, Any]]:
+        """Страница позиций по ключу (категория, название)
+
+        after_id - ID последней позиции предыдущей страницы (листаем вперёд),
+        before_id - ID первой позиции следующей страницы (листаем назад).
+        """
+        key = "(COALESCE(category, ''), name)"
+        cursor_key = "(SELECT COALESCE(category, ''), name FROM literature WHERE id = $2)"
+        conditions = ['stock > 0'] if in_stock_only else []
+        args = [limit]
+        if before_id is not None:
+            conditions.append(f'{key} < {cursor_key}')
+            args.append(before_id)
+            direction = 'DESC'
+        else:
+            if after_id is not None:
+                conditions.append(f'{key} > {cursor_key}')
+                args.append(after_id)
+            direction = 'ASC'
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        try:
+            async with self.get_connection() as conn:
+                rows = await conn.fetch(f'''
+                    SELECT {CATALOG_COLUMNS} FROM literature
+                    {where}
+                    ORDER BY COALESCE(category, '') {direction}, name {direction}
+                    LIMIT $1
+                ''', *args)
+            items = [dict(row) for row in rows]
+            if before_id is not None:
+                items.reverse()
+            return items
+        except Exception as e:
+            logger.error(f"Ошибка получения страницы товаров: {e}")
+            return []
+    
+    async def count_items(self, in_stock_only: bool = False) -> int:
+        """Количество позиций каталога"""
+        try:
+            async with self.get_connection() as conn:
+                if in_stock_only:
+                    return await conn.fetchval('SELECT COUNT(*) FROM literature WHERE stock > 0')
+                return await conn.fetchval('SELECT COUNT(*) FROM literature')
+        except Exception as e:
+            logger.error(f"Ошибка подсчёта товаров: {e}")
+            return 0
+    
     async def get_item_by_id(self, item_id: int) -> Optional[Dict[str, Any]]:
         """Получение товара по ID"""
         try:
-            conn = await self.get_connection()
-            row = await conn.fetchrow(
-                'SELECT id, name, category, stock, min_stock, price, cost, sold FROM literature WHERE id = $1',
-                item_id
-            )
-            await conn.close()
-            return dict(row) if row else None
+            item = await self.catalog.get_by_id(self._load_catalog, item_id)
+            return item._asdict() if item else None
         except Exception as e:
             logger.error(f"Ошибка получения товара по ID: {e}")
             return None
@@ -239,60 +563,62 @@ class Database:
     async def get_price_list(self) -> List[Dict[str, Any]]:
         """Получение прайс-листа"""
         try:
-            conn = await self.get_connection()
-            rows = await conn.fetch(
-                'SELECT name, price FROM literature WHERE stock > 0 ORDER BY name'
-            )
-            await conn.close()
-            return [{'name': row['name'], 'price': row['price']} for row in rows]
+            items = await self.catalog.get(self._load_catalog)
+            return [{'name': item.name, 'price': item.price} for item in items if item.stock > 0]
         except Exception as e:
             logger.error(f"Ошибка получения прайса: {e}")
             return []
     
-    async def archive_monthly_sales(self) -> bool:
-        """Архивирование продаж в аналитику"""
+    async def archive_monthly_sales(self) -> Optional[Dict[str, Any]]:
+        """Архивирование продаж в аналитику одним запросом
+
+        Возвращает число заархивированных позиций и итоги, None при ошибке.
+        """
         try:
             import datetime
             current_date = datetime.date.today()
             year = current_date.year
             month = current_date.month
             
-            conn = await self.get_connection()
-            
-            # Получаем текущие продажи для сохранения в аналитику
-            items = await conn.fetch(
-                'SELECT id, sold, price, cost FROM literature WHERE sold > 0'
-            )
-            
-            for item in items:
-                total_revenue = item['sold'] * item['price']
-                total_cost = item['sold'] * item['cost']
-                
-                # Сохраняем в monthly_sales
-                await conn.execute(
-                    '''INSERT INTO monthly_sales 
-                       (item_id, year, month, sold_quantity, total_revenue, total_cost) 
-                       VALUES ($1, $2, $3, $4, $5, $6)
-                       ON CONFLICT (item_id, year, month) 
-                       DO UPDATE SET sold_quantity = $4, total_revenue = $5, total_cost = $6''',
-                    item['id'], year, month, item['sold'], total_revenue, total_cost
-                )
-            
-            # Обнуляем продажи
-            await conn.execute('UPDATE literature SET sold = 0')
-            await conn.close()
-            
-            logger.info(f"Продажи архивированы за {month}.{year}")
-            return True
+            async with self.get_connection() as conn:
+                # Блокируем проданные позиции, переносим их в monthly_sales и обнуляем
+                # продажи - всё в одном операторе, то есть в одной транзакции
+                totals = await conn.fetchrow('''
+                    WITH src AS (
+                        SELECT id, sold, sold * price AS revenue, sold * cost AS cost
+                        FROM literature
+                        WHERE sold > 0
+                        FOR UPDATE
+                    ), archived AS (
+                        INSERT INTO monthly_sales (item_id, year, month, sold_quantity, total_revenue, total_cost)
+                        SELECT id, $1, $2, sold, revenue, cost FROM src
+                        ON CONFLICT (item_id, year, month) DO UPDATE SET
+                            sold_quantity = monthly_sales.sold_quantity + EXCLUDED.sold_quantity,
+                            total_revenue = monthly_sales.total_revenue + EXCLUDED.total_revenue,
+                            total_cost = monthly_sales.total_cost + EXCLUDED.total_cost
+                    ), reset AS (
+                        UPDATE literature l SET sold = l.sold - src.sold
+                        FROM src WHERE l.id = src.id
+                    )
+                    SELECT COUNT(*) AS rows,
+                           COALESCE(SUM(sold), 0) AS sold,
+                           COALESCE(SUM(revenue), 0) AS revenue,
+                           COALESCE(SUM(cost), 0) AS cost
+                    FROM src
+                ''', year, month)
+            self.catalog.invalidate()
+            
+            result = dict(totals)
+            logger.info(f"Продажи архивированы за {month}.{year}: {result['rows']} позиций, {result['sold']} шт.")
+            return result
         except Exception as e:
             logger.error(f"Ошибка архивирования продаж: {e}")
-            return False
+            return None
     
     async def get_demand_analytics(self, current_year: int, current_month: int, 
                                  prev_year: int, prev_month: int) -> List[Dict[str, Any]]:
         """Получение аналитики спроса за два периода"""
         try:
-            conn = await self.get_connection()
             query = '''
                 SELECT 
                     l.name,
@@ -310,8 +636,8 @@ class Database:
                 WHERE COALESCE(curr.sold_quantity, 0) > 0 OR COALESCE(prev.sold_quantity, 0) > 0
                 ORDER BY l.name
             '''
-            rows = await conn.fetch(query, current_year, current_month, prev_year, prev_month)
-            await conn.close()
+            async with self.get_connection() as conn:
+                rows = await conn.fetch(query, current_year, current_month, prev_year, prev_month)
             
             analytics = []
             for row in rows:
@@ -355,29 +681,26 @@ class Database:
     async def get_profit_report(self) -> Dict[str, Any]:
         """Получение отчёта о прибыли"""
         try:
-            conn = await self.get_connection()
-            
-            # Общая статистика
-            total_stats = await conn.fetchrow('''
-                SELECT 
-                    SUM(sold * price) as total_revenue,
-                    SUM(sold * cost) as total_cost,
-                    SUM(sold * (price - cost)) as total_profit
-                FROM literature
-            ''')
-            
-            # Топ товары по прибыли
-            top_items = await conn.fetch('''
-                SELECT name, sold, price, cost, 
-                       (sold * price) as revenue,
-                       (sold * (price - cost)) as profit
-                FROM literature 
-                WHERE sold > 0 
-                ORDER BY profit DESC 
-                LIMIT 10
-            ''')
-            
-            await conn.close()
+            async with self.get_connection() as conn:
+                # Общая статистика
+                total_stats = await conn.fetchrow('''
+                    SELECT 
+                        SUM(sold * price) as total_revenue,
+                        SUM(sold * cost) as total_cost,
+                        SUM(sold * (price - cost)) as total_profit
+                    FROM literature
+                ''')
+                
+                # Топ товары по прибыли
+                top_items = await conn.fetch('''
+                    SELECT name, sold, price, cost, 
+                           (sold * price) as revenue,
+                           (sold * (price - cost)) as profit
+                    FROM literature 
+                    WHERE sold > 0 
+                    ORDER BY profit DESC 
+                    LIMIT 10
+                ''')
             
             return {
                 'total_revenue': total_stats['total_revenue'] or 0,
@@ -398,8 +721,6 @@ class Database:
                          price: float = None, cost: float = None, min_stock: int = None) -> bool:
         """Обновление товара"""
         try:
-            conn = await self.get_connection()
-            
             # Строим динамический запрос
             updates = []
             params = []
@@ -431,15 +752,18 @@ class Database:
                 param_count += 1
             
             if not updates:
-                await conn.close()
                 return False
             
             # Добавляем item_id в конец
             params.append(item_id)
             
             query = f"UPDATE literature SET {', '.join(updates)} WHERE id = ${param_count}"
-            await conn.execute(query, *params)
-            await conn.close()
+            async with self.get_connection() as conn:
+                await conn.execute(query, *params)
+            
+            # Правим снимок каталога теми же значениями
+            changes = {'name': name, 'category': category, 'price': price, 'cost': cost, 'min_stock': min_stock}
+            self.catalog.patch(item_id, **{field: value for field, value in changes.items() if value is not None})
             
             logger.info(f"Товар {item_id} обновлен")
             return True
@@ -451,14 +775,10 @@ class Database:
     async def delete_item(self, item_id: int) -> bool:
         """Удаление товара"""
         try:
-            conn = await self.get_connection()
-            
-            # Получаем название товара для лога
-            item_name = await conn.fetchval('SELECT name FROM literature WHERE id = $1', item_id)
-            
-            # Удаляем товар
-            await conn.execute('DELETE FROM literature WHERE id = $1', item_id)
-            await conn.close()
+            async with self.get_connection() as conn:
+                # Удаляем товар, получая название для лога
+                item_name = await conn.fetchval('DELETE FROM literature WHERE id = $1 RETURNING name', item_id)
+            self.catalog.invalidate()
             
             logger.info(f"Товар {item_name} (ID: {item_id}) удален")
             return True
@@ -470,16 +790,20 @@ class Database:
     async def get_item_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """Получение товара по названию"""
         try:
-            conn = await self.get_connection()
-            row = await conn.fetchrow(
-                'SELECT id, name, category, stock, min_stock, price, cost, sold FROM literature WHERE name = $1',
-                name
-            )
-            await conn.close()
-            return dict(row) if row else None
+            item = await self.catalog.get_by_name(self._load_catalog, name)
+            return item._asdict() if item else None
         except Exception as e:
             logger.error(f"Ошибка получения товара по названию: {e}")
             return None
+    
+    async def search_items(self, query: str, limit: int = SEARCH_RESULTS_LIMIT) -> List[Dict[str, Any]]:
+        """Поиск позиций по части названия, самые подходящие первыми"""
+        try:
+            items = await self.catalog.search(self._load_catalog, query, limit)
+            return [item._asdict() for item in items]
+        except Exception as e:
+            logger.error(f"Ошибка поиска позиций: {e}")
+            return []
 
 # Глобальный экземпляр базы данных
 db = Database()
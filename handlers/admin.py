@@ -9,13 +9,21 @@ from aiogram.fsm.state import State, StatesGroup
 import os
 try:
     from db_postgres import db
-except ImportError:
+except (ImportError, ValueError):
     from db import db
-from utils import format_stock_report, format_low_stock
+from middlewares import UserContext, require_role
+from metrics import record_arrival
+from keyboards import get_items_keyboard
+from pagination import Paginator
+from search import normalize
+from utils import format_stock_report, format_low_stock, create_search_results_keyboard
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Флаги кнопок админского меню
+ADMIN_ONLY = require_role("admin", denied="❌ Только администратор может это сделать.")
+
 # Универсальная функция для очистки состояния при командах
 async def clear_state_on_command(message: Message, state: FSMContext):
     """Очищает состояние FSM если пользователь отправил команду"""
@@ -47,10 +55,10 @@ class AdminStates(StatesGroup):
     waiting_for_change_name_value = State()
 
 @router.message(Command("set_admin"))
-async def cmd_set_admin(message: Message, state: FSMContext):
+async def cmd_set_admin(message: Message, state: FSMContext, user: UserContext):
     """Обработчик команды /set_admin"""
-    user_id = message.from_user.id
-    current_role = await db.get_user_role(user_id)
+    user_id = user.tg_id
+    current_role = user.role
     
     if current_role == "admin":
         await message.answer("👑 Вы уже являетесь администратором.")
@@ -73,13 +81,9 @@ async def cmd_set_admin(message: Message, state: FSMContext):
     else:
         await message.answer("❌ У вас уже есть роль в системе.")
 
-@router.message(Command("add_leader"))
+@router.message(Command("add_leader"), flags=require_role("admin", denied="❌ Только администратор может добавлять ведущих."))
 async def cmd_add_leader(message: Message, state: FSMContext):
     """Обработчик команды /add_leader"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может добавлять ведущих.")
-        return
-    
     # Проверяем, что команда вызвана в группе
     if message.chat.type not in ['group', 'supergroup']:
         await message.answer("❌ Команда /add_leader работает только в группах.")
@@ -131,13 +135,9 @@ async def process_leader_id(message: Message, state: FSMContext):
         logger.error(f"Ошибка добавления ведущего: {e}")
         await message.answer("❌ Произошла ошибка при добавлении ведущего.")
 
-@router.message(Command("add_item"))
+@router.message(Command("add_item"), flags=require_role("admin", denied="❌ Только администратор может добавлять позиции."))
 async def cmd_add_item(message: Message, state: FSMContext):
     """Обработчик команды /add_item"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может добавлять позиции.")
-        return
-    
     await message.answer("📚 Добавление новой позиции\n\nВведите название:")
     await state.set_state(AdminStates.waiting_for_item_name)
 
@@ -236,13 +236,9 @@ async def process_item_min_stock(message: Message, state: FSMContext):
     except ValueError:
         await message.answer("❌ Введите корректное число для минимального остатка.")
 
-@router.message(Command("update_stock"))
+@router.message(Command("update_stock"), flags=require_role("admin", denied="❌ Только администратор может обновлять остатки."))
 async def cmd_update_stock(message: Message, state: FSMContext):
     """Обработчик команды /update_stock"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может обновлять остатки.")
-        return
-    
     # Получаем список всех позиций
     report_data = await db.get_stock_report()
     if not report_data:
@@ -279,21 +275,46 @@ async def process_stock_name(message: Message, state: FSMContext):
             await message.answer("❌ Неверный номер позиции. Попробуйте снова:")
             return
     except ValueError:
-        # Пользователь ввел название - ищем по частичному совпадению
-        item_name = None
-        for item in report_data:
-            if user_input.lower() in item['name'].lower():
-                item_name = item['name']
-                break
-        
-        if not item_name:
+        # Пользователь ввел название - ищем по индексу названий
+        matches = await db.search_items(user_input)
+        if not matches:
             await message.answer("❌ Позиция не найдена. Проверьте название или номер.")
             return
+        
+        exact = [item for item in matches if normalize(item['name']) == normalize(user_input)]
+        if len(matches) > 1 and len(exact) != 1:
+            # Несколько похожих позиций - не выбираем наугад, а предлагаем список
+            await message.answer(
+                "🔎 Найдено несколько позиций. Выберите нужную или уточните название:",
+                reply_markup=create_search_results_keyboard(matches, "stock_pick", "stock_cancel")
+            )
+            return
+        item_name = (exact or matches)[0]['name']
     
     await state.update_data(stock_name=item_name)
     await message.answer(f"📊 Введите новый остаток для '{item_name}':")
     await state.set_state(AdminStates.waiting_for_stock_count)
 
+@router.callback_query(AdminStates.waiting_for_stock_name, F.data.startswith("stock_pick_"), flags=ADMIN_ONLY)
+async def process_stock_pick(callback: CallbackQuery, state: FSMContext):
+    """Выбор позиции для обновления остатка из найденных"""
+    await callback.answer()
+    item = await db.get_item_by_id(int(callback.data.split("_")[2]))
+    if not item:
+        await callback.message.edit_text("❌ Позиция не найдена. Введите название или номер:")
+        return
+    
+    await state.update_data(stock_name=item['name'])
+    await callback.message.edit_text(f"📊 Введите новый остаток для '{item['name']}':")
+    await state.set_state(AdminStates.waiting_for_stock_count)
+
+@router.callback_query(F.data == "stock_cancel", flags=ADMIN_ONLY)
+async def cancel_stock_update(callback: CallbackQuery, state: FSMContext):
+    """Отмена обновления остатка"""
+    await callback.answer()
+    await callback.message.edit_text("❌ Обновление остатка отменено.")
+    await state.clear()
+
 @router.message(AdminStates.waiting_for_stock_count)
 async def process_stock_count(message: Message, state: FSMContext):
     """Обработка количества для обновления остатка"""
@@ -328,128 +349,34 @@ async def process_stock_count(message: Message, state: FSMContext):
     except ValueError:
         await message.answer("❌ Введите корректное число.")
 
-@router.message(Command("report"))
+@router.message(Command("report"), flags=require_role("admin", denied="❌ Только администратор может просматривать отчёты."))
 async def cmd_report(message: Message):
     """Обработчик команды /report с пагинацией"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может просматривать отчёты.")
-        return
-    
-    report_data = await db.get_stock_report()
-    if not report_data:
-        await message.answer("❌ Нет данных для отчёта.")
-        return
-    
     # Показываем первую страницу без FSM (простая пагинация)
-    await show_report_page_simple(message, report_data, 0)
-
-async def show_report_page_simple(message: Message, report_data: list, current_page: int):
-    """Показать страницу отчёта без FSM"""
-    items_per_page = 15
-    total_pages = (len(report_data) + items_per_page - 1) // items_per_page
-    start_idx = current_page * items_per_page
-    end_idx = start_idx + items_per_page
-    
-    page_items = report_data[start_idx:end_idx]
-    
-    text = f"📊 <b>Отчёт по остаткам (стр. {current_page + 1}/{total_pages})</b>\n\n"
-    
-    for item in page_items:
-        name = item['name']
-        stock = item['stock']
-        min_stock = item['min_stock']
-        sold = item['sold']
-        price = item['price']
-        
-        warning = " ⚠️" if stock <= min_stock else ""
-        text += f"📚 {name[:35]}{'...' if len(name) > 35 else ''}\n"
-        text += f"   Остаток: {stock}/{min_stock} шт.{warning}\n"
-        text += f"   Проданно: {sold} шт. на {sold * price:.0f} zł\n\n"
-    
-    # Создаем клавиатуру пагинации
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    keyboard = []
-    
-    if total_pages > 1:
-        row = []
-        if current_page > 0:
-            row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"report_prev_{current_page-1}"))
-        if current_page < total_pages - 1:
-            row.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"report_next_{current_page+1}"))
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton(text="❌ Закрыть", callback_data="report_close")])
-    
-    await message.answer(
-        text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
+    await report_pages.show(message)
+
+def format_report_item(item: dict) -> str:
+    """Строка отчёта по остаткам"""
+    name = item['name']
+    warning = " ⚠️" if item['stock'] <= item['min_stock'] else ""
+    return (
+        f"📚 {name[:35]}{'...' if len(name) > 35 else ''}\n"
+        f"   Остаток: {item['stock']}/{item['min_stock']} шт.{warning}\n"
+        f"   Проданно: {item['sold']} шт. на {item['sold'] * item['price']:.0f} zł\n\n"
     )
 
-async def show_report_page(message: Message, state: FSMContext):
-    """Показать страницу отчёта с пагинацией"""
-    data = await state.get_data()
-    report_data = data.get('report_data', [])
-    current_page = data.get('current_page', 0)
-    items_per_page = data.get('items_per_page', 15)
-    
-    total_pages = (len(report_data) + items_per_page - 1) // items_per_page
-    start_idx = current_page * items_per_page
-    end_idx = start_idx + items_per_page
-    
-    page_items = report_data[start_idx:end_idx]
-    
-    text = f"📚 <b>Отчёт по литературе (стр. {current_page + 1}/{total_pages})</b>\n\n"
-    
-    total_sales = 0
-    for item in page_items:
-        name = item['name']
-        stock = item['stock']
-        min_stock = item['min_stock']
-        sold = item['sold']
-        price = item['price']
-        
-        warning = " ⚠️" if stock <= min_stock else ""
-        display_name = name[:25] + "..." if len(name) > 25 else name
-        text += f"{display_name} — {stock}/{min_stock}{warning}\n"
-        total_sales += sold * price
-    
-    text += f"\nОбщая сумма продаж: {total_sales:.0f} zł"
-    
-    # Создаем клавиатуру пагинации
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    keyboard = []
-    
-    if total_pages > 1:
-        row = []
-        if current_page > 0:
-            row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data="report_prev"))
-        if current_page < total_pages - 1:
-            row.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data="report_next"))
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton(text="❌ Закрыть", callback_data="report_close")])
-    
-    await message.answer(
-        text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
-    )
+report_pages = Paginator(db, "report", "📊 Отчёт по остаткам", 15, format_report_item, "❌ Нет данных для отчёта.")
 
-@router.callback_query(F.data.startswith("report_prev_"))
+@router.callback_query(F.data.startswith("report_prev_"), flags=ADMIN_ONLY)
 async def report_prev(callback: CallbackQuery):
     """Предыдущая страница отчёта"""
-    page_num = int(callback.data.split("_")[2])
-    report_data = await db.get_stock_report()
-    await show_report_page_simple(callback.message, report_data, page_num)
+    await report_pages.show_prev(callback)
     await callback.answer()
 
-@router.callback_query(F.data.startswith("report_next_"))
+@router.callback_query(F.data.startswith("report_next_"), flags=ADMIN_ONLY)
 async def report_next(callback: CallbackQuery):
     """Следующая страница отчёта"""
-    page_num = int(callback.data.split("_")[2])
-    report_data = await db.get_stock_report()
-    await show_report_page_simple(callback.message, report_data, page_num)
+    await report_pages.show_next(callback)
     await callback.answer()
 
 @router.callback_query(F.data == "report_close")
@@ -460,7 +387,7 @@ async def report_close(callback: CallbackQuery):
 
 # ===== ОБРАБОТЧИКИ КНОПОК ДЛЯ АДМИНА =====
 
-@router.callback_query(F.data == "admin_reports")
+@router.callback_query(F.data == "admin_reports", flags=ADMIN_ONLY)
 async def admin_reports_button(callback: CallbackQuery):
     """Обработчик кнопки отчёты"""
     await callback.answer()
@@ -471,7 +398,7 @@ async def admin_reports_button(callback: CallbackQuery):
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data == "admin_management")
+@router.callback_query(F.data == "admin_management", flags=ADMIN_ONLY)
 async def admin_management_button(callback: CallbackQuery):
     """Обработчик кнопки управление"""
     await callback.answer()
@@ -482,31 +409,31 @@ async def admin_management_button(callback: CallbackQuery):
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data == "admin_analytics")
+@router.callback_query(F.data == "admin_analytics", flags=ADMIN_ONLY)
 async def admin_analytics_button(callback: CallbackQuery):
     """Обработчик кнопки аналитика"""
     await callback.answer()
     await cmd_analytics(callback.message)
 
-@router.callback_query(F.data == "admin_profit")
+@router.callback_query(F.data == "admin_profit", flags=ADMIN_ONLY)
 async def admin_profit_button(callback: CallbackQuery):
     """Обработчик кнопки прибыль"""
     await callback.answer()
     await cmd_profit(callback.message)
 
-@router.callback_query(F.data == "admin_low_stock")
+@router.callback_query(F.data == "admin_low_stock", flags=ADMIN_ONLY)
 async def admin_low_stock_button(callback: CallbackQuery):
     """Обработчик кнопки низкие остатки"""
     await callback.answer()
     await cmd_low(callback.message)
 
-@router.callback_query(F.data == "admin_reset_sales")
+@router.callback_query(F.data == "admin_reset_sales", flags=ADMIN_ONLY)
 async def admin_reset_sales_button(callback: CallbackQuery):
     """Обработчик кнопки обнулить продажи"""
     await callback.answer()
     await cmd_reset_sales(callback.message)
 
-@router.callback_query(F.data == "back_to_admin")
+@router.callback_query(F.data == "back_to_admin", flags=ADMIN_ONLY)
 async def back_to_admin(callback: CallbackQuery):
     """Возврат к админскому меню"""
     await callback.answer()
@@ -519,43 +446,43 @@ async def back_to_admin(callback: CallbackQuery):
 
 # ===== ОБРАБОТЧИКИ МЕНЮ УПРАВЛЕНИЯ =====
 
-@router.callback_query(F.data == "manage_add_item")
+@router.callback_query(F.data == "manage_add_item", flags=ADMIN_ONLY)
 async def manage_add_item_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик добавления товара"""
     await callback.answer()
     await cmd_add_item(callback.message, state)
 
-@router.callback_query(F.data == "manage_arrival")
+@router.callback_query(F.data == "manage_arrival", flags=ADMIN_ONLY)
 async def manage_arrival_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик прихода товара"""
     await callback.answer()
-    await cmd_arrival(callback.message, state)
+    await cmd_arrival(callback.message)
 
-@router.callback_query(F.data == "manage_edit_item")
+@router.callback_query(F.data == "manage_edit_item", flags=ADMIN_ONLY)
 async def manage_edit_item_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик редактирования товара"""
     await callback.answer()
     await cmd_edit_item(callback.message, state)
 
-@router.callback_query(F.data == "manage_change_price")
+@router.callback_query(F.data == "manage_change_price", flags=ADMIN_ONLY)
 async def manage_change_price_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик изменения цены"""
     await callback.answer()
     await cmd_change_price(callback.message, state)
 
-@router.callback_query(F.data == "manage_change_name")
+@router.callback_query(F.data == "manage_change_name", flags=ADMIN_ONLY)
 async def manage_change_name_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик изменения названия"""
     await callback.answer()
     await cmd_change_name(callback.message, state)
 
-@router.callback_query(F.data == "manage_delete_item")
+@router.callback_query(F.data == "manage_delete_item", flags=ADMIN_ONLY)
 async def manage_delete_item_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик удаления товара"""
     await callback.answer()
     await cmd_delete_item(callback.message, state)
 
-@router.callback_query(F.data == "manage_update_stock")
+@router.callback_query(F.data == "manage_update_stock", flags=ADMIN_ONLY)
 async def manage_update_stock_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик обновления остатков"""
     await callback.answer()
@@ -563,59 +490,54 @@ async def manage_update_stock_button(callback: CallbackQuery, state: FSMContext)
 
 # ===== ОБРАБОТЧИКИ МЕНЮ ОТЧЁТОВ =====
 
-@router.callback_query(F.data == "reports_stock")
+@router.callback_query(F.data == "reports_stock", flags=ADMIN_ONLY)
 async def reports_stock_button(callback: CallbackQuery):
     """Обработчик отчёта по остаткам"""
     await callback.answer()
     await cmd_report(callback.message)
 
-@router.callback_query(F.data == "reports_inventory")
+@router.callback_query(F.data == "reports_inventory", flags=ADMIN_ONLY)
 async def reports_inventory_button(callback: CallbackQuery):
     """Обработчик полной инвентаризации"""
     await callback.answer()
     await cmd_inventory(callback.message)
 
-@router.callback_query(F.data == "reports_low_stock")
+@router.callback_query(F.data == "reports_low_stock", flags=ADMIN_ONLY)
 async def reports_low_stock_button(callback: CallbackQuery):
     """Обработчик низких остатков"""
     await callback.answer()
     await cmd_low(callback.message)
 
-@router.callback_query(F.data == "reports_analytics")
+@router.callback_query(F.data == "reports_analytics", flags=ADMIN_ONLY)
 async def reports_analytics_button(callback: CallbackQuery):
     """Обработчик аналитики"""
     await callback.answer()
     await cmd_analytics(callback.message)
 
-@router.callback_query(F.data == "reports_profit")
+@router.callback_query(F.data == "reports_profit", flags=ADMIN_ONLY)
 async def reports_profit_button(callback: CallbackQuery):
     """Обработчик прибыли"""
     await callback.answer()
     await cmd_profit(callback.message)
 
-@router.message(Command("low"))
+@router.message(Command("low"), flags=require_role("admin", denied="❌ Только администратор может просматривать низкие остатки."))
 async def cmd_low(message: Message):
     """Обработчик команды /low"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может просматривать низкие остатки.")
-        return
-    
     low_stock_data = await db.get_low_stock()
     text = format_low_stock(low_stock_data)
     await message.answer(text)
 
-@router.message(Command("reset_sales"))
+@router.message(Command("reset_sales"), flags=require_role("admin", denied="❌ Только администратор может архивировать данные."))
 async def cmd_reset_sales(message: Message):
     """Обработчик команды /reset_sales - НЕ обнуляем, а архивируем данные"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может архивировать данные.")
-        return
-    
     # Вместо обнуления - архивируем данные в monthly_sales
-    success = await db.archive_monthly_sales()
-    if success:
+    archived = await db.archive_monthly_sales()
+    if archived is not None:
         await message.answer(
             "✅ <b>Данные за месяц архивированы!</b>\n\n"
+            f"📚 Позиций: {archived['rows']}\n"
+            f"📦 Продано: {archived['sold']} шт.\n"
+            f"💰 Выручка: {archived['revenue']:.0f} zł\n\n"
             "📊 Продажи сохранены в истории\n"
             "📈 Доступны для аналитики\n"
             "🔄 Можно начинать новый период",
@@ -624,20 +546,14 @@ async def cmd_reset_sales(message: Message):
     else:
         await message.answer("❌ Ошибка при архивировании данных.")
 
-@router.message(Command("arrival"))
+@router.message(Command("arrival"), flags=require_role("admin", denied="❌ Только администратор может регистрировать приход."))
 async def cmd_arrival(message: Message):
     """Приход товара (добавление к остатку)"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может регистрировать приход.")
-        return
-    
-    # Получаем список товаров для выбора
-    items = await db.get_all_items()
-    if not items:
+    # Клавиатура с товарами строится заново только после изменения каталога
+    keyboard = await get_items_keyboard("arrival")
+    if keyboard is None:
         await message.answer("❌ Нет товаров в базе данных.")
         return
-    
-    keyboard = create_items_keyboard(items, "arrival")
     await message.answer(
         "📦 <b>Приход товара</b>\n\n"
         "Выберите товар для добавления к остатку:",
@@ -645,149 +561,37 @@ async def cmd_arrival(message: Message):
         parse_mode="HTML"
     )
 
-@router.message(Command("inventory"))
+@router.message(Command("inventory"), flags=require_role("admin", denied="❌ Только администратор может проводить инвентаризацию."))
 async def cmd_inventory(message: Message):
     """Обработчик команды /inventory - полная инвентаризация с пагинацией"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может проводить инвентаризацию.")
-        return
-    
-    report_data = await db.get_stock_report()
-    if not report_data:
-        await message.answer("❌ Нет данных для инвентаризации.")
-        return
-    
     # Показываем первую страницу без FSM (простая пагинация)
-    await show_inventory_page_simple(message, report_data, 0)
-
-async def show_inventory_page_simple(message: Message, report_data: list, current_page: int):
-    """Показать страницу инвентаризации без FSM"""
-    items_per_page = 10
-    total_pages = (len(report_data) + items_per_page - 1) // items_per_page
-    start_idx = current_page * items_per_page
-    end_idx = start_idx + items_per_page
-    
-    page_items = report_data[start_idx:end_idx]
-    
-    text = f"📋 <b>Инвентаризация (стр. {current_page + 1}/{total_pages})</b>\n\n"
-    
-    for item in page_items:
-        name = item['name']
-        stock = item['stock']
-        min_stock = item['min_stock']
-        sold = item['sold']
-        price = item['price']
-        cost = item.get('cost', 0)
-        
-        revenue = sold * price
-        item_cost = sold * cost
-        profit = revenue - item_cost
-        
-        warning = " ⚠️" if stock <= min_stock else ""
-        text += f"📚 {name[:30]}{'...' if len(name) > 30 else ''}\n"
-        text += f"   Остаток: {stock} шт. (мин: {min_stock}){warning}\n"
-        text += f"   Проданно: {sold} шт. на {revenue:.0f} zł\n"
-        text += f"   Прибыль: {profit:.0f} zł\n\n"
-    
-    # Создаем клавиатуру пагинации
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    keyboard = []
-    
-    if total_pages > 1:
-        row = []
-        if current_page > 0:
-            row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"inventory_prev_{current_page-1}"))
-        if current_page < total_pages - 1:
-            row.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"inventory_next_{current_page+1}"))
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton(text="❌ Закрыть", callback_data="inventory_close")])
-    
-    await message.answer(
-        text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
+    await inventory_pages.show(message)
+
+def format_inventory_item(item: dict) -> str:
+    """Строка инвентаризации"""
+    name = item['name']
+    revenue = item['sold'] * item['price']
+    profit = revenue - item['sold'] * item['cost']
+    warning = " ⚠️" if item['stock'] <= item['min_stock'] else ""
+    return (
+        f"📚 {name[:30]}{'...' if len(name) > 30 else ''}\n"
+        f"   Остаток: {item['stock']} шт. (мин: {item['min_stock']}){warning}\n"
+        f"   Проданно: {item['sold']} шт. на {revenue:.0f} zł\n"
+        f"   Прибыль: {profit:.0f} zł\n\n"
     )
 
-async def show_inventory_page(message: Message, state: FSMContext):
-    """Показать страницу инвентаризации с пагинацией"""
-    data = await state.get_data()
-    inventory_data = data.get('inventory_data', [])
-    current_page = data.get('current_page', 0)
-    items_per_page = data.get('items_per_page', 10)
-    
-    total_pages = (len(inventory_data) + items_per_page - 1) // items_per_page
-    start_idx = current_page * items_per_page
-    end_idx = start_idx + items_per_page
-    
-    page_items = inventory_data[start_idx:end_idx]
-    
-    text = f"📋 <b>Инвентаризация (стр. {current_page + 1}/{total_pages})</b>\n\n"
-    
-    total_items = 0
-    low_stock_count = 0
-    total_revenue = 0
-    total_cost = 0
-    
-    for item in page_items:
-        name = item['name']
-        stock = item['stock']
-        min_stock = item['min_stock']
-        sold = item['sold']
-        price = item['price']
-        cost = item.get('cost', 0)
-        
-        total_items += stock
-        if stock <= min_stock:
-            low_stock_count += 1
-        
-        revenue = sold * price
-        item_cost = sold * cost
-        profit = revenue - item_cost
-        
-        total_revenue += revenue
-        total_cost += item_cost
-        
-        warning = " ⚠️" if stock <= min_stock else ""
-        text += f"📚 {name[:30]}{'...' if len(name) > 30 else ''}\n"
-        text += f"   Остаток: {stock} шт. (мин: {min_stock}){warning}\n"
-        text += f"   Проданно: {sold} шт. на {revenue:.0f} zł\n"
-        text += f"   Прибыль: {profit:.0f} zł\n\n"
-    
-    # Создаем клавиатуру пагинации
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    keyboard = []
-    
-    if total_pages > 1:
-        row = []
-        if current_page > 0:
-            row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data="inventory_prev"))
-        if current_page < total_pages - 1:
-            row.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data="inventory_next"))
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton(text="❌ Закрыть", callback_data="inventory_close")])
-    
-    await message.answer(
-        text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
-    )
+inventory_pages = Paginator(db, "inventory", "📋 Инвентаризация", 10, format_inventory_item, "❌ Нет данных для инвентаризации.")
 
-@router.callback_query(F.data.startswith("inventory_prev_"))
+@router.callback_query(F.data.startswith("inventory_prev_"), flags=ADMIN_ONLY)
 async def inventory_prev(callback: CallbackQuery):
     """Предыдущая страница инвентаризации"""
-    page_num = int(callback.data.split("_")[2])
-    report_data = await db.get_stock_report()
-    await show_inventory_page_simple(callback.message, report_data, page_num)
+    await inventory_pages.show_prev(callback)
     await callback.answer()
 
-@router.callback_query(F.data.startswith("inventory_next_"))
+@router.callback_query(F.data.startswith("inventory_next_"), flags=ADMIN_ONLY)
 async def inventory_next(callback: CallbackQuery):
     """Следующая страница инвентаризации"""
-    page_num = int(callback.data.split("_")[2])
-    report_data = await db.get_stock_report()
-    await show_inventory_page_simple(callback.message, report_data, page_num)
+    await inventory_pages.show_next(callback)
     await callback.answer()
 
 @router.callback_query(F.data == "inventory_close")
@@ -796,13 +600,9 @@ async def inventory_close(callback: CallbackQuery):
     await callback.message.edit_text("❌ Инвентаризация закрыта.")
     await callback.answer()
 
-@router.message(Command("analytics"))
+@router.message(Command("analytics"), flags=require_role("admin", denied="❌ Только администратор может просматривать аналитику."))
 async def cmd_analytics(message: Message):
     """Обработчик команды /analytics - аналитика спроса"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может просматривать аналитику.")
-        return
-    
     import datetime
     current_date = datetime.date.today()
     current_year = current_date.year
@@ -831,20 +631,16 @@ async def cmd_analytics(message: Message):
     text = format_demand_analytics(analytics_data, current_period, previous_period)
     await message.answer(text)
 
-@router.message(Command("profit"))
+@router.message(Command("profit"), flags=require_role("admin", denied="❌ Только администратор может просматривать отчет по прибыли."))
 async def cmd_profit(message: Message):
     """Обработчик команды /profit - отчет по прибыли"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может просматривать отчет по прибыли.")
-        return
-    
     profit_data = await db.get_profit_report()
     from utils import format_profit_report
     text = format_profit_report(profit_data)
     await message.answer(text)
 
 # Обработчик выбора товара для прихода
-@router.callback_query(F.data.startswith("arrival_"))
+@router.callback_query(F.data.startswith("arrival_"), flags=ADMIN_ONLY)
 async def process_arrival_item_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора товара для прихода"""
     item_id = int(callback.data.split("_")[1])
@@ -902,6 +698,7 @@ async def process_arrival_quantity(message: Message, state: FSMContext):
         success = await db.update_stock(item['name'], new_stock)
         
         if success:
+            record_arrival(quantity)
             await message.answer(
                 f"✅ <b>Приход зарегистрирован</b>\n\n"
                 f"Товар: <b>{item['name']}</b>\n"
@@ -923,23 +720,15 @@ async def process_arrival_quantity(message: Message, state: FSMContext):
 
 # ===== НОВЫЕ КОМАНДЫ ДЛЯ РЕДАКТИРОВАНИЯ ТОВАРОВ =====
 
-@router.message(Command("edit_item"))
+@router.message(Command("edit_item"), flags=require_role("admin", denied="❌ Только администратор может редактировать товары."))
 async def cmd_edit_item(message: Message, state: FSMContext):
     """Обработчик команды /edit_item"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может редактировать товары.")
-        return
-    
-    # Получаем список всех товаров
-    items = await db.get_all_items()
-    if not items:
+    # Клавиатура с товарами строится заново только после изменения каталога
+    keyboard = await get_items_keyboard("edit_item")
+    if keyboard is None:
         await message.answer("📚 Нет товаров для редактирования.")
         return
     
-    # Создаем клавиатуру с товарами
-    from utils import create_items_keyboard
-    keyboard = create_items_keyboard(items, "edit_item")
-    
     await message.answer(
         "📝 <b>Выберите товар для редактирования:</b>",
         reply_markup=keyboard,
@@ -947,7 +736,7 @@ async def cmd_edit_item(message: Message, state: FSMContext):
     )
     await state.set_state(AdminStates.waiting_for_edit_item_selection)
 
-@router.callback_query(F.data.startswith("edit_item_"))
+@router.callback_query(F.data.startswith("edit_item_"), flags=ADMIN_ONLY)
 async def process_edit_item_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора товара для редактирования"""
     if await clear_state_on_command(callback.message, state):
@@ -986,7 +775,7 @@ async def process_edit_item_selection(callback: CallbackQuery, state: FSMContext
     )
     await state.set_state(AdminStates.waiting_for_edit_field)
 
-@router.callback_query(F.data.startswith("edit_field_"))
+@router.callback_query(F.data.startswith("edit_field_"), flags=ADMIN_ONLY)
 async def process_edit_field_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора поля для редактирования"""
     if await clear_state_on_command(callback.message, state):
@@ -1057,23 +846,15 @@ async def cancel_edit(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text("❌ Редактирование отменено.")
     await state.clear()
 
-@router.message(Command("delete_item"))
+@router.message(Command("delete_item"), flags=require_role("admin", denied="❌ Только администратор может удалять товары."))
 async def cmd_delete_item(message: Message, state: FSMContext):
     """Обработчик команды /delete_item"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может удалять товары.")
-        return
-    
-    # Получаем список всех товаров
-    items = await db.get_all_items()
-    if not items:
+    # Клавиатура с товарами строится заново только после изменения каталога
+    keyboard = await get_items_keyboard("delete_item")
+    if keyboard is None:
         await message.answer("📚 Нет товаров для удаления.")
         return
     
-    # Создаем клавиатуру с товарами
-    from utils import create_items_keyboard
-    keyboard = create_items_keyboard(items, "delete_item")
-    
     await message.answer(
         "🗑️ <b>Выберите товар для удаления:</b>\n\n"
         "⚠️ <b>Внимание:</b> Товар будет удален навсегда!",
@@ -1082,7 +863,7 @@ async def cmd_delete_item(message: Message, state: FSMContext):
     )
     await state.set_state(AdminStates.waiting_for_delete_item_selection)
 
-@router.callback_query(F.data.startswith("delete_item_"))
+@router.callback_query(F.data.startswith("delete_item_"), flags=ADMIN_ONLY)
 async def process_delete_item_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка удаления товара"""
     if await clear_state_on_command(callback.message, state):
@@ -1112,7 +893,7 @@ async def process_delete_item_selection(callback: CallbackQuery, state: FSMConte
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data.startswith("confirm_delete_"))
+@router.callback_query(F.data.startswith("confirm_delete_"), flags=ADMIN_ONLY)
 async def confirm_delete_item(callback: CallbackQuery, state: FSMContext):
     """Подтверждение удаления товара"""
     if await clear_state_on_command(callback.message, state):
@@ -1134,23 +915,15 @@ async def cancel_delete(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text("❌ Удаление отменено.")
     await state.clear()
 
-@router.message(Command("change_price"))
+@router.message(Command("change_price"), flags=require_role("admin", denied="❌ Только администратор может изменять цены."))
 async def cmd_change_price(message: Message, state: FSMContext):
     """Обработчик команды /change_price"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может изменять цены.")
-        return
-    
-    # Получаем список всех товаров
-    items = await db.get_all_items()
-    if not items:
+    # Клавиатура с товарами строится заново только после изменения каталога
+    keyboard = await get_items_keyboard("change_price")
+    if keyboard is None:
         await message.answer("📚 Нет товаров для изменения цены.")
         return
     
-    # Создаем клавиатуру с товарами
-    from utils import create_items_keyboard
-    keyboard = create_items_keyboard(items, "change_price")
-    
     await message.answer(
         "💰 <b>Выберите товар для изменения цены:</b>",
         reply_markup=keyboard,
@@ -1158,7 +931,7 @@ async def cmd_change_price(message: Message, state: FSMContext):
     )
     await state.set_state(AdminStates.waiting_for_change_price_item)
 
-@router.callback_query(F.data.startswith("change_price_"))
+@router.callback_query(F.data.startswith("change_price_"), flags=ADMIN_ONLY)
 async def process_change_price_item(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора товара для изменения цены"""
     if await clear_state_on_command(callback.message, state):
@@ -1210,23 +983,15 @@ async def process_change_price_value(message: Message, state: FSMContext):
     
     await state.clear()
 
-@router.message(Command("change_name"))
+@router.message(Command("change_name"), flags=require_role("admin", denied="❌ Только администратор может изменять названия."))
 async def cmd_change_name(message: Message, state: FSMContext):
     """Обработчик команды /change_name"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может изменять названия.")
-        return
-    
-    # Получаем список всех товаров
-    items = await db.get_all_items()
-    if not items:
+    # Клавиатура с товарами строится заново только после изменения каталога
+    keyboard = await get_items_keyboard("change_name")
+    if keyboard is None:
         await message.answer("📚 Нет товаров для изменения названия.")
         return
     
-    # Создаем клавиатуру с товарами
-    from utils import create_items_keyboard
-    keyboard = create_items_keyboard(items, "change_name")
-    
     await message.answer(
         "📝 <b>Выберите товар для изменения названия:</b>",
         reply_markup=keyboard,
@@ -1234,7 +999,7 @@ async def cmd_change_name(message: Message, state: FSMContext):
     )
     await state.set_state(AdminStates.waiting_for_change_name_item)
 
-@router.callback_query(F.data.startswith("change_name_"))
+@router.callback_query(F.data.startswith("change_name_"), flags=ADMIN_ONLY)
 async def process_change_name_item(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора товара для изменения названия"""
     if await clear_state_on_command(callback.message, state):
@@ -1280,13 +1045,9 @@ async def process_change_name_value(message: Message, state: FSMContext):
     
     await state.clear()
 
-@router.message(Command("reload_literature"))
+@router.message(Command("reload_literature"), flags=require_role("admin", denied="❌ Только администратор может перезагружать литературу."))
 async def cmd_reload_literature(message: Message, state: FSMContext):
     """Обработчик команды /reload_literature - перезагрузка литературы"""
-    if not await db.is_admin(message.from_user.id):
-        await message.answer("❌ Только администратор может перезагружать литературу.")
-        return
-    
     await message.answer("🔄 <b>Начинаю перезагрузку литературы...</b>", parse_mode="HTML")
     
     try:
@@ -1294,16 +1055,11 @@ async def cmd_reload_literature(message: Message, state: FSMContext):
         from load_literature import LITERATURE_DATA
         
         # Очищаем существующие данные
-        conn = await db.get_connection()
-        await conn.execute('DELETE FROM literature')
-        await conn.close()
+        async with db.get_connection() as conn:
+            await conn.execute('DELETE FROM literature')
         
-        # Загружаем новые данные
-        loaded_count = 0
-        for name, category, price, cost, min_stock in LITERATURE_DATA:
-            success = await db.add_item(name, category, price, cost, min_stock)
-            if success:
-                loaded_count += 1
+        # Загружаем новые данные одной пачкой
+        loaded_count = await db.bulk_upsert_items(LITERATURE_DATA)
         
         await message.answer(
             f"✅ <b>Литература перезагружена!</b>\n\n"
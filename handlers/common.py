@@ -1,7 +1,8 @@
 import logging
+from typing import Optional
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
@@ -9,25 +10,35 @@ from aiogram.fsm.state import State, StatesGroup
 import os
 try:
     from db_postgres import db
-except ImportError:
+except (ImportError, ValueError):
     from db import db
-from utils import format_price_list, create_items_keyboard, create_quantity_keyboard, create_main_keyboard, create_admin_menu_keyboard, create_reports_keyboard, create_management_keyboard
+from middlewares import UserContext, require_role
+from metrics import record_sale
+from keyboards import get_items_keyboard
+from pagination import Paginator
+from sales import parse_order, resolve_order, sessions
+from handlers.meeting import add_to_session
+from utils import format_price_list, parse_keyboard_page_callback, create_quantity_keyboard, create_main_keyboard, create_confirmation_keyboard, create_admin_menu_keyboard, create_reports_keyboard, create_management_keyboard
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Флаги команд для администраторов и ведущих
+STAFF_ONLY = require_role("admin", "leader")
+
 # Состояния для FSM
 class SellStates(StatesGroup):
     waiting_for_item = State()
     waiting_for_quantity = State()
+    waiting_for_quick_sell_confirmation = State()
 
 @router.message(Command("start"))
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, user: UserContext):
     """Обработчик команды /start"""
-    logger.info(f"Получена команда /start от пользователя {message.from_user.id}")
+    logger.info(f"Получена команда /start от пользователя {user.tg_id}")
 
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
+    user_id = user.tg_id
+    role = user.role
     logger.info(f"Роль пользователя {user_id}: {role}")
 
     # Если команда вызвана в группе, проверяем права администратора
@@ -79,10 +90,9 @@ async def cmd_start(message: Message):
     logger.info(f"Отправлен ответ пользователю {user_id}: {text[:50]}...")
 
 @router.message(Command("help"))
-async def cmd_help(message: Message):
+async def cmd_help(message: Message, user: UserContext):
     """Обработчик команды /help"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
+    role = user.role
     
     if role == "admin":
         text = (
@@ -102,6 +112,8 @@ async def cmd_help(message: Message):
             "💰 Работа с продажами:\n"
             "• /price - прайс-лист\n"
             "• /sell - отметить продажу\n"
+            "• /sell Белый буклет 3; IP16 x2 - продать несколько позиций сразу\n"
+            "• /session - сессия собрания, /session_close - провести её продажи\n"
             "• /stock - текущие остатки"
         )
     elif role == "leader":
@@ -110,125 +122,46 @@ async def cmd_help(message: Message):
             "💰 Доступные команды:\n"
             "• /price - показать прайс-лист\n"
             "• /sell - отметить продажу\n"
-            "• /stock - показать текущие остатки\n\n"
-            "💡 Для продажи используйте /sell, выберите позицию и количество."
+            "• /stock - показать текущие остатки\n"
+            "• /session - сессия собрания: продажи копятся и проводятся разом по /session_close "
+            "(незакрытая корзина теряется при перезапуске бота)\n\n"
+            "💡 Для продажи используйте /sell, выберите позицию и количество.\n"
+            "⚡ Несколько позиций сразу: /sell Белый буклет 3; IP16 x2; брелок 30 дней"
         )
     else:
         text = "❌ У вас нет доступа к боту."
     
     await message.answer(text)
 
-@router.message(Command("price"))
+@router.message(Command("price"), flags=STAFF_ONLY)
 async def cmd_price(message: Message):
     """Обработчик команды /price с пагинацией"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
-    
-    if role not in ['admin', 'leader']:
-        await message.answer("❌ У вас нет доступа к этой команде.")
-        return
-    
-    price_data = await db.get_price_list()
-    if not price_data:
-        await message.answer("❌ Нет данных для прайс-листа.")
-        return
-    
     # Показываем первую страницу без FSM (простая пагинация)
-    await show_price_page_simple(message, price_data, 0)
-
-async def show_price_page_simple(message: Message, price_data: list, current_page: int):
-    """Показать страницу прайс-листа без FSM"""
-    items_per_page = 20
-    total_pages = (len(price_data) + items_per_page - 1) // items_per_page
-    start_idx = current_page * items_per_page
-    end_idx = start_idx + items_per_page
-    
-    page_items = price_data[start_idx:end_idx]
-    
-    text = f"💰 <b>Прайс-лист (стр. {current_page + 1}/{total_pages})</b>\n\n"
-    
-    for item in page_items:
-        name = item['name']
-        price = item['price']
-        stock = item['stock']
-        text += f"📚 {name[:40]}{'...' if len(name) > 40 else ''}\n"
-        text += f"   💰 {price:.0f} zł | 📦 {stock} шт.\n\n"
-    
-    # Создаем клавиатуру пагинации
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    keyboard = []
-    
-    if total_pages > 1:
-        row = []
-        if current_page > 0:
-            row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"price_prev_{current_page-1}"))
-        if current_page < total_pages - 1:
-            row.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"price_next_{current_page+1}"))
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton(text="❌ Закрыть", callback_data="price_close")])
-    
-    await message.answer(
-        text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
+    await price_pages.show(message)
+
+def format_price_item(item: dict) -> str:
+    """Строка прайс-листа"""
+    name = item['name']
+    return (
+        f"📚 {name[:40]}{'...' if len(name) > 40 else ''}\n"
+        f"   💰 {item['price']:.0f} zł | 📦 {item['stock']} шт.\n\n"
     )
 
-async def show_price_page(message: Message, state: FSMContext):
-    """Показать страницу прайс-листа с пагинацией"""
-    data = await state.get_data()
-    price_data = data.get('price_data', [])
-    current_page = data.get('current_page', 0)
-    items_per_page = data.get('items_per_page', 20)
-    
-    total_pages = (len(price_data) + items_per_page - 1) // items_per_page
-    start_idx = current_page * items_per_page
-    end_idx = start_idx + items_per_page
-    
-    page_items = price_data[start_idx:end_idx]
-    
-    text = f"💰 <b>Прайс-лист (стр. {current_page + 1}/{total_pages})</b>\n\n"
-    
-    for item in page_items:
-        name = item['name']
-        price = item['price']
-        display_name = name[:20] + "..." if len(name) > 20 else name
-        text += f"{display_name} — {price:.0f} zł\n"
-    
-    # Создаем клавиатуру пагинации
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    keyboard = []
-    
-    if total_pages > 1:
-        row = []
-        if current_page > 0:
-            row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data="price_prev"))
-        if current_page < total_pages - 1:
-            row.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data="price_next"))
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton(text="❌ Закрыть", callback_data="price_close")])
-    
-    await message.answer(
-        text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
-        parse_mode="HTML"
-    )
+price_pages = Paginator(
+    db, "price", "💰 Прайс-лист", 20, format_price_item,
+    "❌ Нет данных для прайс-листа.", in_stock_only=True
+)
 
-@router.callback_query(F.data.startswith("price_prev_"))
+@router.callback_query(F.data.startswith("price_prev_"), flags=STAFF_ONLY)
 async def price_prev(callback: CallbackQuery):
     """Предыдущая страница прайс-листа"""
-    page_num = int(callback.data.split("_")[2])
-    price_data = await db.get_price_list()
-    await show_price_page_simple(callback.message, price_data, page_num)
+    await price_pages.show_prev(callback)
     await callback.answer()
 
-@router.callback_query(F.data.startswith("price_next_"))
+@router.callback_query(F.data.startswith("price_next_"), flags=STAFF_ONLY)
 async def price_next(callback: CallbackQuery):
     """Следующая страница прайс-листа"""
-    page_num = int(callback.data.split("_")[2])
-    price_data = await db.get_price_list()
-    await show_price_page_simple(callback.message, price_data, page_num)
+    await price_pages.show_next(callback)
     await callback.answer()
 
 @router.callback_query(F.data == "price_close")
@@ -239,40 +172,33 @@ async def price_close(callback: CallbackQuery):
 
 # ===== ОБРАБОТЧИКИ КНОПОК ДЛЯ ВЕДУЩЕГО =====
 
-@router.callback_query(F.data == "leader_price")
+@router.callback_query(F.data == "leader_price", flags=STAFF_ONLY)
 async def leader_price_button(callback: CallbackQuery):
     """Обработчик кнопки прайс-лист для ведущего"""
     await callback.answer()
     await cmd_price(callback.message)
 
-@router.callback_query(F.data == "leader_sell")
+@router.callback_query(F.data == "leader_sell", flags=STAFF_ONLY)
 async def leader_sell_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик кнопки продажа для ведущего"""
     await callback.answer()
-    await cmd_sell(callback.message, state)
+    await show_sell_menu(callback.message, state)
 
-@router.callback_query(F.data == "leader_stock")
+@router.callback_query(F.data == "leader_stock", flags=STAFF_ONLY)
 async def leader_stock_button(callback: CallbackQuery):
     """Обработчик кнопки остатки для ведущего"""
     await callback.answer()
     await cmd_stock(callback.message)
 
 @router.callback_query(F.data == "leader_help")
-async def leader_help_button(callback: CallbackQuery):
+async def leader_help_button(callback: CallbackQuery, user: UserContext):
     """Обработчик кнопки помощь для ведущего"""
     await callback.answer()
-    await cmd_help(callback.message)
+    await cmd_help(callback.message, user)
 
-@router.message(Command("stock"))
+@router.message(Command("stock"), flags=STAFF_ONLY)
 async def cmd_stock(message: Message):
     """Обработчик команды /stock"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
-    
-    if role not in ['admin', 'leader']:
-        await message.answer("❌ У вас нет доступа к этой команде.")
-        return
-    
     report_data = await db.get_stock_report()
     if not report_data:
         await message.answer("📚 Нет данных об остатках.")
@@ -288,23 +214,22 @@ async def cmd_stock(message: Message):
     
     await message.answer(text)
 
-@router.message(Command("sell"))
-async def cmd_sell(message: Message, state: FSMContext):
+@router.message(Command("sell"), flags=STAFF_ONLY)
+async def cmd_sell(message: Message, state: FSMContext, command: Optional[CommandObject] = None):
     """Обработчик команды /sell"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
-    
-    if role not in ['admin', 'leader']:
-        await message.answer("❌ У вас нет доступа к этой команде.")
+    if command and command.args:
+        await quick_sell(message, state, command.args)
         return
-    
-    items = await db.get_all_items()
-    if not items:
+    await show_sell_menu(message, state)
+
+async def show_sell_menu(message: Message, state: FSMContext):
+    """Меню выбора позиции для продажи (команда /sell и кнопка ведущего)"""
+    # Показываем категории для удобства
+    keyboard = await get_items_keyboard("sell", category=None)
+    if keyboard is None:
         await message.answer("❌ Нет доступных позиций для продажи.")
         return
     
-    # Показываем категории для удобства
-    keyboard = create_items_keyboard(items, "sell", show_categories=True)
     await message.answer(
         "💰 <b>Выберите категорию или товар для продажи:</b>\n\n"
         "📂 Используйте категории для удобного поиска\n"
@@ -314,7 +239,7 @@ async def cmd_sell(message: Message, state: FSMContext):
     )
     await state.set_state(SellStates.waiting_for_item)
 
-@router.callback_query(F.data.startswith("sell_"))
+@router.callback_query(F.data.startswith("sell_"), flags=STAFF_ONLY)
 async def process_item_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора позиции для продажи"""
     await callback.answer()
@@ -336,21 +261,20 @@ async def process_item_selection(callback: CallbackQuery, state: FSMContext):
     )
     await state.set_state(SellStates.waiting_for_quantity)
 
-@router.callback_query(F.data.startswith("category_"))
+@router.callback_query(F.data.startswith("category_"), flags=STAFF_ONLY)
 async def process_category_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора категории"""
     await callback.answer()
 
     category = callback.data[9:]  # Убираем "category_"
 
-    items = await db.get_all_items()
-    if not items:
+    keyboard = await get_items_keyboard("sell", "" if category == "all" else category)
+    if keyboard is None:
         await callback.message.edit_text("❌ Нет товаров для продажи.")
         return
 
     if category == "all":
         # Показываем все товары
-        keyboard = create_items_keyboard(items, "sell")
         await callback.message.edit_text(
             "📚 <b>Все товары:</b>\n\nВыберите позицию для продажи:",
             reply_markup=keyboard,
@@ -358,25 +282,37 @@ async def process_category_selection(callback: CallbackQuery, state: FSMContext)
         )
     else:
         # Показываем товары из категории
-        from utils import create_category_keyboard
-        keyboard = create_category_keyboard(items, category, "sell")
         await callback.message.edit_text(
             f"📂 <b>Категория: {category}</b>\n\nВыберите позицию для продажи:",
             reply_markup=keyboard,
             parse_mode="HTML"
         )
 
-@router.callback_query(F.data == "back_to_categories")
+@router.callback_query(F.data.startswith(("ipage:", "cpage:")), flags=STAFF_ONLY)
+async def items_keyboard_page(callback: CallbackQuery, user: UserContext):
+    """Листание клавиатуры позиций или меню категорий"""
+    action, category, page = parse_keyboard_page_callback(callback.data)
+    if action != "sell" and not user.is_admin:
+        await callback.answer("❌ Только администратор может это сделать.", show_alert=True)
+        return
+    await callback.answer()
+
+    keyboard = await get_items_keyboard(action, category, page)
+    if keyboard is None:
+        await callback.message.edit_text("❌ Нет товаров.")
+        return
+    await callback.message.edit_reply_markup(reply_markup=keyboard)
+
+@router.callback_query(F.data == "back_to_categories", flags=STAFF_ONLY)
 async def back_to_categories(callback: CallbackQuery, state: FSMContext):
     """Возврат к выбору категорий"""
     await callback.answer()
 
-    items = await db.get_all_items()
-    if not items:
+    keyboard = await get_items_keyboard("sell", category=None)
+    if keyboard is None:
         await callback.message.edit_text("❌ Нет товаров для продажи.")
         return
 
-    keyboard = create_items_keyboard(items, "sell", show_categories=True)
     await callback.message.edit_text(
         "💰 <b>Выберите категорию или товар для продажи:</b>\n\n"
         "📂 Используйте категории для удобного поиска\n"
@@ -385,7 +321,7 @@ async def back_to_categories(callback: CallbackQuery, state: FSMContext):
         parse_mode="HTML"
     )
 
-@router.callback_query(F.data.startswith("qty_"))
+@router.callback_query(F.data.startswith("qty_"), flags=STAFF_ONLY)
 async def process_quantity_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора количества"""
     await callback.answer()
@@ -421,6 +357,7 @@ async def process_custom_quantity(message: Message, state: FSMContext):
         class FakeCallback:
             def __init__(self, message):
                 self.message = message
+                self.from_user = message.from_user
                 self.data = ""
             
             async def answer(self):
@@ -437,26 +374,130 @@ async def process_custom_quantity(message: Message, state: FSMContext):
 
 async def process_sale(callback, state: FSMContext, item_name: str, quantity: int):
     """Обработка продажи"""
-    success, message_text = await db.sell_item(item_name, quantity)
+    reply = callback.message.edit_text if isinstance(callback, CallbackQuery) else callback.message.answer
+    session = sessions.get(callback.message.chat.id)
+    if session is not None:
+        # Во время собрания продажа копится в корзине сессии
+        await reply(await add_to_session(session, [(item_name, quantity)], callback.from_user.id))
+        await state.clear()
+        return
+    
+    reserved = sessions.reserved(item_name)
+    if reserved:
+        # Часть остатка зарезервирована открытыми сессиями собраний
+        item = await db.get_item_by_name(item_name)
+        if item and item['stock'] - reserved < quantity:
+            await reply(f"❌ Недостаточно товара: {reserved} шт. зарезервировано сессиями собраний. "
+                        f"Доступно: {max(item['stock'] - reserved, 0)} шт.")
+            await state.clear()
+            return
+    
+    success, message_text, sale = await db.sell_item(
+        item_name, quantity, seller_id=callback.from_user.id, chat_id=callback.message.chat.id
+    )
     
     if success:
+        record_sale(quantity)
         # Проверяем, не стал ли остаток ниже минимума
-        report_data = await db.get_stock_report()
-        for item in report_data:
-            if item['name'] == item_name and item['stock'] <= item['min_stock']:
-                message_text += f"\n\n⚠️ Остаток {item_name} ниже минимума ({item['stock']}/{item['min_stock']})."
-                break
-        
-        if hasattr(callback, 'message') and hasattr(callback.message, 'edit_text'):
-            await callback.message.edit_text(f"✅ {message_text}")
-        else:
-            await callback.message.answer(f"✅ {message_text}")
+        if sale['stock'] <= sale['min_stock']:
+            message_text += f"\n\n⚠️ Остаток {item_name} ниже минимума ({sale['stock']}/{sale['min_stock']})."
+        await reply(f"✅ {message_text}")
     else:
-        if hasattr(callback, 'message') and hasattr(callback.message, 'edit_text'):
-            await callback.message.edit_text(f"❌ {message_text}")
-        else:
-            await callback.message.answer(f"❌ {message_text}")
+        await reply(f"❌ {message_text}")
+    
+    await state.clear()
+
+async def quick_sell(message: Message, state: FSMContext, text: str):
+    """/sell с текстом: несколько позиций одним сообщением и одно подтверждение"""
+    lines = await resolve_order(parse_order(text), db.search_items)
+    
+    problems = []
+    for line in lines:
+        if line.item is None:
+            if line.candidates:
+                variants = ", ".join(item['name'] for item in line.candidates[:5])
+                problems.append(f"❓ «{line.text}» - уточните: {variants}")
+            else:
+                problems.append(f"❌ «{line.text}» - позиция не найдена")
+        elif line.qty <= 0:
+            problems.append(f"❌ «{line.text}» - количество должно быть больше 0")
+    if problems:
+        await message.answer("⚠️ Продажа не оформлена:\n\n" + "\n".join(problems))
+        return
+    
+    # Одинаковые позиции из разных строк складываем
+    order = {}
+    for line in lines:
+        order[line.item['name']] = order.get(line.item['name'], 0) + line.qty
+    items = {line.item['name']: line.item for line in lines}
+    
+    # Проверка по снимку каталога (за вычетом резерва сессий) экономит лишний
+    # круг с подтверждением; окончательно остаток проверяется при проведении
+    available = {name: items[name]['stock'] - sessions.reserved(name) for name in order}
+    shortages = [f"❌ {name}: нужно {qty}, доступно {max(available[name], 0)} шт."
+                 for name, qty in order.items() if available[name] < qty]
+    if shortages:
+        await message.answer("⚠️ Не хватает товара, ничего не продано:\n\n" + "\n".join(shortages))
+        return
+    
+    total = sum(items[name]['price'] * qty for name, qty in order.items())
+    if sessions.get(message.chat.id) is not None:
+        text = "🛒 <b>В корзину сессии собрания:</b>\n\n"
+    else:
+        text = "🧾 <b>Продажа:</b>\n\n"
+    for name, qty in order.items():
+        text += f"• {name} ×{qty} — {items[name]['price'] * qty:.0f} zł\n"
+    text += f"\n💰 <b>Итого: {total:.0f} zł</b>"
+    
+    await state.set_state(SellStates.waiting_for_quick_sell_confirmation)
+    await state.update_data(quick_sell=[[name, qty] for name, qty in order.items()])
+    await message.answer(text, reply_markup=create_confirmation_keyboard("quick_sell", "cancel_quick_sell"), parse_mode="HTML")
+
+@router.callback_query(SellStates.waiting_for_quick_sell_confirmation, F.data == "confirm_quick_sell", flags=STAFF_ONLY)
+async def confirm_quick_sell(callback: CallbackQuery, state: FSMContext):
+    """Проведение продажи нескольких позиций одной транзакцией"""
+    await callback.answer()
+    
+    data = await state.get_data()
+    order = [(name, qty) for name, qty in data.get('quick_sell', [])]
+    await state.clear()
+    if not order:
+        await callback.message.edit_text("❌ Нет продажи для подтверждения.")
+        return
+    
+    session = sessions.get(callback.message.chat.id)
+    if session is not None:
+        await callback.message.edit_text(await add_to_session(session, order, callback.from_user.id))
+        return
     
+    success, lines = await db.sell_items(order, seller_id=callback.from_user.id, chat_id=callback.message.chat.id)
+    if not success:
+        if not lines:
+            await callback.message.edit_text("❌ Ошибка при проведении продажи.")
+            return
+        text = "❌ Продажа не проведена, ничего не списано:\n\n"
+        text += "\n".join(f"• {line['name']} ×{line['qty']}: {line['error']}" for line in lines)
+        await callback.message.edit_text(text)
+        return
+    
+    text = "✅ Продано:\n\n"
+    warnings = []
+    for line in lines:
+        record_sale(line['qty'])
+        text += f"• {line['name']} ×{line['qty']} — осталось {line['stock']} шт.\n"
+        if line['stock'] <= line['min_stock']:
+            warnings.append(f"⚠️ Остаток {line['name']} ниже минимума ({line['stock']}/{line['min_stock']}).")
+    total = sum(line['price'] * line['qty'] for line in lines)
+    text += f"\n💰 Сумма: {total:.0f} zł"
+    if warnings:
+        text += "\n\n" + "\n".join(warnings)
+    await callback.message.edit_text(text)
+
+@router.callback_query(F.data == "cancel_quick_sell")
+async def cancel_quick_sell(callback: CallbackQuery, state: FSMContext):
+    """Отмена продажи нескольких позиций"""
+    await callback.answer()
+    await callback.message.edit_text("❌ Продажа отменена.")
     await state.clear()
 
 @router.callback_query(F.data == "cancel_sell")
@@ -468,14 +509,11 @@ async def cancel_sell(callback: CallbackQuery, state: FSMContext):
 
 # Обработчики кнопок
 @router.message(lambda message: message.text == "👑 Стать администратором")
-async def handle_become_admin(message: Message):
+async def handle_become_admin(message: Message, user: UserContext):
     """Обработка кнопки 'Стать администратором'"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
-    
-    if role is None:
+    if user.role is None:
         # Добавляем пользователя как администратора
-        success = await db.add_user(user_id, "admin", message.from_user.full_name)
+        success = await db.add_user(user.tg_id, "admin", user.full_name)
         if success:
             await message.answer(
                 "✅ Вы назначены администратором!\n\n"
@@ -511,23 +549,16 @@ async def handle_stock(message: Message):
     
     await message.answer(text)
 
-@router.message(lambda message: message.text == "💰 Продажа")
+@router.message(lambda message: message.text == "💰 Продажа",
+                flags=require_role("admin", "leader", denied="❌ У вас нет прав для продажи товаров."))
 async def handle_sell_button(message: Message):
     """Обработка кнопки 'Продажа'"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
-    
-    if role not in ["admin", "leader"]:
-        await message.answer("❌ У вас нет прав для продажи товаров.")
-        return
-    
-    # Получаем список товаров для продажи
-    items = await db.get_all_items()
-    if not items:
+    # Клавиатура со всеми товарами для продажи
+    keyboard = await get_items_keyboard("sell")
+    if keyboard is None:
         await message.answer("❌ Нет товаров для продажи.")
         return
     
-    keyboard = create_items_keyboard(items, "sell")
     await message.answer(
         "💰 <b>Продажа товара</b>\n\n"
         "Выберите товар для продажи:",
@@ -535,16 +566,10 @@ async def handle_sell_button(message: Message):
         parse_mode="HTML"
     )
 
-@router.message(lambda message: message.text == "📈 Отчёты")
+@router.message(lambda message: message.text == "📈 Отчёты",
+                flags=require_role("admin", denied="❌ Только администратор может просматривать отчёты."))
 async def handle_reports_button(message: Message):
     """Обработка кнопки 'Отчёты' (только для админов)"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
-    
-    if role != "admin":
-        await message.answer("❌ Только администратор может просматривать отчёты.")
-        return
-    
     keyboard = create_reports_keyboard()
     await message.answer(
         "📊 <b>Отчёты и аналитика</b>\n\n"
@@ -553,16 +578,10 @@ async def handle_reports_button(message: Message):
         parse_mode="HTML"
     )
 
-@router.message(lambda message: message.text == "⚙️ Управление")
+@router.message(lambda message: message.text == "⚙️ Управление",
+                flags=require_role("admin", denied="❌ Только администратор может управлять системой."))
 async def handle_management_button(message: Message):
     """Обработка кнопки 'Управление' (только для админов)"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
-    
-    if role != "admin":
-        await message.answer("❌ Только администратор может управлять системой.")
-        return
-    
     keyboard = create_management_keyboard()
     await message.answer(
         "⚙️ <b>Управление системой</b>\n\n"
@@ -572,10 +591,9 @@ async def handle_management_button(message: Message):
     )
 
 @router.message(lambda message: message.text == "❓ Помощь")
-async def handle_help_button(message: Message):
+async def handle_help_button(message: Message, user: UserContext):
     """Обработка кнопки 'Помощь'"""
-    user_id = message.from_user.id
-    role = await db.get_user_role(user_id)
+    role = user.role
     
     if role == "admin":
         text = (
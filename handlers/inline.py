@@ -0,0 +1,115 @@
+import logging
+from aiogram import Router, F
+from aiogram.types import (
+    CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, InlineQuery,
+    InlineQueryResultArticle, InputTextMessageContent
+)
+
+# Используем ту же базу данных, что и в main.py
+try:
+    from db_postgres import db
+except (ImportError, ValueError):
+    from db import db
+from config import INLINE_CACHE_TIME, INLINE_RESULTS_LIMIT
+from middlewares import require_role
+from metrics import record_sale
+from sales import sessions
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Inline-режим и продажа из inline-сообщения - только для администраторов и ведущих
+STAFF_ONLY = require_role("admin", "leader", denied="❌ Продавать могут только администратор и ведущие.")
+
+# Количества на кнопках inline-сообщения
+INLINE_QUANTITIES = (1, 2, 3, 5, 10)
+
+
+def create_inline_quantity_keyboard(item_id: int) -> InlineKeyboardMarkup:
+    """Кнопки количества под inline-сообщением: ID позиции зашит в callback_data"""
+    buttons = [InlineKeyboardButton(text=str(qty), callback_data=f"iqty_{item_id}_{qty}")
+               for qty in INLINE_QUANTITIES]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        buttons[:3],
+        buttons[3:],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="iqty_cancel")]
+    ])
+
+
+def format_inline_item(item: dict) -> str:
+    """Строка цены и остатка для результата inline-запроса"""
+    stock = f"{item['stock']} шт." if item['stock'] > 0 else "нет в наличии"
+    return f"💰 {item['price']} zł · 📦 {stock}"
+
+
+@router.inline_query(flags=STAFF_ONLY)
+async def inline_search(inline_query: InlineQuery):
+    """@бот запрос: позиции из индекса названий с ценой и остатком"""
+    query = inline_query.query.strip()
+    if query:
+        items = await db.search_items(query, limit=INLINE_RESULTS_LIMIT)
+    else:
+        # Пустой запрос - первые позиции в наличии
+        items = [item for item in await db.get_all_items() if item['stock'] > 0][:INLINE_RESULTS_LIMIT]
+
+    results = [
+        InlineQueryResultArticle(
+            id=str(item['id']),
+            title=item['name'],
+            description=format_inline_item(item),
+            input_message_content=InputTextMessageContent(
+                message_text=f"📦 {item['name']}\n{format_inline_item(item)}\n\nВыберите количество:"
+            ),
+            reply_markup=create_inline_quantity_keyboard(item['id'])
+        )
+        for item in items
+    ]
+    # Остатки меняются с каждой продажей, поэтому кэш Telegram короткий
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+
+@router.callback_query(F.data == "iqty_cancel", flags=STAFF_ONLY)
+async def inline_sell_cancel(callback: CallbackQuery):
+    """Отмена продажи из inline-сообщения"""
+    await callback.answer()
+    await callback.bot.edit_message_text("❌ Продажа отменена.", inline_message_id=callback.inline_message_id)
+
+
+@router.callback_query(F.data.startswith("iqty_"), flags=STAFF_ONLY)
+async def inline_sell(callback: CallbackQuery):
+    """Продажа по кнопке количества под inline-сообщением"""
+    try:
+        _, item_id, quantity = callback.data.split("_")
+        item_id, quantity = int(item_id), int(quantity)
+    except ValueError:
+        await callback.answer("❌ Ошибка в количестве.", show_alert=True)
+        return
+
+    item = await db.get_item_by_id(item_id)
+    if not item:
+        await callback.answer("❌ Товар не найден.", show_alert=True)
+        return
+
+    reserved = sessions.reserved(item['name'])
+    if reserved and item['stock'] - reserved < quantity:
+        # Часть остатка зарезервирована открытыми сессиями собраний
+        await callback.answer(f"❌ Недостаточно товара: {reserved} шт. зарезервировано сессиями собраний. "
+                              f"Доступно: {max(item['stock'] - reserved, 0)} шт.", show_alert=True)
+        return
+
+    # Inline-сообщение может быть в любом чате, бот знает только его inline_message_id;
+    # по нему база проводит продажу один раз - повторные нажатия и нажатия после перезапуска отклоняются
+    success, message_text, sale = await db.sell_item(
+        item['name'], quantity, seller_id=callback.from_user.id, inline_message_id=callback.inline_message_id
+    )
+
+    if not success:
+        # Сообщение остаётся с кнопками - можно выбрать меньшее количество
+        await callback.answer(f"❌ {message_text}", show_alert=True)
+        return
+
+    record_sale(quantity)
+    await callback.answer()
+    if sale['stock'] <= sale['min_stock']:
+        message_text += f"\n\n⚠️ Остаток {item['name']} ниже минимума ({sale['stock']}/{sale['min_stock']})."
+    await callback.bot.edit_message_text(f"✅ {message_text}", inline_message_id=callback.inline_message_id)
@@ -3,12 +3,8 @@ from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
 
-# Используем ту же базу данных, что и в main.py
 import os
-try:
-    from db_postgres import db
-except ImportError:
-    from db import db
+from middlewares import require_role
 from utils import format_price_list
 
 logger = logging.getLogger(__name__)
@@ -17,13 +13,9 @@ router = Router()
 # Этот файл содержит обработчики, специфичные для ведущих
 # Основные команды ведущих уже реализованы в common.py
 
-@router.message(Command("leader_help"))
+@router.message(Command("leader_help"), flags=require_role("leader"))
 async def cmd_leader_help(message: Message):
     """Дополнительная справка для ведущих"""
-    if not await db.is_leader(message.from_user.id):
-        await message.answer("❌ У вас нет доступа к этой команде.")
-        return
-    
     text = (
         "📚 Дополнительная справка для ведущих:\n\n"
         "💡 Советы по работе:\n"
@@ -0,0 +1,170 @@
+import logging
+from typing import List, Tuple
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.filters import Command, CommandObject
+
+# Используем ту же базу данных, что и в main.py
+try:
+    from db_postgres import db
+except (ImportError, ValueError):
+    from db import db
+from middlewares import UserContext, require_role
+from metrics import record_sale
+from sales import MeetingSession, sessions
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Сессиями собраний управляют администратор и ведущие
+STAFF_ONLY = require_role("admin", "leader")
+
+
+async def add_to_session(session: MeetingSession, order: List[Tuple[str, int]], seller_id: int) -> str:
+    """Резерв позиций продавца в корзину сессии; ответ для пользователя"""
+    lines = []
+    for name, qty in order:
+        item = await db.get_item_by_name(name)
+        if not item:
+            return f"❌ Позиция не найдена: {name}"
+        lines.append((item, qty))
+
+    shortages = sessions.reserve(session, lines, seller_id)
+    if shortages:
+        return ("❌ Не хватает товара с учётом резерва открытых сессий, в корзину ничего не добавлено:\n\n"
+                + "\n".join(f"• {line}" for line in shortages))
+
+    added = "\n".join(f"• {item['name']} ×{qty}" for item, qty in lines)
+    return (f"🛒 Добавлено в сессию:\n{added}\n\n"
+            f"В корзине: {session.total_qty} шт. на {session.revenue:.0f} zł")
+
+
+def create_session_keyboard(session: MeetingSession) -> InlineKeyboardMarkup:
+    """Кнопки сессии: убрать позицию из корзины, провести, отменить"""
+    keyboard = [
+        [InlineKeyboardButton(text=f"🗑 {name[:30]} ×{qty}", callback_data=f"session_drop_{session.item_ids[name]}")]
+        for name, qty in session.cart.items()
+    ]
+    keyboard.append([InlineKeyboardButton(text="✅ Закрыть и провести", callback_data="session_close")])
+    keyboard.append([InlineKeyboardButton(text="❌ Отменить сессию", callback_data="session_cancel")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def format_session(session: MeetingSession) -> str:
+    """Состояние сессии: корзина и сумма"""
+    title = f" «{session.title}»" if session.title else ""
+    text = f"🟢 <b>Сессия собрания{title}</b> (с {session.opened_at:%H:%M})\n\n"
+    if not session.cart:
+        return text + "🛒 Корзина пуста. Продажи через /sell попадут сюда."
+    for name, qty in session.cart.items():
+        text += f"• {name} ×{qty} — {session.prices[name] * qty:.0f} zł\n"
+    text += f"\n📦 {session.total_qty} шт., 💰 {session.revenue:.0f} zł"
+    return text
+
+
+@router.message(Command("session"), flags=STAFF_ONLY)
+async def cmd_session(message: Message, command: CommandObject, user: UserContext):
+    """Открытие сессии собрания в чате или показ текущей корзины"""
+    session = sessions.get(message.chat.id)
+    if session is None:
+        session = sessions.open(message.chat.id, user.tg_id, (command.args or "").strip())
+        logger.info(f"Открыта сессия собрания в чате {message.chat.id}")
+        await message.answer(
+            format_session(session) + "\n\n"
+            "Продажи через /sell копятся в корзине с резервом остатка и проводятся "
+            "одной транзакцией по /session_close.\n\n"
+            "⚠️ Корзина хранится только в памяти бота: при перезапуске бота "
+            "непроведённые продажи теряются, закрывайте сессию в конце собрания.",
+            parse_mode="HTML"
+        )
+        return
+
+    await message.answer(format_session(session), reply_markup=create_session_keyboard(session), parse_mode="HTML")
+
+
+async def close_session(chat_id: int) -> str:
+    """Проведение корзины сессии одной транзакцией и итог собрания"""
+    session = sessions.detach(chat_id)
+    if session is None:
+        return "❌ В этом чате нет открытой сессии."
+
+    if not session.cart:
+        sessions.release(session)
+        return "✅ Сессия закрыта, продаж не было."
+
+    # В журнал каждая продажа пишется на того, кто её добавил в корзину
+    success, lines = await db.sell_items(session.sales(), seller_id=session.opened_by, chat_id=chat_id)
+    if not success:
+        sessions.attach(session)
+        if not lines:
+            return "❌ Ошибка при проведении продаж. Сессия осталась открытой, попробуйте ещё раз: /session_close"
+        problems = "\n".join(f"• {line['name']} ×{line['qty']}: {line['error']}" for line in lines)
+        return (f"❌ Продажи не проведены, ничего не списано:\n\n{problems}\n\n"
+                "Сессия осталась открытой: уберите позиции через /session или пополните остаток.")
+
+    sessions.release(session)
+    title = f" «{session.title}»" if session.title else ""
+    text = f"🏁 <b>Итоги собрания{title}</b>\n\n"
+    warnings = []
+    for line in lines:
+        record_sale(line['qty'])
+        text += f"• {line['name']} ×{line['qty']} — {line['price'] * line['qty']:.0f} zł (осталось {line['stock']} шт.)\n"
+        if line['stock'] <= line['min_stock']:
+            warnings.append(f"⚠️ Остаток {line['name']} ниже минимума ({line['stock']}/{line['min_stock']}).")
+    revenue = sum(line['price'] * line['qty'] for line in lines)
+    text += f"\n📦 Позиций: {len(lines)}, штук: {sum(line['qty'] for line in lines)}\n💰 Выручка: {revenue:.0f} zł"
+    if warnings:
+        text += "\n\n" + "\n".join(warnings)
+    logger.info(f"Сессия собрания в чате {chat_id} проведена: {len(lines)} позиций, {revenue:.0f} zł")
+    return text
+
+
+def cancel_session(chat_id: int) -> str:
+    """Отмена сессии: корзина очищается, резерв снимается"""
+    session = sessions.detach(chat_id)
+    if session is None:
+        return "❌ В этом чате нет открытой сессии."
+    sessions.release(session)
+    logger.info(f"Сессия собрания в чате {chat_id} отменена ({session.total_qty} шт. не проведено)")
+    return f"❌ Сессия отменена, корзина очищена ({session.total_qty} шт. не проведено)."
+
+
+@router.message(Command("session_close"), flags=STAFF_ONLY)
+async def cmd_session_close(message: Message):
+    """Закрытие сессии собрания с проведением продаж"""
+    await message.answer(await close_session(message.chat.id), parse_mode="HTML")
+
+
+@router.callback_query(F.data == "session_close", flags=STAFF_ONLY)
+async def session_close_button(callback: CallbackQuery):
+    """Кнопка закрытия сессии"""
+    await callback.answer()
+    await callback.message.edit_text(await close_session(callback.message.chat.id), parse_mode="HTML")
+
+
+@router.message(Command("session_cancel"), flags=STAFF_ONLY)
+async def cmd_session_cancel(message: Message):
+    """Отмена сессии собрания без проведения"""
+    await message.answer(cancel_session(message.chat.id))
+
+
+@router.callback_query(F.data == "session_cancel", flags=STAFF_ONLY)
+async def session_cancel_button(callback: CallbackQuery):
+    """Кнопка отмены сессии"""
+    await callback.answer()
+    await callback.message.edit_text(cancel_session(callback.message.chat.id))
+
+
+@router.callback_query(F.data.startswith("session_drop_"), flags=STAFF_ONLY)
+async def session_drop_button(callback: CallbackQuery):
+    """Удаление позиции из корзины сессии"""
+    session = sessions.get(callback.message.chat.id)
+    if session is None:
+        await callback.answer("❌ Сессия уже закрыта.", show_alert=True)
+        return
+
+    item_id = int(callback.data.split("_")[2])
+    sessions.drop(session, item_id)
+    await callback.answer()
+    await callback.message.edit_text(format_session(session), reply_markup=create_session_keyboard(session),
+                                     parse_mode="HTML")
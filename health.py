@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+
+from config import HEALTH_SAMPLE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Шаг замера задержки event loop, сек
+LAG_PROBE_INTERVAL = 1.0
+
+
+class HealthMonitor:
+    """Фоновый сбор состояния сервиса для /health, /ready и /status
+
+    Раз в HEALTH_SAMPLE_INTERVAL секунд пингует базу и считает позиции каталога,
+    каждую секунду замеряет задержку event loop. Эндпоинты отдают готовый снимок
+    и сами в базу не ходят.
+    """
+
+    def __init__(self, db, interval: float = HEALTH_SAMPLE_INTERVAL):
+        self.db = db
+        self.interval = interval
+        self.started_at = time.time()
+        self.last_update_at: Optional[float] = None
+        self.updates = 0
+        self._snapshot: Dict[str, Any] = {
+            'database': 'unknown',
+            'db_latency_ms': None,
+            'items_count': None,
+            'sampled_at': None,
+        }
+        self.loop_lag_ms = 0.0
+        self.max_loop_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def sample(self):
+        """Один замер состояния базы"""
+        started = time.perf_counter()
+        ok = await self.db.ping()
+        latency = (time.perf_counter() - started) * 1000
+        snapshot = {
+            'database': 'connected' if ok else 'unavailable',
+            'db_latency_ms': round(latency, 2),
+            'items_count': await self.db.count_items() if ok else self._snapshot['items_count'],
+            'sampled_at': time.time(),
+        }
+        self._snapshot = snapshot
+        if not ok:
+            logger.warning("Проверка здоровья: база данных недоступна")
+
+    async def _run(self):
+        next_sample = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= next_sample:
+                next_sample = now + self.interval
+                try:
+                    await self.sample()
+                except Exception as e:
+                    logger.error(f"Ошибка проверки здоровья: {e}")
+            probe_started = time.monotonic()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            lag = max(0.0, time.monotonic() - probe_started - LAG_PROBE_INTERVAL) * 1000
+            self.loop_lag_ms = round(lag, 2)
+            self.max_loop_lag_ms = max(self.max_loop_lag_ms, self.loop_lag_ms)
+
+    def start(self):
+        """Запуск фонового сбора"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фонового сбора"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def mark_update(self):
+        """Отметка об обработанном апдейте"""
+        self.updates += 1
+        self.last_update_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Последний снимок состояния"""
+        now = time.time()
+        return {
+            **self._snapshot,
+            'loop_lag_ms': self.loop_lag_ms,
+            'max_loop_lag_ms': self.max_loop_lag_ms,
+            'updates': self.updates,
+            'last_update_ago': round(now - self.last_update_at, 1) if self.last_update_at else None,
+            'uptime': round(now - self.started_at, 1),
+        }
+
+    def liveness(self) -> Tuple[bool, Dict[str, Any]]:
+        """Процесс жив: фоновый сбор работает"""
+        alive = self._task is not None and not self._task.done()
+        return alive, {'status': 'alive' if alive else 'stalled', 'loop_lag_ms': self.loop_lag_ms}
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """Готов принимать запросы: база отвечала при последнем свежем замере"""
+        snapshot = self.snapshot()
+        sampled_at = snapshot['sampled_at']
+        fresh = sampled_at is not None and time.time() - sampled_at < self.interval * 3
+        ready = fresh and snapshot['database'] == 'connected'
+        return ready, {'status': 'ready' if ready else 'not_ready', **snapshot}
+
+
+class UpdateTrackerMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: время последнего обработанного апдейта"""
+
+    def __init__(self, monitor: HealthMonitor):
+        self.monitor = monitor
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            self.monitor.mark_update()
@@ -98,24 +98,22 @@ async def init_all_literature():
     print("Инициализация базы данных литературы АН")
     print("=" * 60)
     
-    await db.init_db()
+    await db.init_database()
     print("✅ База данных инициализирована\n")
     
-    success_count = 0
-    fail_count = 0
-    
     print(f"Добавление {len(LITERATURE_DATA)} позиций...\n")
     
-    for name, category, price, cost, min_stock in LITERATURE_DATA:
-        success = await db.add_item(name, category, price, cost, min_stock)
-        if success:
+    # Загружаем всю литературу одной транзакцией
+    success_count = await db.bulk_upsert_items(LITERATURE_DATA)
+    fail_count = 0 if success_count else len(LITERATURE_DATA)
+    
+    if success_count:
+        for name, category, price, cost, min_stock in LITERATURE_DATA:
             profit_margin = ((price - cost) / price) * 100
             print(f"✅ {name}")
             print(f"   Категория: {category}, Цена: {price:.0f}₽, Себестоимость: {cost:.0f}₽, Маржа: {profit_margin:.1f}%")
-            success_count += 1
-        else:
-            print(f"❌ Ошибка: {name}")
-            fail_count += 1
+    else:
+        print("❌ Ошибка загрузки литературы")
     
     print("\n" + "=" * 60)
     print(f"Инициализация завершена!")
@@ -0,0 +1,41 @@
+from typing import Optional
+
+from aiogram.types import InlineKeyboardMarkup
+
+# Используем ту же базу данных, что и в main.py
+try:
+    from db_postgres import db
+except (ImportError, ValueError):
+    from db import db
+from cache import KeyboardCache
+from config import KEYBOARD_CACHE_SIZE
+from utils import create_items_keyboard
+
+# Готовые клавиатуры с позициями; сбрасываются при смене состава каталога
+keyboard_cache = KeyboardCache(KEYBOARD_CACHE_SIZE)
+
+
+async def get_items_keyboard(action: str, category: Optional[str] = "", page: int = 0) -> Optional[InlineKeyboardMarkup]:
+    """Клавиатура с позициями для действия action из кэша
+
+    category: None - меню категорий, "" - все позиции, иначе позиции одной
+    категории. Для продажи показываются только позиции в наличии. Клавиатура
+    строится только при промахе кэша; None - позиций нет.
+    """
+    version = await db.get_catalog_layout_version()
+    key = (action, category, page)
+    if version is not None:
+        keyboard = keyboard_cache.get(version, key)
+        if keyboard is not None:
+            return keyboard
+
+    items = await db.get_all_items()
+    if action == "sell":
+        items = [item for item in items if item['stock'] > 0]
+    if not items:
+        return None
+    keyboard = create_items_keyboard(items, action, show_categories=category is None, page=page,
+                                     category=category or "")
+    if version is not None:
+        keyboard_cache.set(version, key, keyboard)
+    return keyboard
@@ -15,7 +15,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 try:
     from db_postgres import db
     print("📊 Используется PostgreSQL")
-except ImportError:
+except (ImportError, ValueError):
     from db import db
     print("📊 Fallback на SQLite")
 
@@ -107,15 +107,14 @@ async def load_literature():
     await db.init_database()
     print("✅ База данных инициализирована")
     
-    # Загружаем литературу
-    loaded_count = 0
+    # Загружаем литературу одной пачкой
+    loaded_count = await db.bulk_upsert_items(LITERATURE_DATA)
+    if not loaded_count:
+        print("❌ Ошибка загрузки литературы")
+        return
+    
     for name, category, price, cost, min_stock in LITERATURE_DATA:
-        success = await db.add_item(name, category, price, cost, min_stock)
-        if success:
-            loaded_count += 1
-            print(f"✅ Добавлено: {name} - {price} zł")
-        else:
-            print(f"❌ Ошибка: {name}")
+        print(f"✅ Добавлено: {name} - {price} zł")
     
     print(f"\n🎉 Загружено {loaded_count} позиций литературы!")
     print("📱 Теперь можно использовать бота для управления литературой")
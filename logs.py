@@ -0,0 +1,125 @@
+import copy
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import Optional, Sequence
+
+from aiogram import BaseMiddleware
+
+# Апдейт, в рамках которого пишется запись лога
+current_update_id: ContextVar[Optional[int]] = ContextVar('current_update_id', default=None)
+current_user_id: ContextVar[Optional[int]] = ContextVar('current_user_id', default=None)
+
+
+class UpdateContextFilter(logging.Filter):
+    """Добавляет к записи update_id и user_id текущего апдейта"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.update_id = current_update_id.get()
+        record.user_id = current_user_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только каждую N-ю запись INFO с заданным началом сообщения
+
+    Остальные уровни и сообщения не трогает: продажи, ошибки и предупреждения
+    пишутся всегда.
+    """
+
+    def __init__(self, prefixes: Sequence[str], every: int):
+        super().__init__()
+        self.prefixes = tuple(p for p in prefixes if p)
+        self.every = max(1, every)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every == 1 or record.levelno != logging.INFO or not self.prefixes:
+            return True
+        message = record.getMessage()
+        for prefix in self.prefixes:
+            if message.startswith(prefix):
+                with self._lock:
+                    count = self._counters.get(prefix, 0)
+                    self._counters[prefix] = count + 1
+                record.sample_every = self.every
+                return count % self.every == 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in ('update_id', 'user_id', 'sample_every'):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class PreparedQueueHandler(QueueHandler):
+    """QueueHandler, который не склеивает трассировку с текстом сообщения
+
+    Стандартный prepare() форматирует запись целиком; здесь в очередь уходят
+    отдельно текст и трассировка, а окончательный формат задают обработчики
+    в фоновом потоке.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """Файл лога с ротацией по размеру и по времени (bot.log.1 ... bot.log.N)"""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, rotate_hours: float):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.interval = rotate_hours * 3600
+        self.rollover_at = self._next_rollover()
+
+    def _next_rollover(self) -> float:
+        return time.time() + self.interval if self.interval > 0 else float('inf')
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_rollover()
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: update_id и user_id для записей лога"""
+
+    async def __call__(self, handler, event, data):
+        tg_user = data.get('event_from_user')
+        update_token = current_update_id.set(getattr(event, 'update_id', None))
+        user_token = current_user_id.set(tg_user.id if tg_user else None)
+        try:
+            return await handler(event, data)
+        finally:
+            current_update_id.reset(update_token)
+            current_user_id.reset(user_token)
@@ -1,11 +1,14 @@
 import asyncio
+import contextlib
+import hashlib
 import logging
 import os
+import signal
 from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
 from aiogram.types import Message
 
-from config import TELEGRAM_TOKEN, DATABASE_PATH
+from config import TELEGRAM_TOKEN, TELEGRAM_API_URL, DATABASE_PATH, BOT_MODE, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET
 # Принудительно используем PostgreSQL на Render.com
 try:
     from db_postgres import db
@@ -16,11 +19,50 @@ except Exception as e:
     from db import db
     print("📊 Fallback на SQLite")
 from utils import setup_logging, keep_alive
-from handlers import admin, leader, common
+from handlers import admin, leader, common, inline, meeting
+from middlewares import AuthMiddleware, RoleRequiredMiddleware
+from storage import DatabaseStorage
+from throttling import OutboundRateLimiter
+from health import HealthMonitor, UpdateTrackerMiddleware
+from logs import LogContextMiddleware
+from sales import sessions
+from keyboards import keyboard_cache
+from metrics import (
+    Gauge, ErrorCounterHandler, HandlerMetricsMiddleware, TelegramMetricsMiddleware,
+    instrument_database, register_database_gauges, render_metrics
+)
 
 # Настройка логирования
 setup_logging()
 logger = logging.getLogger(__name__)
+# Ошибки, перехваченные в except и записанные в лог, попадают в /metrics
+logging.getLogger().addHandler(ErrorCounterHandler())
+
+def create_dispatcher(health: HealthMonitor = None) -> Dispatcher:
+    """Диспетчер со всеми middleware и роутерами (используется и в бенчмарках)"""
+    # Состояния диалогов переживают перезапуск: храним их в базе бота
+    dp = Dispatcher(storage=DatabaseStorage(db))
+    if health is not None:
+        dp.update.outer_middleware(UpdateTrackerMiddleware(health))
+    # update_id и user_id в записях лога (LOG_FORMAT=json)
+    dp.update.outer_middleware(LogContextMiddleware())
+    # Роль пользователя определяется один раз на апдейт,
+    # права обработчиков проверяются по флагам require_role
+    dp.update.outer_middleware(AuthMiddleware(db))
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    dp.inline_query.middleware(HandlerMetricsMiddleware())
+    dp.message.middleware(RoleRequiredMiddleware())
+    dp.callback_query.middleware(RoleRequiredMiddleware())
+    dp.inline_query.middleware(RoleRequiredMiddleware())
+    
+    # Регистрируем роутеры
+    dp.include_router(admin.router)
+    dp.include_router(leader.router)
+    dp.include_router(common.router)
+    dp.include_router(inline.router)
+    dp.include_router(meeting.router)
+    return dp
 
 async def main():
     """Основная функция запуска бота"""
@@ -28,6 +70,10 @@ async def main():
         # Создаем директорию для базы данных, если её нет
         os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
         
+        # Замеряем время всех запросов к базе
+        instrument_database(db)
+        register_database_gauges(db)
+        
         # Инициализируем базу данных
         await db.init_database()
         logger.info("База данных инициализирована")
@@ -38,22 +84,38 @@ async def main():
             logger.info("База данных пуста, загружаем литературу...")
             try:
                 from load_literature import LITERATURE_DATA
-                for name, category, price, cost, min_stock in LITERATURE_DATA:
-                    await db.add_item(name, category, price, cost, min_stock)
-                logger.info(f"Загружено {len(LITERATURE_DATA)} позиций литературы")
+                loaded_count = await db.bulk_upsert_items(LITERATURE_DATA)
+                logger.info(f"Загружено {loaded_count} позиций литературы")
             except Exception as e:
                 logger.error(f"Ошибка загрузки литературы: {e}")
         else:
             logger.info(f"В базе данных {len(items)} позиций литературы")
         
         # Создаем бота и диспетчер
-        bot = Bot(token=TELEGRAM_TOKEN)
-        dp = Dispatcher()
+        if TELEGRAM_API_URL:
+            from aiogram.client.session.aiohttp import AiohttpSession
+            from aiogram.client.telegram import TelegramAPIServer
+            logger.info(f"Bot API: {TELEGRAM_API_URL}")
+            bot = Bot(token=TELEGRAM_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+        else:
+            bot = Bot(token=TELEGRAM_TOKEN)
+        # Все исходящие запросы идут через общий ограничитель скорости
+        rate_limiter = OutboundRateLimiter()
+        bot.session.middleware(rate_limiter)
+        # Замер времени запросов к API - после ограничителя, без учёта ожидания очереди
+        bot.session.middleware(TelegramMetricsMiddleware())
+        # Состояние сервиса собирается в фоне, HTTP-проверки отдают готовый снимок
+        health = HealthMonitor(db)
+        dp = create_dispatcher(health)
         
-        # Регистрируем роутеры
-        dp.include_router(admin.router)
-        dp.include_router(leader.router)
-        dp.include_router(common.router)
+        Gauge(
+            'litkom_telegram_queue', 'Очередь исходящих запросов к Telegram', ['stat'],
+            lambda: (({'stat': name}, value) for name, value in rate_limiter.stats().items())
+        )
+        Gauge(
+            'litkom_fsm_states', 'Состояния FSM в кэше памяти', ['stat'],
+            lambda: (({'stat': name}, value) for name, value in dp.storage.stats().items())
+        )
         
         # Обработчики команд находятся в handlers/
         
@@ -64,8 +126,14 @@ async def main():
         from aiohttp import web
 
         async def health_check(request):
-            """Проверка здоровья сервиса"""
-            return web.Response(text="Bot is running", status=200)
+            """Проверка жизни процесса (liveness)"""
+            alive, body = health.liveness()
+            return web.json_response(body, status=200 if alive else 503)
+
+        async def ready_handler(request):
+            """Готовность принимать запросы (readiness): база отвечает"""
+            ready, body = health.readiness()
+            return web.json_response(body, status=200 if ready else 503)
 
         async def root_handler(request):
             """Основной эндпоинт"""
@@ -74,13 +142,20 @@ async def main():
         async def status_handler(request):
             """Детальный статус"""
             try:
-                # Проверяем подключение к БД
-                items_count = len(await db.get_all_items())
+                # Состояние базы берём из фонового снимка, запросов к БД здесь нет;
+                # готовность только в теле ответа, код готовности отдаёт /ready
+                ready, snapshot = health.readiness()
                 return web.json_response({
                     "status": "healthy",
+                    "ready": ready,
                     "bot": "active",
-                    "database": "connected",
-                    "items_count": items_count,
+                    "health": snapshot,
+                    "role_cache": db.role_cache.stats(),
+                    "catalog": db.catalog.stats(),
+                    "keyboards": keyboard_cache.stats(),
+                    "fsm": dp.storage.stats(),
+                    "sessions": sessions.stats(),
+                    "telegram_api": rate_limiter.stats(),
                     "timestamp": asyncio.get_event_loop().time()
                 })
             except Exception as e:
@@ -89,12 +164,37 @@ async def main():
                     "error": str(e)
                 }, status=500)
 
+        async def metrics_handler(request):
+            """Метрики в формате Prometheus"""
+            return web.Response(text=render_metrics(), content_type='text/plain', charset='utf-8',
+                                headers={'X-Content-Type-Options': 'nosniff'})
+
         # Создаем HTTP сервер
         app = web.Application()
         app.router.add_get('/', root_handler)
         app.router.add_get('/health', health_check)
+        app.router.add_get('/ready', ready_handler)
         app.router.add_get('/status', status_handler)
+        app.router.add_get('/metrics', metrics_handler)
+        
+        use_webhook = BOT_MODE == 'webhook'
+        if use_webhook and not WEBHOOK_BASE_URL:
+            logger.warning("BOT_MODE=webhook, но WEBHOOK_BASE_URL не задан - используем polling")
+            use_webhook = False
+        
+        if use_webhook:
+            from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+            # Секрет проверяется по заголовку X-Telegram-Bot-Api-Secret-Token;
+            # без явной настройки выводим его из токена, чтобы он был одинаков между перезапусками
+            secret_token = WEBHOOK_SECRET or hashlib.sha256(TELEGRAM_TOKEN.encode()).hexdigest()
+            # handle_in_background: Telegram получает 200 сразу, апдейт обрабатывается отдельной задачей
+            SimpleRequestHandler(
+                dispatcher=dp, bot=bot, handle_in_background=True, secret_token=secret_token
+            ).register(app, path=WEBHOOK_PATH)
+            setup_application(app, dp, bot=bot)
 
+        health.start()
+        
         # Запускаем HTTP сервер в фоне
         runner = web.AppRunner(app)
         await runner.setup()
@@ -103,14 +203,45 @@ async def main():
         logger.info("HTTP сервер запущен на порту 10000")
         
         # Запускаем бота
-        await dp.start_polling(bot)
+        if use_webhook:
+            await bot.set_webhook(
+                f"{WEBHOOK_BASE_URL}{WEBHOOK_PATH}",
+                secret_token=secret_token,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            logger.info(f"Webhook установлен: {WEBHOOK_BASE_URL}{WEBHOOK_PATH}")
+            # Render останавливает контейнер сигналом SIGTERM: ждём его, как это делает
+            # start_polling, чтобы finally сохранил состояния FSM и закрыл базу
+            stop_event = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                with contextlib.suppress(NotImplementedError):
+                    loop.add_signal_handler(sig, stop_event.set)
+            await stop_event.wait()
+            logger.info("Получен сигнал остановки, webhook-режим завершается")
+        else:
+            # Polling не работает при установленном webhook
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
         
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
         raise
     finally:
+        if 'runner' in locals():
+            await runner.cleanup()
+        if 'health' in locals():
+            await health.stop()
         if 'bot' in locals():
             await bot.session.close()
+        if 'dp' in locals():
+            # Сохраняем несброшенные состояния FSM до закрытия базы
+            await dp.storage.close()
+        for meeting_session in sessions.open_sessions():
+            # Корзины сессий живут только в памяти - оставляем след в логе
+            logger.warning(f"Сессия собрания в чате {meeting_session.chat_id} не закрыта: не проведено "
+                           f"{dict(meeting_session.cart)} на {meeting_session.revenue:.0f} zł")
+        await db.close()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,234 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счётчик в формате Prometheus"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        if not self.labelnames:
+            self._values[()] = 0
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """Гистограмма длительностей в секундах"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # Для каждого набора меток: [счётчики по корзинам, сумма, количество]
+        self._values: Dict[Tuple, list] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        series = self._values.get(key)
+        if series is None:
+            series = [[0] * len(self.buckets), 0.0, 0]
+            self._values[key] = series
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total!r}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Gauge:
+    """Показатель, который вычисляется в момент запроса /metrics
+
+    collect_fn возвращает пары (метки, значение).
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect_fn: Callable[[], Iterable[Tuple[Dict[str, Any], float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect_fn = collect_fn
+        REGISTRY.append(self)
+
+    def collect(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        try:
+            for labels, value in self.collect_fn():
+                values = tuple(labels.get(name, '') for name in self.labelnames)
+                lines.append(f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}')
+        except Exception as e:
+            logger.error(f"Ошибка сбора метрики {self.name}: {e}")
+        return lines
+
+
+REGISTRY: List[Any] = []
+
+
+def render_metrics() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+UPDATE_LATENCY = Histogram('litkom_handler_seconds', 'Время обработки апдейта по обработчикам', ['handler'])
+HANDLER_EXCEPTIONS = Counter('litkom_handler_exceptions_total', 'Необработанные исключения в обработчиках', ['handler'])
+DB_LATENCY = Histogram('litkom_db_query_seconds', 'Время выполнения методов Database', ['method'])
+TELEGRAM_LATENCY = Histogram('litkom_telegram_api_seconds', 'Время запросов к Telegram Bot API', ['method'])
+TELEGRAM_ERRORS = Counter('litkom_telegram_api_errors_total', 'Ошибки запросов к Telegram Bot API', ['method', 'error'])
+LOGGED_ERRORS = Counter('litkom_logged_errors_total', 'Ошибки, записанные в лог (в т.ч. перехваченные в except)', ['logger'])
+SALES = Counter('litkom_sales_total', 'Количество продаж')
+SOLD_ITEMS = Counter('litkom_sold_items_total', 'Продано экземпляров')
+ARRIVALS = Counter('litkom_arrivals_total', 'Количество приходов товара')
+ARRIVAL_ITEMS = Counter('litkom_arrival_items_total', 'Поступило экземпляров')
+
+
+def record_sale(quantity: int):
+    """Учёт успешной продажи"""
+    SALES.inc()
+    SOLD_ITEMS.inc(quantity)
+
+
+def record_arrival(quantity: int):
+    """Учёт прихода товара"""
+    ARRIVALS.inc()
+    ARRIVAL_ITEMS.inc(quantity)
+
+
+def register_database_gauges(db):
+    """Показатели пула подключений и кэшей базы"""
+    def pool():
+        for field, value in db.pool_stats().items():
+            yield {'state': field}, value
+
+    def caches():
+        for cache_name, cache in (('role', db.role_cache), ('catalog', db.catalog)):
+            stats = cache.stats()
+            yield {'cache': cache_name, 'stat': 'hit_ratio'}, stats['hit_ratio']
+            yield {'cache': cache_name, 'stat': 'size'}, stats['size']
+
+    Gauge('litkom_db_pool_connections', 'Подключения к базе данных', ['state'], pool)
+    Gauge('litkom_cache', 'Состояние кэшей в памяти', ['cache', 'stat'], caches)
+
+
+def instrument_database(db):
+    """Замер времени всех публичных async-методов экземпляра Database"""
+    for name, method in inspect.getmembers(db, inspect.iscoroutinefunction):
+        if name.startswith('_'):
+            continue
+
+        def wrap(method, name):
+            @functools.wraps(method)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    DB_LATENCY.observe(time.perf_counter() - started, method=name)
+            return timed
+
+        setattr(db, name, wrap(method, name))
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: время работы и исключения каждого обработчика"""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_EXCEPTIONS.inc(handler=name)
+            raise
+        finally:
+            UPDATE_LATENCY.observe(time.perf_counter() - started, handler=name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки запросов к Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, method=name)
+
+
+class ErrorCounterHandler(logging.Handler):
+    """Обработчик логов, считающий записи уровня ERROR и выше"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record: logging.LogRecord):
+        LOGGED_ERRORS.inc(logger=record.name)
@@ -0,0 +1,74 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, InlineQuery, Message, TelegramObject
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DENIED_TEXT = "❌ У вас нет доступа к этой команде."
+
+
+class UserContext(NamedTuple):
+    """Пользователь текущего апдейта с уже определённой ролью"""
+    tg_id: int
+    role: Optional[str]
+    full_name: str = ""
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    @property
+    def is_leader(self) -> bool:
+        return self.role == "leader"
+
+    def has_role(self, *roles: str) -> bool:
+        return self.role in roles
+
+
+def require_role(*roles: str, denied: str = DEFAULT_DENIED_TEXT) -> Dict[str, Any]:
+    """Флаги обработчика: доступ только для указанных ролей
+
+    Пример: @router.message(Command("low"), flags=require_role("admin"))
+    """
+    return {"roles": roles, "denied": denied}
+
+
+class AuthMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: роль определяется один раз и кладётся в data['user']"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        tg_user = data.get("event_from_user")
+        if tg_user is not None:
+            # get_user_role отвечает из кэша ролей, в базу идёт только при промахе
+            role = await self.db.get_user_role(tg_user.id)
+            data["user"] = UserContext(tg_user.id, role, tg_user.full_name)
+        return await handler(event, data)
+
+
+class RoleRequiredMiddleware(BaseMiddleware):
+    """Внутренний middleware: проверка флагов require_role у выбранного обработчика"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        roles = get_flag(data, "roles")
+        if roles:
+            user: Optional[UserContext] = data.get("user")
+            if user is None or not user.has_role(*roles):
+                denied = get_flag(data, "denied", default=DEFAULT_DENIED_TEXT)
+                logger.info(f"Отказ в доступе пользователю {user.tg_id if user else None} (нужна роль: {', '.join(roles)})")
+                if isinstance(event, CallbackQuery):
+                    await event.answer(denied, show_alert=True)
+                elif isinstance(event, Message):
+                    await event.answer(denied)
+                elif isinstance(event, InlineQuery):
+                    # Пустой персональный ответ, чтобы клиент не ждал таймаута
+                    await event.answer([], cache_time=0, is_personal=True)
+                return None
+        return await handler(event, data)
@@ -0,0 +1,103 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+
+from utils import create_pagination_keyboard, parse_page_callback
+
+logger = logging.getLogger(__name__)
+
+
+class Paginator:
+    """Постраничный вывод каталога с правкой сообщения на месте
+
+    Первая страница отправляется новым сообщением, переходы по кнопкам
+    редактируют то же сообщение. Если содержимое страницы не изменилось,
+    запрос к Telegram не отправляется вовсе.
+    """
+
+    def __init__(self, db, prefix: str, title: str, items_per_page: int,
+                 format_item: Callable[[Dict], str], empty_text: str,
+                 in_stock_only: bool = False, max_tracked: int = 1024):
+        self.db = db
+        self.prefix = prefix
+        self.title = title
+        self.items_per_page = items_per_page
+        self.format_item = format_item
+        self.empty_text = empty_text
+        self.in_stock_only = in_stock_only
+        self.max_tracked = max_tracked
+        # Хэши содержимого отправленных страниц по (chat_id, message_id)
+        self._hashes: "OrderedDict[Tuple[int, int], str]" = OrderedDict()
+
+    async def render(self, current_page: int, after_id: int = None,
+                     before_id: int = None) -> Optional[Tuple[str, InlineKeyboardMarkup]]:
+        """Текст и клавиатура страницы; None, если каталог пуст"""
+        total_count = await self.db.count_items(in_stock_only=self.in_stock_only)
+        if not total_count:
+            return None
+
+        page_items = await self.db.get_items_page(
+            self.items_per_page, after_id=after_id, before_id=before_id, in_stock_only=self.in_stock_only
+        )
+        if not page_items and (after_id is not None or before_id is not None):
+            # Позиция-курсор удалена или закончилась - начинаем сначала
+            current_page = 0
+            page_items = await self.db.get_items_page(self.items_per_page, in_stock_only=self.in_stock_only)
+
+        total_pages = (total_count + self.items_per_page - 1) // self.items_per_page
+        current_page = min(current_page, total_pages - 1)
+
+        text = f"<b>{self.title} (стр. {current_page + 1}/{total_pages})</b>\n\n"
+        text += "".join(self.format_item(item) for item in page_items)
+        keyboard = create_pagination_keyboard(self.prefix, current_page, total_pages, page_items)
+        return text, keyboard
+
+    def _remember(self, message: Message, content_hash: str):
+        key = (message.chat.id, message.message_id)
+        self._hashes[key] = content_hash
+        self._hashes.move_to_end(key)
+        while len(self._hashes) > self.max_tracked:
+            self._hashes.popitem(last=False)
+
+    async def show(self, target: Union[Message, CallbackQuery], current_page: int = 0,
+                   after_id: int = None, before_id: int = None):
+        """Показать страницу: новым сообщением или правкой сообщения с кнопкой"""
+        message = target.message if isinstance(target, CallbackQuery) else target
+        page = await self.render(current_page, after_id, before_id)
+        if page is None:
+            await message.answer(self.empty_text)
+            return
+
+        text, keyboard = page
+        content_hash = hashlib.sha1(f"{text}\n{keyboard.model_dump_json()}".encode()).hexdigest()
+
+        if isinstance(target, CallbackQuery):
+            key = (message.chat.id, message.message_id)
+            if self._hashes.get(key) == content_hash:
+                return
+            try:
+                await message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+                self._remember(message, content_hash)
+                return
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    self._remember(message, content_hash)
+                    return
+                logger.warning(f"Не удалось отредактировать страницу {self.prefix}: {e}")
+
+        sent = await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+        self._remember(sent, content_hash)
+
+    async def show_prev(self, callback: CallbackQuery):
+        """Обработка кнопки «Назад»"""
+        page_num, first_id = parse_page_callback(callback.data)
+        await self.show(callback, page_num, before_id=first_id)
+
+    async def show_next(self, callback: CallbackQuery):
+        """Обработка кнопки «Вперёд»"""
+        page_num, last_id = parse_page_callback(callback.data)
+        await self.show(callback, page_num, after_id=last_id)
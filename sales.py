@@ -0,0 +1,226 @@
+import datetime
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from search import normalize
+
+# Строки заказа разделяются точкой с запятой или переводом строки (запятые встречаются в названиях)
+_LINE_SEPARATOR_RE = re.compile(r'[;\n]+')
+# Явное количество в конце строки: "x2", "х2", "×2", "*2", "2 шт"
+_EXPLICIT_QTY_RE = re.compile(r'(?:(?:^|\s|(?<=\d))[xх×*]\s*(\d+)|\s(\d+)\s*(?:шт|штук[аи]?)\.?)\s*$', re.IGNORECASE)
+# Явное количество в начале строки: "2x IP16", "3 × брелок"
+_LEADING_QTY_RE = re.compile(r'^(\d+)\s*[xх×*]\s+', re.IGNORECASE)
+# Число в конце строки без пометки: количество или часть названия ("брелок 30")
+_BARE_QTY_RE = re.compile(r'\s(\d+)\s*$')
+
+# Поиск позиций: db.search_items
+SearchFunc = Callable[[str], Awaitable[List[Dict]]]
+
+
+class OrderLine(NamedTuple):
+    """Строка заказа до поиска позиции"""
+    text: str
+    name: str
+    qty: int
+    # Название вместе с числом в конце, если число могло быть его частью
+    full_name: Optional[str] = None
+
+
+class ResolvedLine(NamedTuple):
+    """Строка заказа после поиска: позиция или варианты для уточнения"""
+    text: str
+    qty: int
+    item: Optional[Dict]
+    candidates: List[Dict]
+
+
+def parse_order(text: str) -> List[OrderLine]:
+    """Разбор текста вида "Белый буклет 3; IP16 x2; брелок 30 дней" на строки"""
+    lines = []
+    for raw in _LINE_SEPARATOR_RE.split(text):
+        line = raw.strip(' \t,.')
+        if not line:
+            continue
+
+        match = _EXPLICIT_QTY_RE.search(line)
+        if match:
+            lines.append(OrderLine(line, line[:match.start()].strip(), int(match.group(1) or match.group(2))))
+            continue
+
+        match = _LEADING_QTY_RE.match(line)
+        if match:
+            lines.append(OrderLine(line, line[match.end():].strip(), int(match.group(1))))
+            continue
+
+        match = _BARE_QTY_RE.search(line)
+        if match and line[:match.start()].strip():
+            lines.append(OrderLine(line, line[:match.start()].strip(), int(match.group(1)), full_name=line))
+            continue
+
+        lines.append(OrderLine(line, line, 1))
+    return lines
+
+
+def pick_item(query: str, candidates: List[Dict]) -> Optional[Dict]:
+    """Единственная подходящая позиция: единственный результат или точное совпадение названия"""
+    if len(candidates) == 1:
+        return candidates[0]
+    exact = [item for item in candidates if normalize(item['name']) == normalize(query)]
+    return exact[0] if len(exact) == 1 else None
+
+
+async def resolve_order(lines: List[OrderLine], search: SearchFunc) -> List[ResolvedLine]:
+    """Поиск позиции для каждой строки заказа
+
+    Число в конце без пометки считается количеством, но если без него
+    позиция не определяется однозначно, а вместе с ним - да, оно часть
+    названия ("брелок 30" - это «Брелок 30 дней», 1 шт.). Если по словам
+    ничего не найдено, одно число позицию не выбирает ("zzz 2" - не IP №2).
+    """
+    resolved = []
+    for line in lines:
+        candidates = await search(line.name) if line.name else []
+        item = pick_item(line.name, candidates)
+        if item is None and line.full_name and candidates:
+            full_candidates = await search(line.full_name)
+            full_item = pick_item(line.full_name, full_candidates)
+            if full_item is not None:
+                resolved.append(ResolvedLine(line.text, 1, full_item, full_candidates))
+                continue
+        resolved.append(ResolvedLine(line.text, line.qty, item, candidates))
+    return resolved
+
+
+class MeetingSession:
+    """Сессия собрания в чате: корзина продаж до общего проведения"""
+
+    def __init__(self, chat_id: int, opened_by: int, title: str = ""):
+        self.chat_id = chat_id
+        self.opened_by = opened_by
+        self.title = title
+        self.opened_at = datetime.datetime.now()
+        # название позиции -> количество, цена на момент добавления и ID
+        self.cart: Dict[str, int] = {}
+        self.prices: Dict[str, float] = {}
+        self.item_ids: Dict[str, int] = {}
+        # (продавец, название позиции) -> количество: кому записать продажу в журнал
+        self.sellers: Dict[Tuple[int, str], int] = {}
+
+    def sales(self) -> List[Tuple[str, int, int]]:
+        """Строки корзины для проведения: (название, количество, продавец)"""
+        return [(name, qty, seller_id) for (seller_id, name), qty in self.sellers.items()]
+
+    @property
+    def total_qty(self) -> int:
+        return sum(self.cart.values())
+
+    @property
+    def revenue(self) -> float:
+        return sum(self.prices[name] * qty for name, qty in self.cart.items())
+
+
+class SessionRegistry:
+    """Открытые сессии собраний и зарезервированный под них остаток
+
+    Резерв оптимистичный: проверяется по остатку из снимка каталога за вычетом
+    резервов всех открытых сессий, в базу ничего не пишется до закрытия сессии.
+    Окончательную проверку делает транзакция продажи при закрытии.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[int, MeetingSession] = {}
+        self._reserved: Dict[str, int] = {}
+
+    def get(self, chat_id: int) -> Optional[MeetingSession]:
+        return self._sessions.get(chat_id)
+
+    def open(self, chat_id: int, opened_by: int, title: str = "") -> MeetingSession:
+        """Открытие сессии в чате (если уже открыта - возвращается она)"""
+        session = self._sessions.get(chat_id)
+        if session is None:
+            session = self._sessions[chat_id] = MeetingSession(chat_id, opened_by, title)
+        return session
+
+    def reserved(self, name: str) -> int:
+        return self._reserved.get(name, 0)
+
+    def reserve(self, session: MeetingSession, lines: Iterable[Tuple[Dict, int]], seller_id: int) -> List[str]:
+        """Резерв позиций (позиция из каталога, количество) продавца: все или ни одной
+
+        Возвращает список нехваток; пустой список - всё добавлено в корзину.
+        """
+        totals: Dict[str, int] = {}
+        items: Dict[str, Dict] = {}
+        for item, qty in lines:
+            totals[item['name']] = totals.get(item['name'], 0) + qty
+            items[item['name']] = item
+
+        shortages = []
+        for name, qty in totals.items():
+            available = items[name]['stock'] - self.reserved(name)
+            if qty > available:
+                shortages.append(f"{name}: нужно {qty}, доступно {max(available, 0)} шт.")
+        if shortages:
+            return shortages
+
+        for name, qty in totals.items():
+            session.cart[name] = session.cart.get(name, 0) + qty
+            session.prices[name] = items[name]['price']
+            session.item_ids[name] = items[name]['id']
+            session.sellers[(seller_id, name)] = session.sellers.get((seller_id, name), 0) + qty
+            self._reserved[name] = self.reserved(name) + qty
+        return []
+
+    def drop(self, session: MeetingSession, item_id: int):
+        """Убрать позицию из корзины сессии вместе с её резервом"""
+        for name, cart_id in list(session.item_ids.items()):
+            if cart_id == item_id:
+                self._unreserve(name, session.cart.pop(name, 0))
+                session.prices.pop(name, None)
+                del session.item_ids[name]
+                for key in [key for key in session.sellers if key[1] == name]:
+                    del session.sellers[key]
+
+    def detach(self, chat_id: int) -> Optional[MeetingSession]:
+        """Снять сессию с чата на время проведения; резерв остаётся"""
+        return self._sessions.pop(chat_id, None)
+
+    def attach(self, session: MeetingSession):
+        """Вернуть сессию в чат (проведение не удалось)"""
+        current = self._sessions.get(session.chat_id)
+        if current is not None:
+            # За время проведения в чате открыли новую сессию - переносим её корзину
+            for name, qty in current.cart.items():
+                session.cart[name] = session.cart.get(name, 0) + qty
+                session.prices[name] = current.prices[name]
+                session.item_ids[name] = current.item_ids[name]
+            for key, qty in current.sellers.items():
+                session.sellers[key] = session.sellers.get(key, 0) + qty
+        self._sessions[session.chat_id] = session
+
+    def release(self, session: MeetingSession):
+        """Снять резерв сессии (после проведения или отмены)"""
+        for name, qty in session.cart.items():
+            self._unreserve(name, qty)
+
+    def _unreserve(self, name: str, qty: int):
+        left = self.reserved(name) - qty
+        if left > 0:
+            self._reserved[name] = left
+        else:
+            self._reserved.pop(name, None)
+
+    def open_sessions(self) -> List[MeetingSession]:
+        return list(self._sessions.values())
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики для /status"""
+        return {
+            'open': len(self._sessions),
+            'reserved_items': len(self._reserved),
+            'reserved_qty': sum(self._reserved.values())
+        }
+
+
+# Сессии собраний живут в памяти процесса: при перезапуске бота открытые корзины теряются
+sessions = SessionRegistry()
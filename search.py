@@ -0,0 +1,172 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Слова названия: буквы отдельно от цифр ("IP16" -> "ip", "16"), кавычки и знаки отбрасываются
+_TOKEN_RE = re.compile(r'\d+|[^\W\d_]+')
+
+# Вес совпадения слова запроса со словом названия
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+FUZZY_SCORE = 0.6
+# Минимальное сходство по триграммам для нечёткого совпадения
+TRIGRAM_THRESHOLD = 0.4
+
+
+def normalize(text: str) -> str:
+    """Приведение текста к виду для сравнения: регистр, ё/е, без кавычек и знаков"""
+    return ' '.join(tokenize(text))
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова и числа текста в нормализованном виде"""
+    return _TOKEN_RE.findall(text.casefold().replace('ё', 'е'))
+
+
+def trigrams(word: str) -> Set[str]:
+    """Триграммы слова с границами (" бе", "бел", ..., "ый ")"""
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Индекс названий позиций в памяти: точные слова, префиксы, триграммы и числа
+
+    Числа («IP 16», «брелок 30») совпадают только целиком, слова - целиком,
+    по началу или нечётко по триграммам. Индекс обновляется по одной позиции:
+    при перезагрузке каталога заново разбираются только изменённые названия.
+    """
+
+    def __init__(self):
+        self._names: Dict[int, str] = {}
+        self._item_words: Dict[int, Tuple[str, ...]] = {}
+        self._normalized: Dict[int, str] = {}
+        self._words: Dict[str, Set[int]] = {}
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._gram_counts: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _add_word(self, word: str, item_id: int):
+        ids = self._words.get(word)
+        if ids is None:
+            ids = self._words[word] = set()
+            if not word.isdigit():
+                for end in range(1, len(word) + 1):
+                    self._prefixes.setdefault(word[:end], set()).add(word)
+                grams = trigrams(word)
+                for gram in grams:
+                    self._trigrams.setdefault(gram, set()).add(word)
+                self._gram_counts[word] = len(grams)
+        ids.add(item_id)
+
+    def _drop_word(self, word: str, item_id: int):
+        ids = self._words.get(word)
+        if ids is None:
+            return
+        ids.discard(item_id)
+        if ids:
+            return
+        del self._words[word]
+        if not word.isdigit():
+            for end in range(1, len(word) + 1):
+                self._discard(self._prefixes, word[:end], word)
+            for gram in trigrams(word):
+                self._discard(self._trigrams, gram, word)
+            del self._gram_counts[word]
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, word: str):
+        words = index.get(key)
+        if words is not None:
+            words.discard(word)
+            if not words:
+                del index[key]
+
+    def add(self, item_id: int, name: str):
+        """Добавление позиции или смена её названия"""
+        if self._names.get(item_id) == name:
+            return
+        self.remove(item_id)
+        words = tuple(dict.fromkeys(tokenize(name)))
+        self._names[item_id] = name
+        self._item_words[item_id] = words
+        self._normalized[item_id] = ' '.join(tokenize(name))
+        for word in words:
+            self._add_word(word, item_id)
+
+    def remove(self, item_id: int):
+        """Удаление позиции из индекса"""
+        if self._names.pop(item_id, None) is None:
+            return
+        self._normalized.pop(item_id, None)
+        for word in self._item_words.pop(item_id, ()):
+            self._drop_word(word, item_id)
+
+    def sync(self, items: Iterable[Tuple[int, str]]):
+        """Приведение индекса к списку (id, название): разбираются только изменения"""
+        seen = set()
+        for item_id, name in items:
+            seen.add(item_id)
+            self.add(item_id, name)
+        for item_id in [item_id for item_id in self._names if item_id not in seen]:
+            self.remove(item_id)
+
+    def _match_token(self, token: str) -> Dict[str, float]:
+        """Слова индекса, подходящие к слову запроса, с весом совпадения"""
+        if token.isdigit():
+            return {token: EXACT_SCORE} if token in self._words else {}
+
+        matches = {word: EXACT_SCORE if word == token else PREFIX_SCORE
+                   for word in self._prefixes.get(token, ())}
+        if len(token) >= 3:
+            grams = trigrams(token)
+            shared = Counter(word for gram in grams for word in self._trigrams.get(gram, ()))
+            for word, count in shared.items():
+                similarity = count / (len(grams) + self._gram_counts[word] - count)
+                if similarity >= TRIGRAM_THRESHOLD:
+                    score = FUZZY_SCORE * similarity
+                    if score > matches.get(word, 0.0):
+                        matches[word] = score
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """ID позиций по убыванию релевантности: (id, оценка)
+
+        В выдачу попадают только позиции, совпавшие с наибольшим числом слов
+        запроса; полное совпадение названия всегда первое.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        scores: Dict[int, float] = {}
+        matched: Counter = Counter()
+        for token in tokens:
+            best: Dict[int, float] = {}
+            for word, score in self._match_token(token).items():
+                for item_id in self._words[word]:
+                    if score > best.get(item_id, 0.0):
+                        best[item_id] = score
+            for item_id, score in best.items():
+                scores[item_id] = scores.get(item_id, 0.0) + score
+                matched[item_id] += 1
+        if not scores:
+            return []
+
+        most = max(matched.values())
+        normalized = ' '.join(tokens)
+        ranked = []
+        for item_id, score in scores.items():
+            if matched[item_id] != most:
+                continue
+            name = self._normalized[item_id]
+            if name == normalized:
+                score += len(tokens)
+            elif name.startswith(normalized):
+                score += 0.5
+            ranked.append((item_id, round(score, 4)))
+        ranked.sort(key=lambda hit: (-hit[1], len(self._names[hit[0]]), self._names[hit[0]]))
+        return ranked[:limit]
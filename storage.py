@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import FSM_STATE_TTL, FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    """Состояние FSM в кэше"""
+    __slots__ = ('state', 'data', 'expires_at')
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], expires_at: float):
+        self.state = state
+        self.data = data
+        self.expires_at = expires_at
+
+
+class DatabaseStorage(BaseStorage):
+    """Хранилище FSM в базе бота с кэшем в памяти и отложенной записью
+
+    Чтение идёт из кэша, изменения копятся и пишутся в базу пачкой
+    раз в FSM_FLUSH_INTERVAL секунд и при закрытии. Состояния, которые
+    не менялись дольше FSM_STATE_TTL, считаются брошенными и удаляются.
+    """
+
+    def __init__(self, db, ttl: float = FSM_STATE_TTL, cache_size: int = FSM_CACHE_SIZE,
+                 flush_interval: float = FSM_FLUSH_INTERVAL):
+        self.db = db
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._dirty: set = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._sleeping = False
+        self._closing = False
+        self._purged_at = 0.0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or 0}:{key.destiny}"
+
+    async def _load(self, key: str) -> _Entry:
+        entry = self._cache.get(key)
+        now = time.time()
+        if entry is not None and entry.expires_at > now:
+            self._cache.move_to_end(key)
+            return entry
+
+        stale = entry
+        record = await self.db.get_fsm_record(key)
+        current = self._cache.get(key)
+        if current is not None and current is not stale:
+            # Пока шёл запрос, ключ уже загрузили или изменили
+            self._cache.move_to_end(key)
+            return current
+        # Ключа нет или его вытеснили, пока шёл запрос - берём загруженное
+        if record is not None:
+            state, data, expires_at = record
+            entry = _Entry(state, json.loads(data), expires_at)
+            self._cache[key] = entry
+        else:
+            entry = _Entry(None, {}, now + self.ttl)
+            self._cache[key] = entry
+            if stale is not None:
+                # Истёкшее состояние удалим при следующей записи
+                self._touch(key, entry)
+        await self._evict()
+        return entry
+
+    async def _evict(self):
+        while len(self._cache) > self.cache_size:
+            oldest = next(iter(self._cache))
+            if oldest in self._dirty:
+                await self.flush()
+                if oldest in self._dirty:
+                    # База недоступна - не теряем несохранённое состояние
+                    break
+            self._cache.pop(oldest, None)
+
+    def _touch(self, key: str, entry: _Entry):
+        entry.expires_at = time.time() + self.ttl
+        self._dirty.add(key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        # Цикл живёт, пока есть несохранённые изменения; брошенные состояния чистим раз в минуту
+        while self._dirty and not self._closing:
+            # При закрытии прерывается только ожидание, начатая запись доводится до конца
+            self._sleeping = True
+            try:
+                await asyncio.sleep(self.flush_interval)
+            finally:
+                self._sleeping = False
+            try:
+                await self.flush()
+                now = time.time()
+                if now - self._purged_at >= 60:
+                    self._purged_at = now
+                    await self.db.purge_expired_fsm(now)
+            except Exception as e:
+                logger.error(f"Ошибка записи состояний FSM: {e}")
+
+    async def flush(self):
+        """Запись накопленных изменений в базу"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            keys = list(self._dirty)
+            self._dirty.clear()
+
+            records: List[tuple] = []
+            deleted: List[str] = []
+            for key in keys:
+                entry = self._cache.get(key)
+                if entry is None or (entry.state is None and not entry.data):
+                    deleted.append(key)
+                else:
+                    records.append((key, entry.state, json.dumps(entry.data, ensure_ascii=False), entry.expires_at))
+
+            ok = True
+            try:
+                if records:
+                    ok = await self.db.save_fsm_records(records)
+                if deleted and ok:
+                    ok = await self.db.delete_fsm_records(deleted)
+            except BaseException:
+                # Ошибка или отмена посреди записи - изменения не теряем
+                self._dirty.update(keys)
+                raise
+            if not ok:
+                # Повторим при следующем сбросе
+                self._dirty.update(keys)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        entry = await self._load(storage_key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._touch(storage_key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        entry = await self._load(self._key(key))
+        return entry.state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+        entry = await self._load(storage_key)
+        entry.data = data.copy()
+        self._touch(storage_key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        entry = await self._load(self._key(key))
+        return entry.data.copy()
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики для /status"""
+        return {'cached': len(self._cache), 'dirty': len(self._dirty)}
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._flush_task is not None:
+            if self._sleeping:
+                self._flush_task.cancel()
+            try:
+                # Идущую запись дожидаемся, а не отменяем
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
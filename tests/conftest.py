@@ -0,0 +1,44 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Модули бота читают настройки при импорте: тесты идут на SQLite без токена
+os.environ.setdefault('TELEGRAM_TOKEN', '123456:TEST')
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database  # noqa: E402
+
+# Небольшой каталог: (name, category, price, cost, min_stock)
+CATALOG = [
+    ("Белый буклет", "Буклеты", 3.0, 2.0, 20),
+    ("Базовый текст", "Книги", 60.0, 45.0, 3),
+    ("IP №1 «Кто, что, как и почему»", "IP", 1.5, 1.0, 10),
+    ("IP №2 «Группа»", "IP", 1.5, 1.0, 10),
+    ("IP №16 «Новичку»", "IP", 1.5, 1.0, 30),
+    ("Брелок «30 дней»", "Брелоки", 5.0, 3.0, 10),
+    ("Брелок «60 дней»", "Брелоки", 5.0, 3.0, 10),
+]
+
+
+@pytest.fixture
+def run_db(tmp_path):
+    """Запуск сценария async def scenario(db) на временной SQLite-базе с каталогом CATALOG
+
+    Остаток каждой позиции - 10 шт.
+    """
+    def run(scenario):
+        async def main():
+            db = Database(str(tmp_path / 'litkom.db'))
+            await db.init_database()
+            await db.bulk_upsert_items(CATALOG)
+            for name, *_ in CATALOG:
+                await db.update_stock(name, 10)
+            try:
+                return await scenario(db)
+            finally:
+                await db.close()
+        return asyncio.run(main())
+    return run
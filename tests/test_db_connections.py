@@ -0,0 +1,29 @@
+import asyncio
+
+
+def test_cancelled_write_is_rolled_back(run_db):
+    async def scenario(db):
+        started = asyncio.Event()
+
+        async def half_done_write():
+            async with db.connections.writer() as conn:
+                await conn.execute("UPDATE literature SET stock = 999 WHERE name = 'Белый буклет'")
+                started.set()
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(half_done_write())
+        await started.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # Следующий писатель не должен зафиксировать чужую половину транзакции
+        async with db.connections.writer() as conn:
+            await conn.execute("UPDATE literature SET min_stock = 5 WHERE name = 'Белый буклет'")
+        async with db.connections.reader() as conn:
+            async with conn.execute("SELECT stock, min_stock FROM literature WHERE name = 'Белый буклет'") as cursor:
+                return tuple(await cursor.fetchone())
+
+    assert run_db(scenario) == (10, 5)
@@ -0,0 +1,112 @@
+async def stock_of(db, name):
+    return (await db.get_item_by_name(name))['stock']
+
+
+async def ledger(db):
+    async with db.connections.reader() as conn:
+        async with conn.execute(
+            '''SELECT l.name, s.qty, s.seller_tg_id, s.chat_id
+               FROM sales_ledger s JOIN literature l ON l.id = s.item_id ORDER BY s.id'''
+        ) as cursor:
+            return [tuple(row) for row in await cursor.fetchall()]
+
+
+def test_sell_item_success(run_db):
+    async def scenario(db):
+        result = await db.sell_item("Белый буклет", 3, seller_id=7, chat_id=-1)
+        return result, await stock_of(db, "Белый буклет"), await ledger(db)
+
+    (ok, message, sale), stock, rows = run_db(scenario)
+    assert ok
+    assert message == "Продано: Белый буклет ×3 — осталось 7 шт., сумма 9 zł"
+    assert sale == {'stock': 7, 'min_stock': 20, 'price': 3.0}
+    assert stock == 7
+    assert rows == [("Белый буклет", 3, 7, -1)]
+
+
+def test_sell_item_shortage_changes_nothing(run_db):
+    async def scenario(db):
+        result = await db.sell_item("Белый буклет", 11)
+        return result, await stock_of(db, "Белый буклет"), await ledger(db)
+
+    result, stock, rows = run_db(scenario)
+    assert result == (False, "Недостаточно товара. Доступно: 10 шт.", None)
+    assert stock == 10
+    assert rows == []
+
+
+def test_sell_item_unknown(run_db):
+    async def scenario(db):
+        return await db.sell_item("Нет такой позиции", 1)
+
+    assert run_db(scenario) == (False, "Позиция не найдена", None)
+
+
+def test_sell_item_inline_message_sold_once(run_db):
+    async def scenario(db):
+        shortage = await db.sell_item("Белый буклет", 11, inline_message_id="m1")
+        first = await db.sell_item("Белый буклет", 2, inline_message_id="m1")
+        second = await db.sell_item("Белый буклет", 2, inline_message_id="m1")
+        return shortage, first, second, await stock_of(db, "Белый буклет")
+
+    shortage, first, second, stock = run_db(scenario)
+    # Неудачная попытка не занимает сообщение
+    assert shortage[0] is False
+    assert first[0] is True
+    assert second == (False, "Продажа по этому сообщению уже проведена", None)
+    assert stock == 8
+
+
+def test_sell_items_merges_duplicate_lines(run_db):
+    async def scenario(db):
+        result = await db.sell_items([("Белый буклет", 2), ("Базовый текст", 1), ("Белый буклет", 3)],
+                                     seller_id=7, chat_id=-1)
+        return result, await stock_of(db, "Белый буклет"), await ledger(db)
+
+    (ok, lines), stock, rows = run_db(scenario)
+    assert ok
+    assert [(line['name'], line['qty'], line['stock']) for line in lines] == [
+        ("Белый буклет", 5, 5), ("Базовый текст", 1, 9)
+    ]
+    assert stock == 5
+    assert rows == [("Белый буклет", 5, 7, -1), ("Базовый текст", 1, 7, -1)]
+
+
+def test_sell_items_is_all_or_nothing(run_db):
+    async def scenario(db):
+        result = await db.sell_items([("Белый буклет", 2), ("Базовый текст", 8), ("Базовый текст", 3),
+                                      ("Нет такой позиции", 1)], seller_id=7)
+        stocks = [await stock_of(db, name) for name in ("Белый буклет", "Базовый текст")]
+        return result, stocks, await ledger(db)
+
+    (ok, shortages), stocks, rows = run_db(scenario)
+    assert not ok
+    assert shortages == [
+        {'name': "Базовый текст", 'qty': 11, 'error': "Недостаточно товара. Доступно: 10 шт."},
+        {'name': "Нет такой позиции", 'qty': 1, 'error': "Позиция не найдена"},
+    ]
+    # Строка, которой хватало остатка, тоже не списана
+    assert stocks == [10, 10]
+    assert rows == []
+
+
+def test_sell_items_ledger_per_seller(run_db):
+    async def scenario(db):
+        result = await db.sell_items([("Белый буклет", 2, 101), ("Белый буклет", 1, 202), ("Базовый текст", 1)],
+                                     seller_id=1, chat_id=-5)
+        return result, await ledger(db)
+
+    (ok, lines), rows = run_db(scenario)
+    assert ok
+    assert [(line['name'], line['qty']) for line in lines] == [("Белый буклет", 3), ("Базовый текст", 1)]
+    assert rows == [("Белый буклет", 2, 101, -5), ("Белый буклет", 1, 202, -5), ("Базовый текст", 1, 1, -5)]
+
+
+def test_search_items_reads_snapshot(run_db):
+    async def scenario(db):
+        await db.sell_item("Белый буклет", 4)
+        return await db.search_items("белый")
+
+    item, = run_db(scenario)
+    assert item['name'] == "Белый буклет"
+    assert item['stock'] == 6
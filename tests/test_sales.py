@@ -0,0 +1,81 @@
+import pytest
+
+from sales import parse_order, pick_item, resolve_order
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Белый буклет 3", [("Белый буклет", 3)]),
+    ("IP16 x2", [("IP16", 2)]),
+    ("IP16 х2", [("IP16", 2)]),
+    ("белый ×4", [("белый", 4)]),
+    ("Белый буклет 2 шт", [("Белый буклет", 2)]),
+    ("2x IP16", [("IP16", 2)]),
+    ("Базовый текст", [("Базовый текст", 1)]),
+    ("Белый буклет 3; IP16 x2\nБазовый текст", [("Белый буклет", 3), ("IP16", 2), ("Базовый текст", 1)]),
+    (" ; ;\n", []),
+])
+def test_parse_order_quantities(text, expected):
+    assert [(line.name, line.qty) for line in parse_order(text)] == expected
+
+
+def test_parse_order_keeps_bare_number_as_possible_name_part():
+    line, = parse_order("брелок 30")
+    assert (line.name, line.qty, line.full_name) == ("брелок", 30, "брелок 30")
+    # Явная пометка количества - число точно не часть названия
+    line, = parse_order("брелок x3")
+    assert line.full_name is None
+
+
+def test_pick_item_prefers_single_or_exact_candidate():
+    white = {'name': "Белый буклет"}
+    big = {'name': "Белый буклет (большой)"}
+    assert pick_item("белый", [white]) is white
+    assert pick_item("белый буклет", [big, white]) is white
+    assert pick_item("белый", [big, white]) is None
+    assert pick_item("белый", []) is None
+
+
+def resolve(run_db, text):
+    async def scenario(db):
+        return await resolve_order(parse_order(text), db.search_items)
+    return run_db(scenario)
+
+
+def test_resolve_order(run_db):
+    lines = resolve(run_db, "Белый буклет 3; IP16 x2; брелок 30 дней")
+    assert [(line.item['name'], line.qty) for line in lines] == [
+        ("Белый буклет", 3), ("IP №16 «Новичку»", 2), ("Брелок «30 дней»", 1)
+    ]
+
+
+def test_resolve_bare_number_as_quantity(run_db):
+    line, = resolve(run_db, "белый буклет 5")
+    assert (line.item['name'], line.qty) == ("Белый буклет", 5)
+
+
+def test_resolve_bare_number_as_part_of_name(run_db):
+    # Без числа позиция неоднозначна, с ним - однозначна: число входит в название
+    line, = resolve(run_db, "брелок 30")
+    assert (line.item['name'], line.qty) == ("Брелок «30 дней»", 1)
+    line, = resolve(run_db, "IP 16")
+    assert (line.item['name'], line.qty) == ("IP №16 «Новичку»", 1)
+
+
+def test_resolve_ambiguous_line_returns_candidates(run_db):
+    line, = resolve(run_db, "брелок x2")
+    assert line.item is None
+    assert {item['name'] for item in line.candidates} == {"Брелок «30 дней»", "Брелок «60 дней»"}
+
+    # Число не помогло выбрать позицию - остаётся количеством, позиция не выбрана
+    line, = resolve(run_db, "ip 3")
+    assert line.item is None and line.qty == 3
+    assert len(line.candidates) == 3
+
+
+def test_resolve_unknown_line(run_db):
+    line, = resolve(run_db, "zzz x2")
+    assert line.item is None
+    assert line.candidates == []
+    # Число само по себе позицию не выбирает, даже если совпадает с номером IP
+    line, = resolve(run_db, "zzz 2")
+    assert line.item is None
@@ -0,0 +1,81 @@
+from search import SearchIndex, normalize, tokenize
+
+from conftest import CATALOG
+
+
+def make_index(names=None):
+    index = SearchIndex()
+    for item_id, name in enumerate(names or [name for name, *_ in CATALOG], 1):
+        index.add(item_id, name)
+    return index
+
+
+def found(index, query):
+    return [index._names[item_id] for item_id, _ in index.search(query)]
+
+
+def test_normalize_ignores_case_yo_and_quotes():
+    assert normalize("Брелок «30 дней»") == "брелок 30 дней"
+    assert normalize("ЁЛКА") == "елка"
+
+
+def test_tokenize_splits_letters_from_digits():
+    assert tokenize("IP16") == ["ip", "16"]
+    assert tokenize("IP №16 «Новичку»") == ["ip", "16", "новичку"]
+
+
+def test_prefix_and_joined_number():
+    index = make_index()
+    assert found(index, "белый") == ["Белый буклет"]
+    assert found(index, "IP16") == ["IP №16 «Новичку»"]
+    assert found(index, "ип 16") == ["IP №16 «Новичку»"]
+
+
+def test_numbers_match_whole():
+    index = make_index()
+    # "1" не совпадает с "16"
+    assert found(index, "ip 1") == ["IP №1 «Кто, что, как и почему»"]
+    assert found(index, "брелок 30") == ["Брелок «30 дней»"]
+
+
+def test_typo_matches_by_trigrams():
+    assert found(make_index(), "Бозовый текст") == ["Базовый текст"]
+
+
+def test_ambiguous_query_returns_all_candidates():
+    assert set(found(make_index(), "брелок")) == {"Брелок «30 дней»", "Брелок «60 дней»"}
+
+
+def test_only_items_matching_most_words_are_returned():
+    # "новичку" совпадает только с одной из IP - остальные отбрасываются
+    assert found(make_index(), "ip новичку") == ["IP №16 «Новичку»"]
+
+
+def test_exact_name_ranked_first():
+    index = make_index(["Белый буклет (большой)", "Белый буклет", "Белый буклет мини"])
+    assert found(index, "белый буклет")[0] == "Белый буклет"
+
+
+def test_unknown_query():
+    index = make_index()
+    assert index.search("zzz") == []
+    assert index.search("  ") == []
+
+
+def test_rename_and_remove_update_index():
+    index = make_index(["Белый буклет", "Базовый текст"])
+    index.add(1, "Синий буклет")
+    assert found(index, "белый") == []
+    assert found(index, "синий") == ["Синий буклет"]
+
+    index.remove(2)
+    assert found(index, "базовый") == []
+    assert len(index) == 1
+
+
+def test_sync_keeps_only_listed_items():
+    index = make_index(["Белый буклет", "Базовый текст"])
+    index.sync([(2, "Базовый текст"), (3, "IP №2 «Группа»")])
+    assert len(index) == 2
+    assert found(index, "белый") == []
+    assert found(index, "группа") == ["IP №2 «Группа»"]
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText
+
+from config import TG_GLOBAL_RATE, TG_CHAT_RATE, TG_CHAT_BURST, TG_GROUP_RATE_PER_MIN, TG_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Методы, на которые действует лимит сообщений в чат
+CHAT_LIMITED_PREFIXES = ('Send', 'Edit', 'Copy', 'Forward')
+
+
+class TokenBucket:
+    """Ведро токенов с резервированием: токены могут уходить в минус (очередь)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Занять токен; возвращает, сколько секунд нужно подождать"""
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def penalize(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд (после RetryAfter)"""
+        self._refill()
+        # Следующий reserve() получит ожидание ровно seconds (плюс уже стоящая очередь)
+        self.tokens = min(self.tokens, 1.0) - seconds * self.rate
+
+    @property
+    def idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class _PendingEdit:
+    """Правка сообщения, ожидающая отправки"""
+    __slots__ = ('method', 'future', 'waiters')
+
+    def __init__(self, method: EditMessageText, future: asyncio.Future):
+        self.method = method
+        self.future = future
+        self.waiters = 0
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """Ограничитель исходящих запросов к Telegram
+
+    Держит общий лимит и лимит на чат, сам выжидает retry_after
+    при ответе 429 и склеивает подряд идущие правки одного сообщения:
+    если новая правка пришла, пока старая ждёт очереди, уходит только новая.
+    """
+
+    def __init__(self, global_rate: float = TG_GLOBAL_RATE, chat_rate: float = TG_CHAT_RATE,
+                 chat_burst: float = TG_CHAT_BURST, group_rate_per_min: float = TG_GROUP_RATE_PER_MIN,
+                 max_retries: int = TG_MAX_RETRIES, max_chats: int = 4096):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_min / 60
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[Any, TokenBucket]" = OrderedDict()
+        self._pending_edits: Dict[Tuple[Any, Any, Any], _PendingEdit] = {}
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.waited = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+        self.coalesced = 0
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательный ID - группа или канал, у них лимит в минуту
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+            while len(self._chats) > self.max_chats:
+                oldest, old_bucket = next(iter(self._chats.items()))
+                if not old_bucket.idle:
+                    break
+                del self._chats[oldest]
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _acquire(self, chat_id: Optional[Any]):
+        delay = self.global_bucket.reserve()
+        if chat_id is not None:
+            delay = max(delay, self._chat_bucket(chat_id).reserve())
+        self.requests += 1
+        if delay <= 0:
+            return
+        self.waited += 1
+        self.wait_time += delay
+        self.max_wait = max(self.max_wait, delay)
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.queue_depth -= 1
+
+    async def _send(self, make_request, bot, method, chat_id: Optional[Any], acquired: bool = False):
+        for attempt in range(self.max_retries + 1):
+            if not acquired:
+                await self._acquire(chat_id)
+            acquired = False
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Telegram просит подождать {e.retry_after} с ({type(method).__name__}, чат {chat_id})")
+                bucket = self._chat_bucket(chat_id) if chat_id is not None else self.global_bucket
+                bucket.penalize(e.retry_after)
+
+    async def _send_edit(self, make_request, bot, method: EditMessageText, chat_id: Optional[Any]):
+        key = (method.chat_id, method.message_id, method.inline_message_id)
+        pending = self._pending_edits.get(key)
+        if pending is not None:
+            # Старая правка ещё в очереди - заменяем её новой и ждём общий результат
+            pending.method = method
+            pending.waiters += 1
+            self.coalesced += 1
+            return await asyncio.shield(pending.future)
+
+        pending = _PendingEdit(method, asyncio.get_running_loop().create_future())
+        self._pending_edits[key] = pending
+        try:
+            await self._acquire(chat_id)
+        except BaseException:
+            self._pending_edits.pop(key, None)
+            if pending.waiters:
+                pending.future.cancel()
+            raise
+        # Правки, пришедшие после этой точки, встанут в очередь заново
+        self._pending_edits.pop(key, None)
+        try:
+            # Токен уже получен, повторы после RetryAfter ждут очереди как обычно
+            result = await self._send(make_request, bot, pending.method, chat_id, acquired=True)
+        except Exception as e:
+            if pending.waiters:
+                pending.future.set_exception(e)
+            raise
+        if pending.waiters:
+            pending.future.set_result(result)
+        return result
+
+    async def __call__(self, make_request, bot, method):
+        # Лимит на чат касается только отправки и правки сообщений
+        chat_id = getattr(method, 'chat_id', None) if type(method).__name__.startswith(CHAT_LIMITED_PREFIXES) else None
+        if isinstance(method, EditMessageText):
+            return await self._send_edit(make_request, bot, method, chat_id)
+        return await self._send(make_request, bot, method, chat_id)
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики для /status"""
+        return {
+            'requests': self.requests,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'waited': self.waited,
+            'avg_wait': round(self.wait_time / self.waited, 4) if self.waited else 0.0,
+            'max_wait': round(self.max_wait, 4),
+            'retries': self.retries,
+            'coalesced': self.coalesced,
+            'chats': len(self._chats)
+        }
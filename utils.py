@@ -1,19 +1,51 @@
+import atexit
 import logging
 import asyncio
+import queue
+from logging.handlers import QueueListener
 from typing import List, Dict
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 
+from config import (
+    KEYBOARD_PAGE_SIZE, LOG_FILE, LOG_FORMAT, LOG_MAX_BYTES, LOG_ROTATE_HOURS, LOG_BACKUP_COUNT, LOG_SAMPLE_EVERY, LOG_SAMPLE_PREFIXES
+)
+from logs import (
+    JsonFormatter, PreparedQueueHandler, SamplingFilter, SizeAndTimeRotatingFileHandler, UpdateContextFilter
+)
+
 # Настройка логирования
 def setup_logging():
-    """Настройка логирования в консоль и файл"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('bot.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    """Настройка логирования в консоль и файл
+
+    Обработчики в event loop только кладут запись в очередь,
+    запись в файл и консоль выполняет фоновый поток QueueListener.
+    """
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler = SizeAndTimeRotatingFileHandler(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_HOURS)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = PreparedQueueHandler(log_queue)
+    # Фильтры работают в вызывающем потоке, пока доступен контекст апдейта
+    queue_handler.addFilter(UpdateContextFilter())
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_PREFIXES, LOG_SAMPLE_EVERY))
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Дописываем очередь при выходе из процесса
+    atexit.register(listener.stop)
+    return listener
 
 def format_stock_report(report_data: List[Dict]) -> str:
     """Форматирование отчёта по остаткам"""
@@ -85,116 +117,123 @@ def format_low_stock(low_stock_data: List[Dict]) -> str:
     
     return "\n".join(warning_lines)
 
-def create_items_keyboard(items: list, action: str = "sell", show_categories: bool = False) -> InlineKeyboardMarkup:
-    """Создание inline-клавиатуры с позициями для различных действий"""
+# Категория для позиций без категории
+OTHER_CATEGORY = "Другие"
+
+def item_category(item: Dict) -> str:
+    """Категория позиции для группировки"""
+    return item.get('category') or OTHER_CATEGORY
+
+def items_page_callback(action: str, category: str, page: int) -> str:
+    """callback_data листания клавиатуры позиций (category '' - все позиции)"""
+    return f"ipage:{action}:{page}:{category}"
+
+def categories_page_callback(action: str, page: int) -> str:
+    """callback_data листания меню категорий"""
+    return f"cpage:{action}:{page}"
+
+def parse_keyboard_page_callback(data: str) -> tuple:
+    """Разбор callback_data листания: (действие, категория или None для меню категорий, страница)"""
+    kind, rest = data.split(":", 1)
+    if kind == "cpage":
+        action, page = rest.rsplit(":", 1)
+        return action, None, int(page)
+    action, page, category = rest.split(":", 2)
+    return action, category, int(page)
+
+def _navigation_row(page: int, total_pages: int, callback) -> List[InlineKeyboardButton]:
+    """Кнопки "Назад/Вперёд" для страницы page из total_pages"""
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=callback(page - 1)))
+    if page < total_pages - 1:
+        row.append(InlineKeyboardButton(text=f"Вперёд ➡️ ({page + 2}/{total_pages})", callback_data=callback(page + 1)))
+    return row
+
+def _page_bounds(count: int, page: int, page_size: int) -> tuple:
+    """(страница в допустимых пределах, всего страниц)"""
+    total_pages = max(1, -(-count // page_size))
+    return min(max(page, 0), total_pages - 1), total_pages
+
+def create_items_keyboard(items: list, action: str = "sell", show_categories: bool = False,
+                          page: int = 0, category: str = "",
+                          page_size: int = KEYBOARD_PAGE_SIZE) -> InlineKeyboardMarkup:
+    """Создание inline-клавиатуры с позициями для различных действий
+
+    show_categories - меню категорий, category - только позиции этой категории.
+    Длинные списки делятся на страницы по page_size кнопок.
+    """
+    if show_categories:
+        return create_categories_keyboard(items, action, page, page_size)
+
+    if category:
+        items = [item for item in items if item_category(item) == category]
+    page, total_pages = _page_bounds(len(items), page, page_size)
+    page_items = items[page * page_size:(page + 1) * page_size]
+
+    # Разбиваем на строки по 2 кнопки
     keyboard = []
+    for i in range(0, len(page_items), 2):
+        row = []
+        for item in page_items[i:i + 2]:
+            # Ограничиваем длину названия для кнопки
+            item_name = item['name']
+            button_text = item_name[:20] + "..." if len(item_name) > 20 else item_name
+            row.append(InlineKeyboardButton(text=button_text, callback_data=f"{action}_{item['id']}"))
+        keyboard.append(row)
 
-    # Если показываем категории, группируем по категориям
-    if show_categories:
-        # Получаем уникальные категории
-        categories = {}
-        for item in items:
-            if isinstance(item, dict):
-                category = item.get('category', 'Другие')
-                if category not in categories:
-                    categories[category] = []
-                categories[category].append(item)
-
-        # Добавляем кнопки категорий
-        for category in sorted(categories.keys()):
-            keyboard.append([InlineKeyboardButton(
-                text=f"📂 {category}",
-                callback_data=f"category_{category}"
-            )])
-
-        # Добавляем кнопку "Все товары"
-        keyboard.append([InlineKeyboardButton(
-            text="📚 Все товары",
-            callback_data="category_all"
-        )])
+    navigation = _navigation_row(page, total_pages, lambda p: items_page_callback(action, category, p))
+    if navigation:
+        keyboard.append(navigation)
+
+    if category:
+        keyboard.append([
+            InlineKeyboardButton(text="⬅️ Назад к категориям", callback_data="back_to_categories"),
+            InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_sell")
+        ])
     else:
-        # Обычный список товаров
-        # Разбиваем на строки по 2 кнопки
-        for i in range(0, len(items), 2):
-            row = []
-            for j in range(2):
-                if i + j < len(items):
-                    item = items[i + j]
-
-                    # Если item - это словарь, берем название
-                    if isinstance(item, dict):
-                        item_name = item['name']
-                        item_id = item['id']
-                    else:
-                        item_name = item
-                        item_id = None
-
-                    # Ограничиваем длину названия для кнопки
-                    button_text = item_name[:20] + "..." if len(item_name) > 20 else item_name
-
-                    # Формируем callback_data в зависимости от действия
-                    if action == "sell":
-                        callback_data = f"sell_{item_id}"
-                    elif action == "arrival":
-                        callback_data = f"arrival_{item_id}"
-                    elif action == "edit_item":
-                        callback_data = f"edit_item_{item_id}"
-                    elif action == "delete_item":
-                        callback_data = f"delete_item_{item_id}"
-                    elif action == "change_price":
-                        callback_data = f"change_price_{item_id}"
-                    elif action == "change_name":
-                        callback_data = f"change_name_{item_id}"
-                    else:
-                        callback_data = f"sell_{item_id}"
-
-                    row.append(InlineKeyboardButton(
-                        text=button_text,
-                        callback_data=callback_data
-                    ))
-            keyboard.append(row)
-
-    # Добавляем кнопку отмены
-    cancel_callback = "cancel_sell" if action == "sell" else "cancel_delete"
-    keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data=cancel_callback)])
+        # Добавляем кнопку отмены
+        cancel_callback = "cancel_sell" if action == "sell" else "cancel_delete"
+        keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data=cancel_callback)])
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-def create_category_keyboard(items: list, category: str, action: str = "sell") -> InlineKeyboardMarkup:
-    """Создание клавиатуры с товарами из определенной категории"""
-    keyboard = []
+def create_categories_keyboard(items: list, action: str = "sell", page: int = 0,
+                               page_size: int = KEYBOARD_PAGE_SIZE) -> InlineKeyboardMarkup:
+    """Меню категорий с числом позиций и кнопкой «Все товары»"""
+    counts = {}
+    for item in items:
+        category = item_category(item)
+        counts[category] = counts.get(category, 0) + 1
+    categories = sorted(counts)
+    page, total_pages = _page_bounds(len(categories), page, page_size)
 
-    # Фильтруем товары по категории
-    category_items = [item for item in items if item.get('category') == category]
-
-    # Добавляем товары из категории
-    for i in range(0, len(category_items), 2):
-        row = []
-        for j in range(2):
-            if i + j < len(category_items):
-                item = category_items[i + j]
-                item_name = item['name']
-                item_id = item['id']
-
-                button_text = item_name[:20] + "..." if len(item_name) > 20 else item_name
-
-                if action == "sell":
-                    callback_data = f"sell_{item_id}"
-                else:
-                    callback_data = f"sell_{item_id}"
-
-                row.append(InlineKeyboardButton(
-                    text=button_text,
-                    callback_data=callback_data
-                ))
-        keyboard.append(row)
+    keyboard = [
+        [InlineKeyboardButton(text=f"📂 {category} ({counts[category]})", callback_data=f"category_{category}")]
+        for category in categories[page * page_size:(page + 1) * page_size]
+    ]
+    navigation = _navigation_row(page, total_pages, lambda p: categories_page_callback(action, p))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append([InlineKeyboardButton(text="📚 Все товары", callback_data="category_all")])
+    keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_sell")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-    # Добавляем кнопки навигации
-    keyboard.append([
-        InlineKeyboardButton(text="⬅️ Назад к категориям", callback_data="back_to_categories"),
-        InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_sell")
-    ])
+def create_category_keyboard(items: list, category: str, action: str = "sell", page: int = 0) -> InlineKeyboardMarkup:
+    """Создание клавиатуры с товарами из определенной категории"""
+    return create_items_keyboard(items, action, page=page, category=category)
 
+def create_search_results_keyboard(items: list, action: str, cancel_callback: str) -> InlineKeyboardMarkup:
+    """Клавиатура с найденными позициями: по одной в строке, с текущим остатком"""
+    keyboard = []
+    for item in items:
+        item_name = item['name']
+        button_text = item_name[:40] + "..." if len(item_name) > 40 else item_name
+        keyboard.append([InlineKeyboardButton(
+            text=f"{button_text} ({item['stock']} шт.)",
+            callback_data=f"{action}_{item['id']}"
+        )])
+    keyboard.append([InlineKeyboardButton(text="❌ Отмена", callback_data=cancel_callback)])
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 def create_quantity_keyboard() -> InlineKeyboardMarkup:
@@ -378,10 +417,39 @@ def create_management_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
-def create_confirmation_keyboard(action: str) -> InlineKeyboardMarkup:
+def create_confirmation_keyboard(action: str, cancel_callback: str = "cancel_action") -> InlineKeyboardMarkup:
     """Создание клавиатуры подтверждения"""
     keyboard = [
         [InlineKeyboardButton(text="✅ Да", callback_data=f"confirm_{action}")],
-        [InlineKeyboardButton(text="❌ Нет", callback_data="cancel_action")]
+        [InlineKeyboardButton(text="❌ Нет", callback_data=cancel_callback)]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def create_pagination_keyboard(prefix: str, current_page: int, total_pages: int, page_items: List[Dict]) -> InlineKeyboardMarkup:
+    """Клавиатура пагинации: в callback_data передаются номер страницы и ID крайней позиции"""
+    keyboard = []
+    
+    if total_pages > 1 and page_items:
+        row = []
+        if current_page > 0:
+            row.append(InlineKeyboardButton(
+                text="⬅️ Назад", callback_data=f"{prefix}_prev_{current_page-1}_{page_items[0]['id']}"
+            ))
+        if current_page < total_pages - 1:
+            row.append(InlineKeyboardButton(
+                text="Вперёд ➡️", callback_data=f"{prefix}_next_{current_page+1}_{page_items[-1]['id']}"
+            ))
+        keyboard.append(row)
+    
+    keyboard.append([InlineKeyboardButton(text="❌ Закрыть", callback_data=f"{prefix}_close")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+def parse_page_callback(data: str) -> tuple:
+    """Разбор callback_data пагинации: (номер страницы, ID крайней позиции или None)"""
+    parts = data.split("_")
+    page = int(parts[2])
+    cursor_id = int(parts[3]) if len(parts) > 3 else None
+    if cursor_id is None:
+        # Кнопки старого формата без ID - начинаем с первой страницы
+        page = 0
+    return page, cursor_id